@@ -12,6 +12,7 @@ import enum
 import re
 import itertools
 import typing
+import operator
 
 from typing import ClassVar, Callable, Dict, Generic, Hashable, Iterable, Iterator, List, Mapping, MutableSet, Optional, SupportsInt, Tuple, Type, TypeVar, Union
 
@@ -31,6 +32,12 @@ PIECE_TYPES = [PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING] = range(1, 7)
 PIECE_SYMBOLS = [None, "p", "n", "b", "r", "q", "k"]
 PIECE_NAMES = [None, "pawn", "knight", "bishop", "rook", "queen", "king"]
 
+PIECE_VALUES = [0, 100, 320, 325, 500, 975, 32767]
+"""
+The piece values in centipawns, indexed by piece type: the default of
+:func:`chess.Board.see()` and the material values of :mod:`chess.utility`.
+"""
+
 def piece_symbol(piece_type: PieceType, _PIECE_SYMBOLS: List[Optional[str]] = PIECE_SYMBOLS) -> str:
     return typing.cast(str, _PIECE_SYMBOLS[piece_type])
 
@@ -210,24 +217,24 @@ def scan_reversed(bb: Bitboard, *, _BB_SQUARES: List[Bitboard] = BB_SQUARES) ->
         yield r
         bb ^= _BB_SQUARES[r]
 
-def popcount(bb: Bitboard, *, _bin: Callable[[int], str] = bin) -> int:
-    if _bin != bin:
-        return _old_popcount(bb)
-    else:
-        return _new_popcount(bb)
-
-def new_popcount(bb: Bitboard) -> int:
+def _bin_popcount(bb: Bitboard) -> int:
     """
-    Explicitly uses the new popcount.
+    Counts the set bits with ``bin()``. Used when ``int.bit_count`` is not
+    available (Python < 3.10), where it is faster than table lookups.
+
+    Like ``int.bit_count``, it counts the bits of the absolute value of a negative
+    number: mask a complement first, e.g. ``popcount(~occupied & BB_ALL)``.
     """
-    return _new_popcount(bb)
+    return bin(bb).count("1")
 
-def _new_popcount(bb: Bitboard) -> int:
+def _nibble_popcount(bb: Bitboard) -> int:
     """
     This implements the map to number of bits (which is constant time) implementation
     for counting the number of bits that are 1 in an integer
 
     Designed according to the fourth method at https://www.geeksforgeeks.org/count-set-bits-in-an-integer/
+
+    Kept for the popcount benchmark; use :func:`popcount` instead.
     """
     num_to_bits=[0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4]
     nibble = 0
@@ -239,6 +246,17 @@ def _new_popcount(bb: Bitboard) -> int:
         bb_copy = bb_copy >> 4
     return total
 
+# The implementation is chosen once at import time so that calls do not pay
+# for any dispatch. int.bit_count is a single C call (Python >= 3.10).
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count  # type: Callable[[Bitboard], int]
+else:
+    popcount = _bin_popcount
+
+# Aliases for callers that explicitly asked for the faster popcount.
+new_popcount = popcount
+_new_popcount = popcount
+
 def _old_popcount(bb: Bitboard, *, _bin: Callable[[int], str] = bin) -> int:
     """
     This is the old popcount implementation from python-chess; I'm pretty sure this
@@ -345,10 +363,6 @@ BB_KING_ATTACKS = [_step_attacks(sq, [9, 8, 7, 1, -9, -8, -7, -1]) for sq in SQU
 BB_PAWN_ATTACKS = [[_step_attacks(sq, deltas) for sq in SQUARES] for deltas in [[-7, -9], [7, 9]]]
 
 
-def _edges(square: Square) -> Bitboard:
-    return (((BB_RANK_1 | BB_RANK_8) & ~BB_RANKS[square_rank(square)]) |
-            ((BB_FILE_A | BB_FILE_H) & ~BB_FILES[square_file(square)]))
-
 def _carry_rippler(mask: Bitboard) -> Iterator[Bitboard]:
     # Carry-Rippler trick to iterate subsets of mask.
     subset = BB_EMPTY
@@ -358,48 +372,165 @@ def _carry_rippler(mask: Bitboard) -> Iterator[Bitboard]:
         if not subset:
             break
 
+def _ray(square: Square, delta: int) -> List[Bitboard]:
+    # The squares from square to the edge of the board in one direction.
+    ray = list()
+    sq = square
+    while True:
+        sq += delta
+        if not (0 <= sq < 64) or square_distance(sq, sq - delta) > 2:
+            break
+        ray.append(BB_SQUARES[sq])
+    return ray
+
+_SLIDER_RAYS = {delta: [_ray(square, delta) for square in SQUARES] for delta in [-9, -8, -7, -1, 1, 7, 8, 9]}
+
+def _ray_table(ray: List[Bitboard]) -> Dict[Bitboard, Bitboard]:
+    # The attacks along a ray by the occupied squares on it. The last square
+    # of the ray can't block anything, so it is not part of the mask.
+    table = dict()
+    for subset in _carry_rippler(_ray_mask(ray)):
+        attacks = BB_EMPTY
+        for bb in ray:
+            attacks |= bb
+            if subset & bb:
+                break
+        table[subset] = attacks
+    return table
+
+def _ray_mask(ray: List[Bitboard]) -> Bitboard:
+    mask = BB_EMPTY
+    for bb in ray[:-1]:
+        mask |= bb
+    return mask
+
+def _square_attack_table(square: Square, deltas: List[int]) -> Dict[Bitboard, Bitboard]:
+    # Merges the tables of the single directions (their masks don't overlap),
+    # which is a lot faster than computing every entry on its own.
+    merged = {BB_EMPTY: BB_EMPTY}
+    for delta in deltas:
+        merged = {subset | other: attacks | other_attacks
+                  for subset, attacks in merged.items()
+                  for other, other_attacks in _ray_table(_SLIDER_RAYS[delta][square]).items()}
+    return merged
+
+class _LazyAttackTable(dict):
+    """
+    Stands in for the attack table of a square until it is first used. The
+    first lookup builds the table and puts it in its place in the list of
+    tables, so later lookups go to a plain dict; the stand-in is filled too,
+    for anyone who kept a reference to it.
+
+    Every way of reading the stand-in (``[]``, ``get()``, ``in``, ``len()``,
+    iteration, ``keys()``, ``values()``, ``items()``, ``copy()``, ``==``)
+    builds the table first.
+    """
+
+    def __init__(self, tables: List[Dict[Bitboard, Bitboard]], square: Square, deltas: List[int]) -> None:
+        super().__init__()
+        self.tables = tables
+        self.square = square
+        self.deltas = deltas
+
+    def _build(self) -> Dict[Bitboard, Bitboard]:
+        # A built table is never empty: it has the attacks for no blockers.
+        if not dict.__len__(self):
+            table = _square_attack_table(self.square, self.deltas)
+            self.tables[self.square] = table
+            self.update(table)
+        return self
+
+    def __missing__(self, subset: Bitboard) -> Bitboard:
+        if dict.__len__(self):
+            raise KeyError(subset)
+        return self._build()[subset]
+
+    def get(self, subset: Bitboard, default: Optional[Bitboard] = None) -> Optional[Bitboard]:
+        return dict.get(self._build(), subset, default)
+
+    def __contains__(self, subset: object) -> bool:
+        return dict.__contains__(self._build(), subset)
+
+    def __iter__(self) -> Iterator[Bitboard]:
+        return dict.__iter__(self._build())
+
+    def __len__(self) -> int:
+        return dict.__len__(self._build())
+
+    def __eq__(self, other: object) -> bool:
+        return dict.__eq__(self._build(), other)
+
+    def __ne__(self, other: object) -> bool:
+        return dict.__ne__(self._build(), other)
+
+    def __repr__(self) -> str:
+        return dict.__repr__(self._build())
+
+    def keys(self):
+        return dict.keys(self._build())
+
+    def values(self):
+        return dict.values(self._build())
+
+    def items(self):
+        return dict.items(self._build())
+
+    def copy(self) -> Dict[Bitboard, Bitboard]:
+        return dict.copy(self._build())
+
 def _attack_table(deltas: List[int]) -> Tuple[List[Bitboard], List[Dict[Bitboard, Bitboard]]]:
+    # The masks are computed right away, the attack tables of the squares
+    # only when they are used (see _LazyAttackTable).
     mask_table = list()
-    attack_table = list()
+    attack_table = list()  # type: List[Dict[Bitboard, Bitboard]]
 
     for square in SQUARES:
-        attacks = dict()
-
-        mask = _sliding_attacks(square, 0, deltas) & ~_edges(square)
-        for subset in _carry_rippler(mask):
-            attacks[subset] = _sliding_attacks(square, subset, deltas)
-
-        attack_table.append(attacks)
+        mask = BB_EMPTY
+        for delta in deltas:
+            mask |= _ray_mask(_SLIDER_RAYS[delta][square])
         mask_table.append(mask)
+        attack_table.append(_LazyAttackTable(attack_table, square, deltas))
 
     return mask_table, attack_table
 
+def _empty_board_attacks(deltas: List[int]) -> List[Bitboard]:
+    attacks = list()
+    for square in SQUARES:
+        bb = BB_EMPTY
+        for delta in deltas:
+            for bb_ray in _SLIDER_RAYS[delta][square]:
+                bb |= bb_ray
+        attacks.append(bb)
+    return attacks
+
 BB_DIAG_MASKS, BB_DIAG_ATTACKS = _attack_table([-9, -7, 7, 9])
 BB_FILE_MASKS, BB_FILE_ATTACKS = _attack_table([-8, 8])
 BB_RANK_MASKS, BB_RANK_ATTACKS = _attack_table([-1, 1])
+# The rank and file tables merged, so that the attacks of a rook take a
+# single lookup.
+BB_ROOK_MASKS, BB_ROOK_ATTACKS = _attack_table([-8, -1, 1, 8])
+
+# The attacks of sliders on an empty board
+BB_DIAG_RAYS = _empty_board_attacks([-9, -7, 7, 9])
+BB_ROOK_RAYS = _empty_board_attacks([-8, -1, 1, 8])
 
 
 def _rays() -> Tuple[List[List[Bitboard]], List[List[Bitboard]]]:
-    rays = list()
-    between = list()
+    rays = [[BB_EMPTY] * 64 for _ in SQUARES]
+    between = [[BB_EMPTY] * 64 for _ in SQUARES]
     for a, bb_a in enumerate(BB_SQUARES):
-        rays_row = list()
-        between_row = list()
-        for b, bb_b in enumerate(BB_SQUARES):
-            if BB_DIAG_ATTACKS[a][0] & bb_b:
-                rays_row.append((BB_DIAG_ATTACKS[a][0] & BB_DIAG_ATTACKS[b][0]) | bb_a | bb_b)
-                between_row.append(BB_DIAG_ATTACKS[a][BB_DIAG_MASKS[a] & bb_b] & BB_DIAG_ATTACKS[b][BB_DIAG_MASKS[b] & bb_a])
-            elif BB_RANK_ATTACKS[a][0] & bb_b:
-                rays_row.append(BB_RANK_ATTACKS[a][0] | bb_a)
-                between_row.append(BB_RANK_ATTACKS[a][BB_RANK_MASKS[a] & bb_b] & BB_RANK_ATTACKS[b][BB_RANK_MASKS[b] & bb_a])
-            elif BB_FILE_ATTACKS[a][0] & bb_b:
-                rays_row.append(BB_FILE_ATTACKS[a][0] | bb_a)
-                between_row.append(BB_FILE_ATTACKS[a][BB_FILE_MASKS[a] & bb_b] & BB_FILE_ATTACKS[b][BB_FILE_MASKS[b] & bb_a])
-            else:
-                rays_row.append(BB_EMPTY)
-                between_row.append(BB_EMPTY)
-        rays.append(rays_row)
-        between.append(between_row)
+        for delta in [1, 7, 8, 9]:
+            # the whole line through a
+            line = bb_a
+            for bb in _SLIDER_RAYS[delta][a] + _SLIDER_RAYS[-delta][a]:
+                line |= bb
+            for direction in [delta, -delta]:
+                walked = BB_EMPTY
+                for bb_b in _SLIDER_RAYS[direction][a]:
+                    b = msb(bb_b)
+                    rays[a][b] = line
+                    between[a][b] = walked
+                    walked |= bb_b
     return rays, between
 
 BB_RAYS, BB_BETWEEN = _rays()
@@ -462,21 +593,56 @@ class Piece:
 
 BoardT = TypeVar("BoardT", bound="Board")
 
+# The layout of a packed move code (see Move.code): bits 0-5 hold the from
+# square, bits 6-11 the to square, bits 12-14 the promotion or drop piece type
+# and bit 15 is set for drops.
+MOVE_TO_SHIFT = 6
+MOVE_PIECE_SHIFT = 12
+MOVE_DROP_FLAG = 1 << 15
+
+def move_code(from_square: Square, to_square: Square, promotion: Optional[PieceType] = None, drop: Optional[PieceType] = None) -> int:
+    """
+    Packs a move into a 16-bit integer, see :attr:`Move.code`.
+    """
+    if drop:
+        return from_square | to_square << MOVE_TO_SHIFT | drop << MOVE_PIECE_SHIFT | MOVE_DROP_FLAG
+    return from_square | to_square << MOVE_TO_SHIFT | (promotion or 0) << MOVE_PIECE_SHIFT
+
 class Move:
     """
     Represents a move from a square to a square and possibly the promotion
     piece type.
 
     Drops and null moves are supported.
+
+    Every move also has a packed 16-bit :attr:`code` (see :func:`move_code()`).
+    The move generators yield interned moves (see :func:`Move.from_code()`),
+    which are shared between positions and must not be modified.
     """
 
+    __slots__ = ("from_square", "to_square", "promotion", "drop", "_board", "_capture", "code")
+
     def __init__(self, from_square: Square, to_square: Square, promotion: Optional[PieceType] = None, drop: Optional[PieceType] = None, board: Optional[BoardT] = None, capture: Optional[bool] = False) -> None:
         self.from_square = from_square
         self.to_square = to_square
         self.promotion = promotion
         self.drop = drop
-        self.board = board
-        self.capture = capture
+        self._board = board
+        self._capture = capture
+        self.code = move_code(from_square, to_square, promotion, drop)
+
+    @property
+    def board(self) -> Optional[BoardT]:
+        """
+        The board given to the constructor (None for generated moves). Read-only, like
+        :attr:`capture`, so that an interned move can't be changed for every position.
+        """
+        return self._board
+
+    @property
+    def capture(self) -> Optional[bool]:
+        """Whether the constructor was told that the move is a capture (False for generated moves)."""
+        return self._capture
 
     def uci(self) -> str:
         """
@@ -504,11 +670,7 @@ class Move:
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, Move):
-            return (
-                self.from_square == other.from_square and
-                self.to_square == other.to_square and
-                self.promotion == other.promotion and
-                self.drop == other.drop)
+            return self.code == other.code
         else:
             return NotImplemented
 
@@ -519,7 +681,16 @@ class Move:
         return self.uci()
 
     def __hash__(self) -> int:
-        return hash((self.to_square, self.from_square, self.promotion, self.drop))
+        return self.code
+
+    @classmethod
+    def from_code(cls, code: int) -> "Move":
+        """
+        Gets the interned move with the packed move code *code* (see
+        :func:`move_code()`). There is only one interned move per code, so
+        the result must not be modified.
+        """
+        return _MOVES[code]
 
     @classmethod
     def from_uci(cls, uci: str) -> "Move":
@@ -561,6 +732,24 @@ class Move:
         return cls(0, 0)
 
 
+class _MoveCache(dict):
+    """
+    The interned moves by move code, created on first use.
+    """
+
+    def __missing__(self, code: int) -> Move:
+        piece = code >> MOVE_PIECE_SHIFT & 7 or None
+        if code & MOVE_DROP_FLAG:
+            move = Move(code & 63, code >> MOVE_TO_SHIFT & 63, drop=piece)
+        else:
+            move = Move(code & 63, code >> MOVE_TO_SHIFT & 63, piece)
+        self[code] = move
+        return move
+
+_MOVES = _MoveCache()
+_move_code_of = operator.attrgetter("code")
+
+
 BaseBoardT = TypeVar("BaseBoardT", bound="BaseBoard")
 
 class BaseBoard:
@@ -707,8 +896,7 @@ class BaseBoard:
             if bb_square & self.bishops or bb_square & self.queens:
                 attacks = BB_DIAG_ATTACKS[square][BB_DIAG_MASKS[square] & self.occupied]
             if bb_square & self.rooks or bb_square & self.queens:
-                attacks |= (BB_RANK_ATTACKS[square][BB_RANK_MASKS[square] & self.occupied] |
-                            BB_FILE_ATTACKS[square][BB_FILE_MASKS[square] & self.occupied])
+                attacks |= BB_ROOK_ATTACKS[square][BB_ROOK_MASKS[square] & self.occupied]
             return attacks
 
     def attacks(self, square: Square) -> "SquareSet":
@@ -723,22 +911,21 @@ class BaseBoard:
         return SquareSet(self.attacks_mask(square))
 
     def _attackers_mask(self, color: Color, square: Square, occupied: Bitboard) -> Bitboard:
-        rank_pieces = BB_RANK_MASKS[square] & occupied
-        file_pieces = BB_FILE_MASKS[square] & occupied
-        diag_pieces = BB_DIAG_MASKS[square] & occupied
-
-        queens_and_rooks = self.queens | self.rooks
-        queens_and_bishops = self.queens | self.bishops
-
+        ours = self.occupied_co[color]
         attackers = (
             (BB_KING_ATTACKS[square] & self.kings) |
             (BB_KNIGHT_ATTACKS[square] & self.knights) |
-            (BB_RANK_ATTACKS[square][rank_pieces] & queens_and_rooks) |
-            (BB_FILE_ATTACKS[square][file_pieces] & queens_and_rooks) |
-            (BB_DIAG_ATTACKS[square][diag_pieces] & queens_and_bishops) |
-            (BB_PAWN_ATTACKS[not color][square] & self.pawns))
+            (BB_PAWN_ATTACKS[not color][square] & self.pawns)) & ours
+
+        # Only look up the slider attacks if a slider could be on the lines at all.
+        queens_and_rooks = (self.queens | self.rooks) & ours & BB_ROOK_RAYS[square]
+        if queens_and_rooks:
+            attackers |= BB_ROOK_ATTACKS[square][BB_ROOK_MASKS[square] & occupied] & queens_and_rooks
+        queens_and_bishops = (self.queens | self.bishops) & ours & BB_DIAG_RAYS[square]
+        if queens_and_bishops:
+            attackers |= BB_DIAG_ATTACKS[square][BB_DIAG_MASKS[square] & occupied] & queens_and_bishops
 
-        return attackers & self.occupied_co[color]
+        return attackers
 
     def attackers_mask(self, color: Color, square: Square) -> Bitboard:
         return self._attackers_mask(color, square, self.occupied)
@@ -818,6 +1005,105 @@ class BaseBoard:
         """
         return self.pin_mask(color, square) != BB_ALL
 
+    def _pin_rays(self, color: Color) -> Dict[Square, Bitboard]:
+        """
+        Maps the squares of the pieces of the given color that are pinned to
+        their king to the ray of the pin.
+        """
+        king = self.king(color)
+        if king is None:
+            return {}
+
+        rooks_and_queens = self.rooks | self.queens
+        bishops_and_queens = self.bishops | self.queens
+        snipers = ((BB_RANK_ATTACKS[king][0] & rooks_and_queens) |
+                   (BB_FILE_ATTACKS[king][0] & rooks_and_queens) |
+                   (BB_DIAG_ATTACKS[king][0] & bishops_and_queens))
+
+        pin_rays = {}
+        for sniper in scan_reversed(snipers & self.occupied_co[not color]):
+            b = BB_BETWEEN[king][sniper] & self.occupied
+            if b and BB_SQUARES[msb(b)] == b and b & self.occupied_co[color]:
+                pin_rays[msb(b)] = BB_RAYS[king][sniper]
+        return pin_rays
+
+    def mobility_by_piece_type(self, color: Color, *, pinned: bool = False) -> List[int]:
+        """
+        Counts the pseudo-legal moves of the pieces of the given color, indexed
+        by piece type, straight from the attack bitboards (so without
+        generating any moves and no matter whose turn it is).
+
+        Pawn advances and captures to the back rank count once for every
+        promotion, like the generated moves. Castling and en passant are
+        not counted, and neither are checks: the king may move to attacked
+        squares and the other pieces don't have to get out of check.
+
+        With *pinned*, pieces pinned to their king only count the moves along
+        the pin.
+        """
+        counts = [0] * 7
+        ours = self.occupied_co[color]
+        theirs = self.occupied_co[not color]
+        occupied = self.occupied
+        not_ours = ~ours & BB_ALL
+        empty = ~occupied & BB_ALL
+        pin_rays = self._pin_rays(color) if pinned else {}
+        pinned_mask = 0
+        for square in pin_rays:
+            pinned_mask |= BB_SQUARES[square]
+
+        # Pinned knights can't move at all.
+        for square in scan_reversed(self.knights & ours & ~pinned_mask):
+            counts[KNIGHT] += popcount(BB_KNIGHT_ATTACKS[square] & not_ours)
+
+        for square in scan_reversed(self.kings & ours):
+            counts[KING] += popcount(BB_KING_ATTACKS[square] & not_ours)
+
+        for piece_type, sliders in [(BISHOP, self.bishops), (ROOK, self.rooks), (QUEEN, self.queens)]:
+            for square in scan_reversed(sliders & ours):
+                attacks = 0
+                if piece_type != ROOK:
+                    attacks = BB_DIAG_ATTACKS[square][BB_DIAG_MASKS[square] & occupied]
+                if piece_type != BISHOP:
+                    attacks |= BB_ROOK_ATTACKS[square][BB_ROOK_MASKS[square] & occupied]
+                attacks &= not_ours & pin_rays.get(square, BB_ALL)
+                counts[piece_type] += popcount(attacks)
+
+        # The pawns that are not pinned are counted all at once, by shifting them.
+        pawns = self.pawns & ours
+        free = pawns & ~pinned_mask
+        if color == WHITE:
+            single_moves = free << 8 & empty
+            double_moves = single_moves << 8 & empty & BB_RANK_4
+            captures = [(free & ~BB_FILE_A) << 7 & theirs, (free & ~BB_FILE_H) << 9 & theirs]
+        else:
+            single_moves = free >> 8 & empty
+            double_moves = single_moves >> 8 & empty & BB_RANK_5
+            captures = [(free & ~BB_FILE_H) >> 7 & theirs, (free & ~BB_FILE_A) >> 9 & theirs]
+        for targets in [single_moves] + captures:
+            counts[PAWN] += popcount(targets) + 3 * popcount(targets & BB_BACKRANKS)
+        counts[PAWN] += popcount(double_moves)
+
+        for square in scan_reversed(pawns & pinned_mask):
+            targets = BB_PAWN_ATTACKS[color][square] & theirs
+            to_square = square + 8 if color == WHITE else square - 8
+            if BB_SQUARES[to_square] & empty:
+                targets |= BB_SQUARES[to_square]
+                double_square = to_square + 8 if color == WHITE else to_square - 8
+                if BB_SQUARES[square] & (BB_RANK_2 if color == WHITE else BB_RANK_7) and BB_SQUARES[double_square] & empty:
+                    targets |= BB_SQUARES[double_square]
+            targets &= pin_rays[square]
+            counts[PAWN] += popcount(targets) + 3 * popcount(targets & BB_BACKRANKS)
+
+        return counts
+
+    def mobility(self, color: Color, *, pinned: bool = False) -> int:
+        """
+        Counts the pseudo-legal moves of all pieces of the given color. See
+        :func:`~chess.BaseBoard.mobility_by_piece_type()`.
+        """
+        return sum(self.mobility_by_piece_type(color, pinned=pinned))
+
     def _remove_piece_at(self, square: Square) -> Optional[PieceType]:
         piece_type = self.piece_type_at(square)
         mask = BB_SQUARES[square]
@@ -1498,7 +1784,7 @@ class Board(BaseBoard):
         for from_square in scan_reversed(non_pawns):
             moves = self.attacks_mask(from_square) & ~our_pieces & to_mask
             for to_square in scan_reversed(moves):
-                yield Move(from_square, to_square)
+                yield _MOVES[from_square | to_square << MOVE_TO_SHIFT]
 
         # Generate castling moves.
         if from_mask & self.kings:
@@ -1517,13 +1803,14 @@ class Board(BaseBoard):
                 self.occupied_co[not self.turn] & to_mask)
 
             for to_square in scan_reversed(targets):
+                code = from_square | to_square << MOVE_TO_SHIFT
                 if square_rank(to_square) in [0, 7]:
-                    yield Move(from_square, to_square, QUEEN)
-                    yield Move(from_square, to_square, ROOK)
-                    yield Move(from_square, to_square, BISHOP)
-                    yield Move(from_square, to_square, KNIGHT)
+                    yield _MOVES[code | QUEEN << MOVE_PIECE_SHIFT]
+                    yield _MOVES[code | ROOK << MOVE_PIECE_SHIFT]
+                    yield _MOVES[code | BISHOP << MOVE_PIECE_SHIFT]
+                    yield _MOVES[code | KNIGHT << MOVE_PIECE_SHIFT]
                 else:
-                    yield Move(from_square, to_square)
+                    yield _MOVES[code]
 
         # Prepare pawn advance generation.
         if self.turn == WHITE:
@@ -1539,19 +1826,20 @@ class Board(BaseBoard):
         # Generate single pawn moves.
         for to_square in scan_reversed(single_moves):
             from_square = to_square + (8 if self.turn == BLACK else -8)
+            code = from_square | to_square << MOVE_TO_SHIFT
 
             if square_rank(to_square) in [0, 7]:
-                yield Move(from_square, to_square, QUEEN)
-                yield Move(from_square, to_square, ROOK)
-                yield Move(from_square, to_square, BISHOP)
-                yield Move(from_square, to_square, KNIGHT)
+                yield _MOVES[code | QUEEN << MOVE_PIECE_SHIFT]
+                yield _MOVES[code | ROOK << MOVE_PIECE_SHIFT]
+                yield _MOVES[code | BISHOP << MOVE_PIECE_SHIFT]
+                yield _MOVES[code | KNIGHT << MOVE_PIECE_SHIFT]
             else:
-                yield Move(from_square, to_square)
+                yield _MOVES[code]
 
         # Generate double pawn moves.
         for to_square in scan_reversed(double_moves):
             from_square = to_square + (16 if self.turn == BLACK else -16)
-            yield Move(from_square, to_square)
+            yield _MOVES[from_square | to_square << MOVE_TO_SHIFT]
 
         # Generate en passant captures.
         if self.ep_square:
@@ -1570,7 +1858,7 @@ class Board(BaseBoard):
             BB_RANKS[4 if self.turn else 3])
 
         for capturer in scan_reversed(capturers):
-            yield Move(capturer, self.ep_square)
+            yield _MOVES[capturer | self.ep_square << MOVE_TO_SHIFT]
 
     def generate_pseudo_legal_captures(self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL) -> Iterator[Move]:
         return itertools.chain(
@@ -2926,6 +3214,90 @@ class Board(BaseBoard):
         touched = BB_SQUARES[move.from_square] ^ BB_SQUARES[move.to_square]
         return bool(touched & self.pawns or touched & self.occupied_co[not self.turn])
 
+    def see(self, move: Move, values: Optional[List[float]] = None) -> float:
+        """
+        Static exchange evaluation: the material the side to move wins
+        (or loses, if negative) with the pseudo-legal *move* and the best sequence
+        of captures on its target square that follows it, where each side can
+        stop capturing whenever it likes. Sliders that attack through the pieces
+        that already captured (x-rays) take part, pins and checks are ignored.
+
+        :param values: the piece values by piece type, default :data:`chess.PIECE_VALUES`
+        """
+        return self._see(move, values or PIECE_VALUES, None)
+
+    def see_ge(self, move: Move, threshold: float = 0, **kwargs) -> bool:
+        """
+        Checks if the static exchange evaluation of *move* is at least
+        *threshold*, i.e. ``see(move) >= threshold``. The keyword arguments are
+        passed to :func:`~chess.Board.see()`.
+        """
+        return self.see(move, **kwargs) >= threshold
+
+    def _see(self, move: Move, values: List[float], pocket_values: Optional[List[float]]) -> float:
+        # pocket_values: if not None, the value of every captured piece to the side capturing it,
+        # on top of what the other side loses (a promoted piece is captured as a pawn)
+        if not move or self.is_castling(move):
+            return 0
+        to_square = move.to_square
+        occupied = self.occupied
+        promoted = bool(self.promoted & BB_SQUARES[to_square])
+        if move.drop:
+            captured = None
+            piece_type = move.drop
+        else:
+            piece_type = self.piece_type_at(move.from_square)
+            if piece_type is None:
+                return 0
+            occupied &= ~BB_SQUARES[move.from_square]
+            if self.is_en_passant(move):
+                captured = PAWN
+                occupied &= ~BB_SQUARES[self.ep_square - 8 if self.turn == WHITE else self.ep_square + 8]
+            else:
+                captured = self.piece_type_at(to_square)
+
+        gains = [0]
+        if captured:
+            gains[0] = values[captured]
+            if pocket_values is not None:
+                gains[0] += pocket_values[PAWN if promoted else captured]
+        promoted = False
+        if move.promotion:
+            gains[0] += values[move.promotion] - values[PAWN]
+            piece_type = move.promotion
+            promoted = True
+
+        color = not self.turn
+        while True:
+            attackers = self._attackers_mask(color, to_square, occupied) & occupied
+            if not attackers:
+                break
+            # the least valuable attacker captures next
+            for attacker_type in PIECE_TYPES:
+                attacker_mask = attackers & self.pieces_mask(attacker_type, color)
+                if attacker_mask:
+                    break
+            if attacker_type == KING and self._attackers_mask(not color, to_square, occupied) & occupied:
+                # the king can't capture a defended piece
+                break
+            gain = values[piece_type]
+            if pocket_values is not None:
+                gain += pocket_values[PAWN if promoted else piece_type]
+            promoted = False
+            piece_type = attacker_type
+            if attacker_type == PAWN and BB_SQUARES[to_square] & (BB_RANK_1 | BB_RANK_8):
+                gain += values[QUEEN] - values[PAWN]
+                piece_type = QUEEN
+                promoted = True
+            gains.append(gain - gains[-1])
+            occupied &= ~BB_SQUARES[lsb(attacker_mask)]
+            color = not color
+
+        # each side only continues the exchange if it doesn't lose by it
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
     def _reduces_castling_rights(self, move: Move) -> bool:
         cr = self.clean_castling_rights()
         touched = BB_SQUARES[move.from_square] ^ BB_SQUARES[move.to_square]
@@ -3269,7 +3641,7 @@ class Board(BaseBoard):
 
         if BB_SQUARES[king] & from_mask:
             for to_square in scan_reversed(BB_KING_ATTACKS[king] & ~self.occupied_co[self.turn] & ~attacked & to_mask):
-                yield Move(king, to_square)
+                yield _MOVES[king | to_square << MOVE_TO_SHIFT]
 
         checker = msb(checkers)
         if BB_SQUARES[checker] == checkers:
@@ -3305,6 +3677,122 @@ class Board(BaseBoard):
         else:
             yield from self.generate_pseudo_legal_moves(from_mask, to_mask)
 
+    def legal_moves_into(self, buffer: List[Move], from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL) -> List[Move]:
+        """
+        Replaces the contents of *buffer* with the legal moves, in the same
+        order as :func:`~chess.Board.generate_legal_moves()`, and returns it.
+
+        Meant for searches, which can reuse one buffer per ply: there is no
+        generator overhead, and unless the side to move is in check only the
+        moves of the king and of pinned pieces and en passant captures are
+        tested one by one.
+        """
+        del buffer[:]
+        if self.is_variant_end():
+            return buffer
+
+        our_pieces = self.occupied_co[self.turn]
+        king_mask = self.kings & our_pieces
+        if not king_mask:
+            buffer.extend(self.generate_pseudo_legal_moves(from_mask, to_mask))
+            return buffer
+
+        king = msb(king_mask)
+        blockers = self._slider_blockers(king)
+        checkers = self.attackers_mask(not self.turn, king)
+        if checkers:
+            buffer.extend(move for move in self._generate_evasions(king, checkers, from_mask, to_mask)
+                          if self._is_safe(king, blockers, move))
+            return buffer
+
+        append = buffer.append
+        moves = _MOVES
+        pinned_to = BB_RAYS[king]
+
+        # Generate piece moves; pinned pieces only move along the pin.
+        for from_square in scan_reversed(our_pieces & ~self.pawns & from_mask):
+            targets = self.attacks_mask(from_square) & ~our_pieces & to_mask
+            if from_square == king:
+                for to_square in scan_reversed(targets):
+                    if not self.is_attacked_by(not self.turn, to_square):
+                        append(moves[from_square | to_square << MOVE_TO_SHIFT])
+                continue
+            if BB_SQUARES[from_square] & blockers:
+                targets &= pinned_to[from_square]
+            for to_square in scan_reversed(targets):
+                append(moves[from_square | to_square << MOVE_TO_SHIFT])
+
+        # Generate castling moves.
+        if from_mask & self.kings:
+            buffer.extend(self.generate_castling_moves(from_mask, to_mask))
+
+        pawns = self.pawns & our_pieces & from_mask
+        if not pawns:
+            return buffer
+        pinned_pawns = pawns & blockers
+
+        # Generate pawn captures.
+        their_pieces = self.occupied_co[not self.turn] & to_mask
+        pawn_attacks = BB_PAWN_ATTACKS[self.turn]
+        for from_square in scan_reversed(pawns):
+            targets = pawn_attacks[from_square] & their_pieces
+            if BB_SQUARES[from_square] & pinned_pawns:
+                targets &= pinned_to[from_square]
+            for to_square in scan_reversed(targets):
+                code = from_square | to_square << MOVE_TO_SHIFT
+                if BB_SQUARES[to_square] & BB_BACKRANKS:
+                    append(moves[code | QUEEN << MOVE_PIECE_SHIFT])
+                    append(moves[code | ROOK << MOVE_PIECE_SHIFT])
+                    append(moves[code | BISHOP << MOVE_PIECE_SHIFT])
+                    append(moves[code | KNIGHT << MOVE_PIECE_SHIFT])
+                else:
+                    append(moves[code])
+
+        # Generate pawn advances.
+        if self.turn == WHITE:
+            single_moves = pawns << 8 & ~self.occupied
+            double_moves = single_moves << 8 & ~self.occupied & (BB_RANK_3 | BB_RANK_4)
+            step = -8
+        else:
+            single_moves = pawns >> 8 & ~self.occupied
+            double_moves = single_moves >> 8 & ~self.occupied & (BB_RANK_6 | BB_RANK_5)
+            step = 8
+
+        for to_square in scan_reversed(single_moves & to_mask):
+            from_square = to_square + step
+            if BB_SQUARES[from_square] & pinned_pawns and not pinned_to[from_square] & BB_SQUARES[to_square]:
+                continue
+            code = from_square | to_square << MOVE_TO_SHIFT
+            if BB_SQUARES[to_square] & BB_BACKRANKS:
+                append(moves[code | QUEEN << MOVE_PIECE_SHIFT])
+                append(moves[code | ROOK << MOVE_PIECE_SHIFT])
+                append(moves[code | BISHOP << MOVE_PIECE_SHIFT])
+                append(moves[code | KNIGHT << MOVE_PIECE_SHIFT])
+            else:
+                append(moves[code])
+
+        for to_square in scan_reversed(double_moves & to_mask):
+            from_square = to_square + 2 * step
+            if BB_SQUARES[from_square] & pinned_pawns and not pinned_to[from_square] & BB_SQUARES[to_square]:
+                continue
+            append(moves[from_square | to_square << MOVE_TO_SHIFT])
+
+        # Generate en passant captures.
+        if self.ep_square:
+            for move in self.generate_pseudo_legal_ep(from_mask, to_mask):
+                if self._is_safe(king, blockers, move):
+                    append(move)
+
+        return buffer
+
+    def generate_legal_move_codes(self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL) -> Iterator[int]:
+        """
+        Generates the packed codes (see :attr:`Move.code`) of the legal moves,
+        e.g. to keep them in search tables instead of the moves.
+        :func:`Move.from_code()` gets the move back.
+        """
+        return map(_move_code_of, self.generate_legal_moves(from_mask, to_mask))
+
     def generate_legal_ep(self, from_mask: Bitboard = BB_ALL, to_mask: Bitboard = BB_ALL) -> Iterator[Move]:
         if self.is_variant_end():
             return
@@ -3,6 +3,11 @@ This file contains a Bughouse AIs
 
 """
 
+import array
+import collections
+import copy
+import csv
+import json
 import math
 
 from pychess import chess as chess
@@ -10,15 +15,271 @@ from pychess.chess import variant
 from pychess.chess import utility as utility
 from typing import ClassVar, Callable, Dict, Generic, Hashable, Iterable, Iterator, List, Mapping, MutableSet, Optional, SupportsInt, Tuple, Type, TypeVar, Union
 import time
-import multiprocessing as mp
 import logging
 import pickle
 import random
+import struct
 
 # The default maximum allowed depth of search. May be overridden in
 # a specific instance of an AI
 MAX_DEPTH = 10
 
+# The default number of slots in a transposition table
+TT_DEFAULT_SIZE = 2 ** 18
+# The default number of slots in an evaluation cache
+EVAL_CACHE_DEFAULT_SIZE = 2 ** 16
+
+
+TTEntry = collections.namedtuple("TTEntry", "key depth flag score move generation")
+
+# A SolitaryAI node also depends on the board that moves next and on where it is in
+# the four move cycle, so these keys are xored into the zobrist hash of its positions
+_solitary_rng = random.Random(0x736f6c6974617279)
+SOLITARY_TT_KEYS = {board_id: [_solitary_rng.getrandbits(64) for _ in range(4)]
+                    for board_id in chess.BUGHOUSE_BOARD_IDS}
+del _solitary_rng
+
+# The half width of the aspiration window around the value of the previous iteration
+ASPIRATION_WINDOW = 50
+# The width of the null window that principal variation search tests moves with
+PVS_NULL_WINDOW = 1
+
+# The maximum number of plies searched by the quiescence search
+QUIESCENCE_MAX_DEPTH = 8
+# A capture is not searched by the quiescence search if winning the captured piece
+# plus this margin can't raise the value above alpha (delta pruning)
+DELTA_MARGIN = 200
+
+# The size of the per ply and per depth arrays of Statistics; deeper plies are not counted
+STATS_MAX_PLY = 64
+# The number of move indices Statistics counts the cutoffs of; the last one also counts all later moves
+STATS_CUTOFF_SLOTS = 16
+# Statistics times one out of this many evaluations (0 for none) and estimates the total from them
+EVAL_TIME_SAMPLE_RATE = 64
+
+# The number of killer moves remembered per depth
+KILLER_SLOTS = 2
+
+# Time management; all times are in seconds.
+# The number of nodes searched between two looks at the clock
+TIME_CHECK_INTERVAL = 256
+# The number of moves the remaining time is split over when the time control doesn't say
+DEFAULT_MOVES_TO_GO = 30
+# The hard limit of a move is at most this many times its soft limit
+HARD_TIME_FACTOR = 3
+# With a fixed time per move, no new iteration is started after this part of it is used up
+MOVETIME_SOFT_RATIO = 0.5
+# The time always kept on the clock (for the overhead outside of the search)
+TIME_MARGIN = 0.05
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the hard deadline of the current move has passed.
+    Iterative deepening catches it and returns the move of the last completed depth.
+    """
+    pass
+
+
+class TranspositionTable:
+    """
+    A bounded transposition table for the minimax/maximin searches, keyed on
+    BughouseSuperBoard.zobrist_hash().
+
+    The table is a fixed size list of slots indexed by key % size, and each
+    slot holds at most one TTEntry. The depth of an entry is the number of plies
+    that were still left to search below the position, flag tells whether score
+    is EXACT, a LOWER bound (the search failed high) or an UPPER bound (the
+    search failed low), and move is the best move found (may be None).
+
+    When two positions fall into the same slot, the replacement policy decides
+    which one is kept:
+        - "always": the new entry always replaces the old one
+        - "depth": the new entry only replaces the old one if it was searched
+            at least as deep, or if the old one is left over from an earlier
+            search (see new_search())
+    """
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    REPLACEMENT_POLICIES = ("always", "depth")
+
+    def __init__(self, size: int = TT_DEFAULT_SIZE, replacement: str = "depth"):
+        if size < 1:
+            raise ValueError("a transposition table needs at least one slot, got size {}".format(size))
+        if replacement not in self.REPLACEMENT_POLICIES:
+            raise ValueError("unknown replacement policy {0}; expected one of {1}".format(
+                replacement, self.REPLACEMENT_POLICIES))
+        self.size = size
+        self.replacement = replacement
+        self.generation = 0
+        self.table = [None] * size  # type: List[Optional[TTEntry]]
+
+    def new_search(self):
+        """
+        Marks the start of a new search (i.e. a new move). Entries from earlier
+        searches are kept, but may be replaced by any new entry.
+        """
+        self.generation += 1
+
+    def clear(self):
+        self.table = [None] * self.size
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        """
+        :return: the entry stored for key, or None if there is none
+        """
+        entry = self.table[key % self.size]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: float, move: Optional[chess.Move]):
+        idx = key % self.size
+        old = self.table[idx]
+        if (old is not None and self.replacement == "depth" and old.generation == self.generation
+                and old.depth > depth):
+            return
+        if old is not None and old.key == key and move is None:
+            # don't forget the best move of the position just because this search did not find one
+            move = old.move
+        self.table[idx] = TTEntry(key, depth, flag, score, move, self.generation)
+
+    @classmethod
+    def flag_for(cls, score: float, a: float, b: float) -> int:
+        """
+        :param score: the score returned by a search with the window (a, b)
+        :return: the bound type of score
+        """
+        if score <= a:
+            return cls.UPPER
+        if score >= b:
+            return cls.LOWER
+        return cls.EXACT
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self.table if entry is not None)
+
+
+class EvalCache:
+    """
+    A bounded cache of the evaluations of the states at the cutoff of the search (see
+    AI.utility()), so a state that is reached again (in the next iteration of iterative
+    deepening, through a transposition or in the searches of find_dangerous_drops() and
+    find_valuable_drops()) is not evaluated again.
+
+    Like TranspositionTable, the cache is a fixed size list of slots indexed by the
+    zobrist hash of the evaluated base board % size. The value of a state also depends
+    on the player it is evaluated for and, for a communicating agent, on the diff pockets
+    and on the partner's advice, so these are part of the key (see key()) and an entry is
+    only used if all of them are the same. A new entry always replaces the old one.
+    """
+
+    def __init__(self, size: int = EVAL_CACHE_DEFAULT_SIZE):
+        if size < 1:
+            raise ValueError("an evaluation cache needs at least one slot, got size {}".format(size))
+        self.size = size
+        self.table = [None] * size  # type: List[Optional[Tuple[tuple, float]]]
+
+    def clear(self):
+        self.table = [None] * self.size
+
+    @staticmethod
+    def key(zobrist: int, player: chess.Color, ally_diff_pocket: variant.BughousePocketT = None,
+            enemy_diff_pocket: variant.BughousePocketT = None, to_protect=None, to_capture=None) -> tuple:
+        """
+        :return: the key of the evaluation of the base board with the hash zobrist for player
+            with the given arguments of AI.utility()
+        """
+        if ally_diff_pocket is None and enemy_diff_pocket is None and to_protect is None and to_capture is None:
+            return zobrist, player
+        return (zobrist, player,
+                ally_diff_pocket.key() if ally_diff_pocket is not None else None,
+                enemy_diff_pocket.key() if enemy_diff_pocket is not None else None,
+                tuple(sorted(to_protect.items())) if to_protect is not None else None,
+                tuple(sorted(to_capture.items())) if to_capture is not None else None)
+
+    def probe(self, key: tuple) -> Optional[float]:
+        """
+        :return: the value stored for key, or None if there is none
+        """
+        entry = self.table[key[0] % self.size]
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def store(self, key: tuple, value: float):
+        self.table[key[0] % self.size] = (key, value)
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self.table if entry is not None)
+
+
+# The transposition tables and evaluation caches of the worker processes of
+# PartneredAI.parallel_root_search(), by agent; they are kept between the tasks (and the
+# moves) of the same agent
+_worker_tables = dict()
+_worker_eval_caches = dict()
+
+
+def _search_root_move(task):
+    """
+    Searches one root move for PartneredAI.parallel_root_search() in a worker process.
+
+    :param task: (worker agent, super board, the root move, depth, search id), see
+        PartneredAI.worker_copy()
+    :return: (the value of the move from white's point of view or None if the search
+        ran out of time, states, quiescence states, transposition table hits, evaluations,
+        evaluation cache hits, evaluation cache lookups), the counts of this task alone
+    """
+    agent, board, move, depth, search_id = task
+    # a worker that doesn't fork from the agent's process has the terms to set up too
+    utility.use_eval_tables()
+    # the tasks of a chunk share the same unpickled agent, so every task counts from zero
+    agent.statistics = Statistics(agent.max_depth, detailed=False)
+    tt_size, tt_replacement = agent.worker_tt
+    if tt_size:
+        table_key = (agent.name, agent.board_id, agent.color)
+        table, table_search_id = _worker_tables.get(table_key, (None, None))
+        if table is None or table.size != tt_size:
+            table = TranspositionTable(tt_size, tt_replacement)
+        agent.transposition_table = table
+        if table_search_id != search_id:
+            agent.tt_new_search()
+        _worker_tables[table_key] = (table, search_id)
+    if agent.worker_eval_cache:
+        cache_key = (agent.name, agent.board_id, agent.color)
+        cache = _worker_eval_caches.get(cache_key)
+        if cache is None or cache.size != agent.worker_eval_cache:
+            cache = _worker_eval_caches[cache_key] = EvalCache(agent.worker_eval_cache)
+        agent.eval_cache = cache
+
+    def cutoff(b, d): return d >= depth
+    board_id = agent.board_id
+    original_ally_pocket = None
+    original_enemy_pocket = None
+    if agent.communicating:
+        other_board = "B" if board_id == "A" else "A"
+        original_ally_pocket = board.get_base_board(other_board).get_pocket(not agent.color)
+        original_enemy_pocket = board.get_base_board(other_board).get_pocket(agent.color)
+    turn = board.get_base_board(board_id).turn
+    # the tasks of a chunk share the same unpickled board, so it has to be restored after the search
+    root_ply = len(board.board_push_pop_stack)
+    nxt_dep = agent.nxt_dep_func(self=agent, depth=0, move=move) if agent.nxt_dep_func else 1
+    board.push(move, board_id)
+    try:
+        val, _ = agent.negamax(board, board_id, nxt_dep, cutoff, original_ally_pocket=original_ally_pocket,
+                               original_enemy_pocket=original_enemy_pocket)
+        # negamax() scores for the side to move after the move
+        val = val if turn == chess.BLACK else -val
+    except SearchTimeout:
+        val = None
+    agent.unwind(board, root_ply)
+    stats = agent.statistics
+    return (val, stats.get_states_evaluated(), stats.get_q_states(), stats.tt_hits, stats.eval_func_count,
+            stats.eval_cache_hits, stats.eval_cache_lookups)
+
 
 class CommChannel:
     """
@@ -59,6 +320,83 @@ class CommChannel:
         return self.please_protect.copy()
 
 
+class SearchTrace:
+    """
+    Writes the search tree of an AI to a compact binary file for debugging it offline
+    (see the trace argument of AI). Read it back with SearchTrace.read().
+
+    After a header (MAGIC and VERSION), the file is a sequence of RECORD structs, one for every
+    move searched, written after the move was popped: the search function (an index of FUNCS),
+    the depth, the board (0 for A, 1 for B), the move (see encode_move()), the value the move
+    got and the bounds a and b it was searched with. Since a move is written after its subtree,
+    the records are in post-order. A record with the function ITERATION marks the start of an
+    iteration of iterative deepening, its depth is the depth of the iteration.
+    """
+
+    MAGIC = b"BHTR"
+    VERSION = 1
+    RECORD = struct.Struct("<BBBHfff")
+    FUNCS = ["minimax", "maximin", "negamax"]
+    ITERATION = 255
+    # the number of bytes buffered before they are written
+    BUFFER_SIZE = 1 << 16
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = open(filename, "wb")
+        self._file.write(self.MAGIC + bytes([self.VERSION]))
+        self._buffer = bytearray()
+        self._func_codes = {func: i for i, func in enumerate(self.FUNCS)}
+
+    @staticmethod
+    def encode_move(move: Optional[chess.Move]) -> int:
+        """
+        Packs a move into 16 bits, see chess.Move.code. None and the null move are 0.
+        """
+        return move.code if move else 0
+
+    @staticmethod
+    def decode_move(code: int) -> chess.Move:
+        return chess.Move.from_code(code)
+
+    def write(self, func: str, depth: int, board_id: str, move: chess.Move, value: float, a: float, b: float):
+        self._buffer += self.RECORD.pack(self._func_codes[func], depth, board_id == chess.B,
+                                         self.encode_move(move), value, a, b)
+        if len(self._buffer) >= self.BUFFER_SIZE:
+            self.flush()
+
+    def iteration(self, depth: int):
+        """
+        Marks the start of an iteration of iterative deepening to depth
+        """
+        self._buffer += self.RECORD.pack(self.ITERATION, depth, 0, 0, 0.0, 0.0, 0.0)
+
+    def flush(self):
+        self._file.write(self._buffer)
+        self._buffer = bytearray()
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    @classmethod
+    def read(cls, filename: str) -> Iterator[tuple]:
+        """
+        Yields the records of a trace file as (func, depth, board_id, move, value, a, b),
+        where func is "iteration" for the start of an iteration.
+        """
+        with open(filename, "rb") as f:
+            header = f.read(len(cls.MAGIC) + 1)
+            if header[:len(cls.MAGIC)] != cls.MAGIC or header[-1] != cls.VERSION:
+                raise ValueError("{} is not a search trace of version {}".format(filename, cls.VERSION))
+            data = f.read()
+        for code, depth, board, move, value, a, b in cls.RECORD.iter_unpack(data):
+            func = "iteration" if code == cls.ITERATION else cls.FUNCS[code]
+            yield func, depth, chess.B if board else chess.A, cls.decode_move(move), value, a, b
+
+
 class AI:
     """
     The superclass of all AIs
@@ -66,7 +404,10 @@ class AI:
 
     def __init__(self, name: str, board: variant.BughouseSuperBoard, eval_class: utility.UtilityEvalSuper,
                  max_depth: int = MAX_DEPTH, print_stats: bool = False, log: bool = False, max_states: bool = 1000000,
-                 iter_deep: bool = True, nxt_dep_func=None, move_order_fn=None, allow_fivefold_repetition=False):
+                 iter_deep: bool = True, nxt_dep_func=None, move_order_fn=None, allow_fivefold_repetition=False,
+                 tt_size: int = 0, tt_replacement: str = "depth", movetime: float = None, pvs: bool = False,
+                 quiescence: bool = False, quiescence_drops: bool = False, detailed_stats: bool = True,
+                 trace: str = None, eval_cache_size: int = 0):
         """
         :param name:
         :param max_depth:
@@ -87,10 +428,40 @@ class AI:
             are made with different parameter requirements.
         :param move_order_fn: default is None; if this is None, the ordering of move evaluation
             is determined by the move generator; otherwise, if it is not None, it must be an
-            instance method (called with self.fun()) that determines the ordering of move evaluation
+            instance method (called with self.fun()) that determines the ordering of move evaluation.
+            It is called with the keyword arguments 'moves=moves', 'board=base_board' (the board
+            the moves are for) and 'depth=depth', see heuristic_move_reorder()
         :param allow_fivefold_repetition: if you allow fivefold repetition, then a draw may occur from
             such case; otherwise, a move that would cause fivefold repetition is not allowed
             to be chosen, this may cause a losing move to be chosen
+        :param tt_size: default is 0 (no transposition table); otherwise, the number of
+            slots of the transposition table used by the search. The table is kept between
+            the iterations of iterative deepening (and between moves, unless the agent
+            communicates with its partner, see TranspositionTable)
+        :param tt_replacement: the replacement policy of the transposition table; either
+            "depth" or "always"
+        :param movetime: default is None; if not None, the number of seconds to spend on
+            every move. This (and set_clock()) only limits iterative deepening: no new depth is
+            started after the soft limit of the move, and the depth being searched is given up
+            at the hard limit, returning the best move of the last completed depth
+        :param pvs: default is False; if True, searches with negamax() (principal variation
+            search, with aspiration windows between the iterations of iterative deepening)
+            instead of minimax()/maximin(). Only PartneredAI implements this
+        :param quiescence: default is False; if True, the states at the cutoff are not
+            evaluated directly, but with a quiescence search over the captures (see quiescence()).
+            Only PartneredAI implements this
+        :param quiescence_drops: default is False; if True, the first ply of the quiescence
+            search also searches the drops that give check
+        :param detailed_stats: default is True; if False, the statistics only count the states
+            (see Statistics)
+        :param trace: default is None; otherwise, the name of a file the searched moves are
+            written to (see SearchTrace). Call close_trace() at the end of the game
+        :param eval_cache_size: default is 0 (no evaluation cache); otherwise, the number of
+            slots of the cache of the evaluations of the states at the cutoff (see EvalCache)
+
+        The searches only call the log_ methods (if log) and trace_move() (if trace) when
+        self.traced, which is checked once per state, so an agent that doesn't log or trace
+        doesn't pay for them.
         """
         self.name = name
         self.max_depth = max_depth  # The maximum depth of search
@@ -102,6 +473,30 @@ class AI:
         self.nxt_dep_func = nxt_dep_func
         self.move_order_fn = move_order_fn
         self.allow_fivefold_repetition = allow_fivefold_repetition
+        self.transposition_table = TranspositionTable(tt_size, tt_replacement) if tt_size else None
+        self.eval_cache = EvalCache(eval_cache_size) if eval_cache_size else None
+        # the evaluations read the terms that the boards keep up to date; the copies of
+        # the board that are searched set them up
+        utility.use_eval_tables()
+        # the depth at which the current search is cut off; depth - tt_horizon is
+        # the depth (draft) of the entries stored in the transposition table
+        self.tt_horizon = max_depth
+        self.movetime = movetime
+        self.pvs = pvs
+        self.quiescence_search = quiescence
+        self.quiescence_drops = quiescence_drops
+        self.detailed_stats = detailed_stats
+        self.tracer = SearchTrace(trace) if trace else None
+        self.traced = bool(log) or self.tracer is not None
+        self.clock = None  # see set_clock()
+        # the killer moves of every depth and the history scores, see heuristic_move_reorder()
+        self.killers = [[None] * KILLER_SLOTS for _ in range(max_depth + 1)]
+        self.history = [0] * (2 * 7 * 64)
+        # the reusable move lists of search_moves(), by ply
+        self.move_buffers = list()
+        # the time at which the depth being searched is given up; None if there is none
+        self.hard_deadline = None
+        self._time_check_countdown = TIME_CHECK_INTERVAL
 
     def minimax(self, *args, **kwargs):
         """
@@ -110,6 +505,12 @@ class AI:
         """
         raise NotImplementedError()
 
+    def negamax(self, *args, **kwargs):
+        """
+        Should be implemented by subclasses that support pvs.
+        """
+        raise NotImplementedError()
+
     def maximin(self, *args, **kwargs):
         """
         Should be implemented by subclasses, including parameter types, because this varies
@@ -128,6 +529,59 @@ class AI:
     def iter_deep_choose_move(self) -> chess.Move:
         raise NotImplementedError()
 
+    def set_clock(self, wtime: float, btime: float, winc: float = 0.0, binc: float = 0.0,
+                  movestogo: int = None):
+        """
+        Sets the clock that the time for the next moves is taken from, like the
+        wtime/btime/winc/binc/movestogo of the UCI go command (but in seconds).
+        Should be called before every move with the time left on the clocks.
+
+        :param wtime: the time left for white
+        :param btime: the time left for black
+        :param winc: the increment of white per move
+        :param binc: the increment of black per move
+        :param movestogo: the number of moves until the next time control;
+            None for sudden death (then DEFAULT_MOVES_TO_GO is assumed)
+        """
+        self.clock = (wtime, btime, winc, binc, movestogo)
+
+    def time_limits(self, color: chess.Color) -> (Optional[float], Optional[float]):
+        """
+        Returns the soft and the hard time limit (in seconds) for the next move of color,
+        or None, None if the search isn't limited by time.
+        """
+        if self.movetime is not None:
+            return self.movetime * MOVETIME_SOFT_RATIO, self.movetime
+        if self.clock is None:
+            return None, None
+        wtime, btime, winc, binc, movestogo = self.clock
+        remaining = wtime if color == chess.WHITE else btime
+        inc = winc if color == chess.WHITE else binc
+        available = max(remaining - TIME_MARGIN, 0.0)
+        soft = available / (movestogo or DEFAULT_MOVES_TO_GO) + inc
+        hard = min(soft * HARD_TIME_FACTOR, available)
+        return min(soft, hard), hard
+
+    def check_time(self):
+        """
+        Raises SearchTimeout if the hard deadline has passed. Called at every node,
+        but only looks at the clock every TIME_CHECK_INTERVAL nodes.
+        """
+        if self.hard_deadline is not None:
+            self._time_check_countdown -= 1
+            if self._time_check_countdown <= 0:
+                self._time_check_countdown = TIME_CHECK_INTERVAL
+                if time.time() >= self.hard_deadline:
+                    raise SearchTimeout()
+
+    @staticmethod
+    def unwind(board: variant.BughouseSuperBoardT, ply: int):
+        """
+        Pops the moves that an aborted search left on board, until ply moves are left.
+        """
+        while len(board.board_push_pop_stack) > ply:
+            board.pop()
+
     @classmethod
     def get_moves(cls, board: chess.BoardT) -> Iterator[chess.Move]:
         """
@@ -149,6 +603,82 @@ class AI:
         """
         return board.generate_legal_moves()
 
+    def search_moves(self, board: variant.BughouseSuperBoardT, board_id: str, depth: int, func: str,
+                     forbidden_moves: Optional[List[chess.Move]] = None) -> List[chess.Move]:
+        """
+        The moves that minimax(), maximin() or negamax() (func) searches from the position on board_id
+        at depth: get_moves() without forbidden_moves.
+
+        Unless a subclass overrides get_moves(), the moves are generated with
+        legal_moves_into() into a list that is reused by all positions at the same ply
+        of the super board, so it is only valid until the search of the position returns.
+        """
+        base_board = board.get_base_board(board_id)
+        if type(self).get_moves.__func__ is AI.get_moves.__func__:
+            ply = len(board.board_push_pop_stack)
+            buffers = self.move_buffers
+            while len(buffers) <= ply:
+                buffers.append(list())
+            moves = base_board.legal_moves_into(buffers[ply])
+        else:
+            moves = list(self.get_moves(base_board))
+
+        # remove any forbidden moves if they exist
+        if forbidden_moves:
+            forbidden = set(forbidden_moves)
+            for mv in forbidden.intersection(moves):
+                self.log_forbidden_move_removal(board, depth, board_id, func, mv)
+            moves = [mv for mv in moves if mv not in forbidden]
+        return moves
+
+    def tt_lookup(self, key: int, depth: int, a: float, b: float) -> (Optional[float], Optional[chess.Move]):
+        """
+        Looks up a position in the transposition table.
+
+        :param key: the zobrist hash of the position
+        :param depth: the current depth of search
+        :param a: alpha
+        :param b: beta
+        :return: (score, move), where score is the stored score if it was searched deep
+            enough and is exact or a bound outside of (a, b), otherwise None; and move is
+            the stored best move (or None) which should be searched first
+        """
+        entry = self.transposition_table.probe(key)
+        if entry is None:
+            return None, None
+        if entry.depth >= self.tt_horizon - depth:
+            if (entry.flag == TranspositionTable.EXACT or
+                    (entry.flag == TranspositionTable.LOWER and entry.score >= b) or
+                    (entry.flag == TranspositionTable.UPPER and entry.score <= a)):
+                self.statistics.inc_tt_hits()
+                return entry.score, entry.move
+        return None, entry.move
+
+    def tt_save(self, key: int, depth: int, a: float, b: float, score: float, move: Optional[chess.Move]):
+        """
+        Stores the result of searching a position with the window (a, b) in
+        the transposition table.
+        """
+        self.transposition_table.store(key, self.tt_horizon - depth, TranspositionTable.flag_for(score, a, b),
+                                       score, move)
+
+    def tt_new_search(self):
+        """
+        Should be called before every new move is searched
+        """
+        if self.transposition_table is not None:
+            self.transposition_table.new_search()
+
+    @staticmethod
+    def tt_move_first(moves: List[chess.Move], tt_move: Optional[chess.Move]) -> List[chess.Move]:
+        """
+        Moves tt_move (if it is one of moves) to the front of moves
+        """
+        if tt_move is not None and tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
     def piece_drop_nxt_depth(self, **kwargs):
         """
         :param kwargs: should include 'move=mv' where mv is a chess.Move
@@ -163,7 +693,7 @@ class AI:
                 return kwargs["depth"] + 1
         return kwargs["depth"] + 1
 
-    def rand_move_reorder(self, moves):
+    def rand_move_reorder(self, moves, **kwargs):
         """
         Randomly shuffles the order of moves; returns the result
         (makes a copy of the parameter before doing this)
@@ -175,7 +705,7 @@ class AI:
         random.shuffle(r_moves)
         return r_moves
 
-    def capture_drop_reorder(self, moves):
+    def capture_drop_reorder(self, moves, **kwargs):
         """
         Randomly shuffles the order of moves; returns the result
         (makes a copy of the parameter before doing this)
@@ -203,6 +733,97 @@ class AI:
 
         return captures + drops + others
 
+    @staticmethod
+    def history_index(color: chess.Color, piece_type: chess.PieceType, to_square: chess.Square) -> int:
+        """
+        The index of a move (or drop) of piece_type to to_square by color in self.history
+        """
+        return ((color * 7) + piece_type) * 64 + to_square
+
+    def move_ordering_new_search(self):
+        """
+        Should be called before every new move is searched. Forgets the killer moves
+        and ages the history scores, so that the last searches count the most.
+        """
+        for killers in self.killers:
+            for i in range(KILLER_SLOTS):
+                killers[i] = None
+        history = self.history
+        for i in range(len(history)):
+            history[i] >>= 1
+
+    def record_cutoff(self, board: chess.BoardT, move: chess.Move, depth: int, moves: List[chess.Move] = None):
+        """
+        Remembers that move caused a cutoff at depth. Captures are ordered by
+        heuristic_move_reorder() anyway, other moves and drops become the first killer
+        move of depth and get a history bonus that grows with the depth left to search.
+
+        :param board: the base board the move was made on (after it was popped)
+        :param moves: the moves in the order they were searched, for the statistics
+        """
+        if move is None:
+            return
+        if moves is not None and self.statistics.detailed:
+            self.statistics.inc_cutoffs(moves.index(move))
+        if move.drop:
+            piece_type = move.drop
+        else:
+            if board.piece_type_at(move.to_square) or board.ep_square == move.to_square:
+                return
+            piece_type = board.piece_type_at(move.from_square)
+            if piece_type is None:
+                return
+        if depth >= len(self.killers):
+            self.killers.extend([None] * KILLER_SLOTS for _ in range(depth + 1 - len(self.killers)))
+        killers = self.killers[depth]
+        if killers[0] != move:
+            killers[1:] = killers[:-1]
+            killers[0] = move
+        left = max(self.tt_horizon - depth, 1)
+        self.history[self.history_index(board.turn, piece_type, move.to_square)] += left * left
+
+    def heuristic_move_reorder(self, moves, board: chess.BoardT = None, depth: int = 0, **kwargs):
+        """
+        Orders moves by:
+            - captures (and promotions) first, most valuable victim first, and
+              then least valuable attacker first (MVV-LVA)
+            - then the killer moves of depth
+            - then the other moves and the drops, by their history score
+        The killer moves and history scores are collected by record_cutoff().
+        Returns a new list.
+
+        :param moves: the moves to order
+        :param board: the base board that the moves are for
+        :param depth: the current depth of search
+        """
+        if board is None:
+            return moves
+        killers = self.killers[depth] if depth < len(self.killers) else ()
+        history = self.history
+        color_index = board.turn * 7
+        captures = list()
+        killer_moves = list()
+        others = list()
+        for mv in moves:
+            if mv.drop:
+                piece_type = mv.drop
+            else:
+                piece_type = board.piece_type_at(mv.from_square)
+                victim = board.piece_type_at(mv.to_square)
+                if victim is None and mv.to_square == board.ep_square and piece_type == chess.PAWN:
+                    victim = chess.PAWN
+                if victim or mv.promotion:
+                    captures.append(((victim or 0) * 8 + (mv.promotion or 0) * 8 - piece_type, mv))
+                    continue
+            if mv in killers:
+                killer_moves.append(mv)
+            else:
+                others.append((history[(color_index + piece_type) * 64 + mv.to_square], mv))
+        captures.sort(key=lambda scored: -scored[0])
+        killer_moves.sort(key=killers.index)
+        others.sort(key=lambda scored: -scored[0])
+        return [mv for _, mv in captures] + killer_moves + [mv for _, mv in others]
+
     def utility(self, board: variant.BughouseSuperBoardT, board_id: str, players_eval: dict,
                 ally_diff_pocket: variant.BughousePocketT = None,
                  enemy_diff_pocket: variant.BughousePocketT = None, to_protect=None, to_capture=None) -> dict:
@@ -224,6 +845,9 @@ class AI:
         @returns a new dict with keys being the color and values being floating
         point scores for each respective color (does not modify the dict given).
 
+        With an evaluation cache (see EvalCache), the score of each player is looked up
+        in the cache first, and only evaluated if it isn't there.
+
         TODO: So, we definitely need to consider how to structure a utility evaluation
         function. Most importantly, it should be constant time so as to reduce the
         performance overhead of evaluating a state (we have plenty of overhead as
@@ -232,8 +856,25 @@ class AI:
         are already methods that have been created to evaluate whether pinning exists
         within chess.BaseBoard.
         """
-        return self.eval_class.utility(board, board_id, players_eval, ally_diff_pocket=ally_diff_pocket,
-                 enemy_diff_pocket=enemy_diff_pocket, to_protect=to_protect, to_capture=to_capture)
+        cache = self.eval_cache
+        if cache is None:
+            return self.eval_class.utility(board, board_id, players_eval, ally_diff_pocket=ally_diff_pocket,
+                     enemy_diff_pocket=enemy_diff_pocket, to_protect=to_protect, to_capture=to_capture)
+        zobrist = board.get_base_board(board_id).zobrist_hash()
+        ret = dict()
+        for player in players_eval:
+            key = cache.key(zobrist, player, ally_diff_pocket, enemy_diff_pocket, to_protect, to_capture)
+            value = cache.probe(key)
+            if value is None:
+                value = self.eval_class.utility(board, board_id, {player: None}, ally_diff_pocket=ally_diff_pocket,
+                                                enemy_diff_pocket=enemy_diff_pocket, to_protect=to_protect,
+                                                to_capture=to_capture)[player]
+                cache.store(key, value)
+            else:
+                self.statistics.inc_eval_cache_hits()
+            self.statistics.inc_eval_cache_lookups()
+            ret[player] = value
+        return ret
 
     def log_avail_moves(self, board, moves, depth, board_id, func):
         if self.log:
@@ -273,6 +914,17 @@ class AI:
             turn = "white" if board.get_base_board(board_id).turn else "black"
             logging.info("{0}: depth {1}, board {2}, turn {3}, removed forbidden move {4}".format(func, depth, board_id, turn, mv))
 
+    def trace_move(self, move, depth, board_id, func, value, a, b):
+        if self.tracer is not None:
+            self.tracer.write(func, depth, board_id, move, value, a, b)
+
+    def close_trace(self):
+        """
+        Writes the rest of the trace (see the trace argument) and closes its file
+        """
+        if self.tracer is not None:
+            self.tracer.close()
+
 
 class PartneredAI(AI):
     """
@@ -289,7 +941,10 @@ class PartneredAI(AI):
 
     def __init__(self, name: str, board: variant.BughouseSuperBoard, board_id: str, color: chess.Color, eval_class:
     chess.utility.UtilityEvalSuper, communicating: bool = False, max_depth: int = MAX_DEPTH, print_stats: bool = False,
-                 log: bool = False, max_states: bool = 1000000, iter_deep: bool = True, nxt_dep_func=None, move_order_fn=None, allow_fivefold_repetition=False):
+                 log: bool = False, max_states: bool = 1000000, iter_deep: bool = True, nxt_dep_func=None, move_order_fn=None, allow_fivefold_repetition=False,
+                 tt_size: int = 0, tt_replacement: str = "depth", movetime: float = None, pvs: bool = False,
+                 quiescence: bool = False, quiescence_drops: bool = False, workers: int = 0,
+                 detailed_stats: bool = True, trace: str = None, eval_cache_size: int = 0):
         """
         :param name: the agent's name
         :param board: the super board for this agent's game
@@ -297,6 +952,9 @@ class PartneredAI(AI):
         :param color: the color of this agent on their board
         :param eval_class: the evaluation class used for evaluating a board
         :param communicating: whether this agent communicates with its partner
+        :param workers: default is 0; if more than 1, iterative deepening searches the moves of
+            the root on this many worker processes (see parallel_root_search()). Call close_pool()
+            when the agent is not needed anymore
 
         :param allow_fivefold_repetition: if you allow fivefold repetition, then a draw may occur from
             such case; otherwise, a move that would cause fivefold repetition is not allowed
@@ -304,15 +962,111 @@ class PartneredAI(AI):
         TODO: push communications down to the AIs
         """
         super().__init__(name, board, eval_class, max_depth=max_depth, print_stats=print_stats, log=log,
-                         max_states=max_states, iter_deep=iter_deep, nxt_dep_func=nxt_dep_func, move_order_fn=move_order_fn, allow_fivefold_repetition=allow_fivefold_repetition)
+                         max_states=max_states, iter_deep=iter_deep, nxt_dep_func=nxt_dep_func, move_order_fn=move_order_fn, allow_fivefold_repetition=allow_fivefold_repetition,
+                         tt_size=tt_size, tt_replacement=tt_replacement, movetime=movetime, pvs=pvs,
+                         quiescence=quiescence, quiescence_drops=quiescence_drops, detailed_stats=detailed_stats,
+                         trace=trace, eval_cache_size=eval_cache_size)
         self.board_id = board_id
         self.color = color
         if communicating:
             self.partner_comm = CommChannel()
             self.tell_partner = CommChannel()
         self.communicating = communicating
-        self.statistics = Statistics(max_depth, print_stats, board_id, color)
+        self.statistics = Statistics(max_depth, print_stats, board_id, color, detailed=detailed_stats)
+        self.workers = workers
+        self._pool = None
+        # tells the tables of the worker processes when a new move is searched
+        self.worker_search_id = 0
+
+
+    def leaf_value(self, board: variant.BughouseSuperBoardT, board_id: str,
+                   original_ally_pocket: variant.BughousePocketT = None,
+                   original_enemy_pocket: variant.BughousePocketT = None) -> float:
+        """
+        Evaluates a state at the cutoff of the search (positive values are good for white).
+        A communicating agent also takes into account the pieces its partner asked for
+        (see find_dangerous_drops() and find_valuable_drops()).
 
+        :param original_ally_pocket: as in minimax()
+        :param original_enemy_pocket: as in minimax()
+        """
+        players = dict()
+        players[self.color] = None
+        if self.communicating:
+            if board_id == "A":
+                ally_diff = original_ally_pocket.diff(board.get_base_board("B").get_pocket(not self.color))
+                enemy_diff = original_enemy_pocket.diff(board.get_base_board("B").get_pocket(self.color))
+            else:
+                ally_diff = original_ally_pocket.diff(board.get_base_board("A").get_pocket(not self.color))
+                enemy_diff = original_enemy_pocket.diff(board.get_base_board("A").get_pocket(self.color))
+            t = self.statistics.eval_start()
+            res = self.utility(board, board_id, players, ally_diff_pocket=ally_diff, enemy_diff_pocket=enemy_diff,
+                               to_protect=self.partner_comm.get_please_protect(),
+                               to_capture=self.partner_comm.get_please_capture())
+        else:
+            t = self.statistics.eval_start()
+            res = self.utility(board, board_id, players)
+        self.statistics.eval_end(t)
+        return res[self.color]
+
+    def quiescence(self, board: variant.BughouseSuperBoardT, board_id: str, a=-math.inf, b=math.inf,
+                   original_ally_pocket: variant.BughousePocketT = None,
+                   original_enemy_pocket: variant.BughousePocketT = None, qdepth: int = 0) -> float:
+        """
+        Evaluates a state at the cutoff of the search by searching the captures (and, if
+        quiescence_drops is set, at the first ply also the drops that give check) until the
+        position is quiet, so that the evaluation isn't taken in the middle of an exchange.
+
+        The side to move can always stand pat, i.e. take the static value instead of capturing,
+        unless it is in check, then all moves are searched. Captures that can't raise the value
+        above a, even with DELTA_MARGIN, are skipped (delta pruning), and so are captures that
+        lose material according to the static exchange evaluation (see BughouseBaseBoard.see()).
+
+        Like negamax(), the value is from the point of view of the side to move.
+
+        :param qdepth: the number of plies searched by the quiescence search so far
+        """
+        self.statistics.inc_q_states()
+        self.check_time()
+        base_board = board.get_base_board(board_id)
+        if base_board.is_check() and qdepth < QUIESCENCE_MAX_DEPTH:
+            moves = list(self.get_moves(base_board))
+            if not moves:
+                return -float("inf")
+            val = -float("inf")
+        else:
+            val = self.leaf_value(board, board_id, original_ally_pocket, original_enemy_pocket)
+            if base_board.turn == chess.BLACK:
+                val = -val
+            if val >= b or qdepth >= QUIESCENCE_MAX_DEPTH:
+                return val
+            a = max(a, val)
+            moves = list()
+            for mv in base_board.generate_legal_captures():
+                victim = base_board.piece_type_at(mv.to_square) or chess.PAWN  # or en passant
+                if not mv.promotion and val + utility.PIECE_VALUES[victim] + DELTA_MARGIN <= a:
+                    continue
+                # losing captures don't make a position quiet
+                if not mv.promotion and not base_board.see_ge(mv, 0, values=utility.PIECE_VALUES):
+                    continue
+                moves.append((victim * 8 - base_board.piece_type_at(mv.from_square), mv))
+            # most valuable victim, least valuable attacker first
+            moves.sort(key=lambda scored: -scored[0])
+            moves = [mv for _, mv in moves]
+            if self.quiescence_drops and qdepth == 0:
+                base_board.legal_drops_into(moves, checks=True)
+
+        for mv in moves:
+            board.push(mv, board_id)
+            new_val = -self.quiescence(board, board_id, -b, -a, original_ally_pocket, original_enemy_pocket,
+                                       qdepth + 1)
+            board.pop()
+            if new_val > val:
+                val = new_val
+            if val >= b:
+                return val
+            a = max(a, val)
+        return val
 
     def minimax(self, board: variant.BughouseSuperBoardT, board_id: str, depth: int, cutoff=None, a=-math.inf,
                           b=math.inf, original_ally_pocket: variant.BughousePocketT=None,
@@ -322,6 +1076,9 @@ class PartneredAI(AI):
         This is a minimax program with alphabeta pruning.
         Modeled after Bryce's hw3 solution from 4700
 
+        The search itself is negamax(); this only turns the window and the value around
+        when black is to move, so that they are from white's point of view.
+
         :param board: the super_board to evaluate
         :param board_id: the baseboard id to evaluate
         :param depth: the current depth of search
@@ -341,213 +1098,281 @@ class PartneredAI(AI):
             - the state's utility value if the cutoff depth has been reached,
                 null action (because we are not allowed to continue actions)
         """
+        if board.get_base_board(board_id).turn == chess.WHITE:
+            return self.negamax(board, board_id, depth, cutoff, a, b, original_ally_pocket=original_ally_pocket,
+                                original_enemy_pocket=original_enemy_pocket, forbidden_moves=forbidden_moves)
+        val, best_move = self.negamax(board, board_id, depth, cutoff, -b, -a,
+                                      original_ally_pocket=original_ally_pocket,
+                                      original_enemy_pocket=original_enemy_pocket, forbidden_moves=forbidden_moves)
+        return -val, best_move
+
+    def maximin(self, board: variant.BughouseSuperBoardT, board_id: str, depth: int, cutoff=None, a=-math.inf,
+                          b=math.inf, original_ally_pocket: variant.BughousePocketT=None,
+                          original_enemy_pocket: variant.BughousePocketT=None,
+                          forbidden_moves=None) -> (float, chess.Move):
+        """
+        This is a maximin program with alphabeta pruning: the same as minimax(), whose values
+        are from white's point of view whichever side is to move.
+        """
+        return self.minimax(board, board_id, depth, cutoff, a, b, original_ally_pocket=original_ally_pocket,
+                            original_enemy_pocket=original_enemy_pocket, forbidden_moves=forbidden_moves)
+
+    def negamax(self, board: variant.BughouseSuperBoardT, board_id: str, depth: int, cutoff=None, a=-math.inf,
+                b=math.inf, original_ally_pocket: variant.BughousePocketT = None,
+                original_enemy_pocket: variant.BughousePocketT = None,
+                forbidden_moves=None) -> (float, chess.Move):
+        """
+        The search of this agent: an alpha-beta search in negamax form, which minimax() and
+        maximin() call. With pvs, it is a principal variation search: the first move of a node
+        is searched with the window (a, b), the others with a null window just above a, and only
+        searched again with (a, b) if they turn out better.
+
+        The values are from the point of view of the side to move, i.e. the minimax() value
+        when white is to move and minus it when black is to move.
+        The parameters are the same as for minimax().
+        """
         self.statistics.inc_states()
+        self.check_time()
         # The default cutoff test is whether we've reached the max_depth
         if cutoff is None:
             def cutoff(board, depth):
                 return depth >= self.max_depth
 
+        base_board = board.get_base_board(board_id)
         # checkmate is terminal
-        if board.get_base_board(board_id).is_checkmate():
-                return -float("inf"), chess.Move.null()
+        if base_board.is_checkmate():
+            return -float("inf"), chess.Move.null()
 
         # The cutoff condition has been reached
         if cutoff(board, depth):
-            players = dict()
-            players[self.color] = None
-            if self.communicating:
-                if board_id == "A":
-                    ally_diff = original_ally_pocket.diff(board.get_base_board("B").get_pocket(not self.color))
-                    enemy_diff = original_enemy_pocket.diff(board.get_base_board("B").get_pocket(self.color))
-                else:
-                    ally_diff = original_ally_pocket.diff(board.get_base_board("A").get_pocket(not self.color))
-                    enemy_diff = original_enemy_pocket.diff(board.get_base_board("A").get_pocket(self.color))
-                t = time.time()
-                test1 = self.partner_comm.get_please_protect()
-                test2 = self.partner_comm.get_please_capture()
-                res = self.utility(board, board_id, players, ally_diff_pocket=ally_diff, enemy_diff_pocket=enemy_diff,
-                                   to_protect=self.partner_comm.get_please_protect(),
-                                   to_capture=self.partner_comm.get_please_capture())
-                self.statistics.eval_func_time(t)
-                self.statistics.eval_func_count_inc()
-                return res[self.color], chess.Move.null()
-            else:
-                t = time.time()
-                res = self.utility(board, board_id, players)
-                self.statistics.eval_func_time(t)
-                self.statistics.eval_func_count_inc()
-                return res[self.color], chess.Move.null()
+            if self.quiescence_search:
+                return self.quiescence(board, board_id, a, b, original_ally_pocket,
+                                       original_enemy_pocket), chess.Move.null()
+            val = self.leaf_value(board, board_id, original_ally_pocket, original_enemy_pocket)
+            if base_board.turn == chess.BLACK:
+                val = -val
+            return val, chess.Move.null()
 
         # Other situations
+        tt_key = None
+        if self.transposition_table is not None:
+            tt_key = board.zobrist_hash()
+            tt_score, tt_move = self.tt_lookup(tt_key, depth, a, b)
+            if tt_score is not None and depth > 0:
+                return tt_score, tt_move
+            a_orig, b_orig = a, b
+
         val = -float("inf")
         best_move = None
-        moves = list()
-        for mv in self.get_moves(board.get_base_board(board_id)):
-            moves.append(mv)
-        
-        # remove any forbidden moves if they exist
-        if forbidden_moves:
-            for mv in forbidden_moves:
-                try:
-                    moves.remove(mv)
-                    self.log_forbidden_move_removal(mv)
-                except:
-                    pass
+        pvs = self.pvs
+        # the name of the search in the logs and the trace, which keep white's point of view
+        # for minimax() and maximin()
+        func = "negamax" if pvs else "minimax" if base_board.turn == chess.WHITE else "maximin"
+        moves = self.search_moves(board, board_id, depth, func, forbidden_moves)
 
         # logging
-        self.statistics.current_branching_max(len(moves))
-        self.log_avail_moves(board, moves, depth, board_id, "minimax")
+        self.statistics.current_branching_max(len(moves), depth)
+        traced = self.traced
+        if traced:
+            self.log_avail_moves(board, moves, depth, board_id, func)
 
         # order the moves in a specific way if provided
         if self.move_order_fn:
-            moves = self.move_order_fn(self=self, moves=moves)
+            moves = self.move_order_fn(self=self, moves=moves, board=board.get_base_board(board_id), depth=depth)
+        if tt_key is not None:
+            moves = self.tt_move_first(moves, tt_move)
 
         for mv in moves:
-            self.log_before_push(board, mv, depth, board_id, "minimax")
+            if traced:
+                self.log_before_push(board, mv, depth, board_id, func)
             board.push(mv, board_id)  # push first
-            self.log_after_push(board, mv, depth, board_id, "minimax")
+            if traced:
+                self.log_after_push(board, mv, depth, board_id, func)
             nxt_dep = self.nxt_dep_func(self=self, depth=depth, move=mv) if self.nxt_dep_func else depth + 1
-            new_val, _ = self.maximin(board, board_id, nxt_dep, cutoff, a, b,
-                                                original_ally_pocket=original_ally_pocket,
-                                                original_enemy_pocket=original_enemy_pocket)
+            if not pvs or best_move is None or a == -math.inf:
+                new_val, _ = self.negamax(board, board_id, nxt_dep, cutoff, -b, -a,
+                                          original_ally_pocket=original_ally_pocket,
+                                          original_enemy_pocket=original_enemy_pocket)
+                new_val = -new_val
+            else:
+                new_val, _ = self.negamax(board, board_id, nxt_dep, cutoff, -a - PVS_NULL_WINDOW, -a,
+                                          original_ally_pocket=original_ally_pocket,
+                                          original_enemy_pocket=original_enemy_pocket)
+                new_val = -new_val
+                if a < new_val < b:
+                    # better than the principal variation so far; get its real value
+                    new_val, _ = self.negamax(board, board_id, nxt_dep, cutoff, -b, -a,
+                                              original_ally_pocket=original_ally_pocket,
+                                              original_enemy_pocket=original_enemy_pocket)
+                    new_val = -new_val
             board.pop()  # then pop
-            self.log_after_pop(board, mv, depth, board_id, "minimax")
+            if traced:
+                self.log_after_pop(board, mv, depth, board_id, func)
+                if func == "maximin":
+                    self.trace_move(mv, depth, board_id, func, -new_val, -b, -a)
+                else:
+                    self.trace_move(mv, depth, board_id, func, new_val, a, b)
             if new_val > val or best_move is None:
                 val = new_val
                 best_move = mv
             if val >= b:
-                if best_move is None:
-                    raise UnboundLocalError("minimax: best_move was about to be returned"
-                        " empty; here are the stats: states evaluated {0}, depth {1}, moves {2}"
-                        .format(self.statistics.get_states_evaluated(), depth, moves))
+                self.record_cutoff(board.get_base_board(board_id), best_move, depth, moves)
+                if tt_key is not None and not forbidden_moves:
+                    self.tt_save(tt_key, depth, a_orig, b_orig, val, best_move)
                 return val, best_move
             a = max(a, val)
         if best_move is None:
-            raise UnboundLocalError("minimax: best_move was about to be returned"
+            raise UnboundLocalError("negamax: best_move was about to be returned"
                 " empty; here are the stats: states evaluated {0}, depth {1}, moves {2}"
                 .format(self.statistics.get_states_evaluated(), depth, moves))
+        if tt_key is not None and not forbidden_moves:
+            self.tt_save(tt_key, depth, a_orig, b_orig, val, best_move)
         return val, best_move
 
-    def maximin(self, board: variant.BughouseSuperBoardT, board_id: str, depth: int, cutoff=None, a=-math.inf,
-                          b=math.inf, original_ally_pocket: variant.BughousePocketT=None,
-                          original_enemy_pocket: variant.BughousePocketT=None,
-                          forbidden_moves=None) -> (float, chess.Move):
+    def pvs_root(self, board: variant.BughouseSuperBoardT, cutoff, forbidden_moves=None,
+                 guess: float = None) -> (float, chess.Move):
         """
-        This is a maximin program with alphabeta pruning.
-        Modeled after Bryce's hw3 solution from 4700
+        Searches this agent's move with negamax(). If guess (the value of the previous
+        iteration of iterative deepening) is given, the search starts with the window
+        guess +- ASPIRATION_WINDOW, and searches again with the window opened up on the
+        side the value fell out of.
 
-        :param board: the super_board to evaluate
-        :param board_id: the baseboard id to evaluate
-        :param depth: the current depth of search
-        :param cutoff: an optional function to determine whether to cut off searching
-        :param a: *alpha* represents the best choice so far for maximin (worst for minimax)
-        :param b: *beta* represents the best choice so far for minimax (worst for maximin)
-        :param original_ally_pocket: is the original pocket (before minimax was first called) of the ally of this agent
-        :param original_enemy_pocket: is the original pocket (before minimax was first called) of the enemy of this
-        :param forbidden_moves: moves that we do not want to allow; not passed to following iterations; must
-            be a list of Move objects
-        agent in the other board
-        :return:
-            - the utility of the state if the state is terminal,
-                null action (because no further action is possible)
-            - the maximum utility possible from the maximin result of taking each action,
-                the action taken
-            - the state's utility value if the cutoff depth has been reached,
-                null action (because we are not allowed to continue actions)
+        :return: the value (positive values are good for white, like minimax()) and the best move
         """
-        self.statistics.inc_states()
-        # The default cutoff test is whether we've reached self.max_depth
-        if cutoff is None:
-            def cutoff(board, depth):
-                return depth >= self.max_depth
+        original_ally_pocket = None
+        original_enemy_pocket = None
+        if self.communicating:
+            other_board = "B" if self.board_id == "A" else "A"
+            original_ally_pocket = board.get_base_board(other_board).get_pocket(not self.color)
+            original_enemy_pocket = board.get_base_board(other_board).get_pocket(self.color)
+        sign = 1 if board.get_base_board(self.board_id).turn == chess.WHITE else -1
+        a, b = -math.inf, math.inf
+        if guess is not None and not math.isinf(guess):
+            a, b = sign * guess - ASPIRATION_WINDOW, sign * guess + ASPIRATION_WINDOW
+        while True:
+            val, best_move = self.negamax(board, self.board_id, 0, cutoff, a, b,
+                                          original_ally_pocket=original_ally_pocket,
+                                          original_enemy_pocket=original_enemy_pocket,
+                                          forbidden_moves=forbidden_moves)
+            if val <= a and a != -math.inf:
+                a = -math.inf
+            elif val >= b and b != math.inf:
+                b = math.inf
+            else:
+                return sign * val, best_move
 
-        # checkmate is terminal
-        if board.get_base_board(board_id).is_checkmate():
-                return float("inf"), chess.Move.null()
+    def get_pool(self):
+        """
+        Returns the pool of worker processes of parallel_root_search(), starting it if needed
+        """
+        if self._pool is None:
+            # imported here, so that importing this module doesn't load multiprocessing
+            import multiprocessing as mp
+            self._pool = mp.Pool(self.workers)
+        return self._pool
 
-        # The cutoff condition has been reached
-        if cutoff(board, depth):
-            players = dict()
-            players[self.color] = None
-            if self.communicating:
-                if board_id == "A":
-                    pocket = board.get_base_board("B").get_pocket(not self.color)
-                    pieces = pocket.pieces
-                    # print(board.get_base_board("B").get_pocket(not self.color))
-                    ally_diff = original_ally_pocket.diff(board.get_base_board("B").get_pocket(not self.color))
-                    # print(board.get_base_board("B").get_pocket(self.color))
-                    enemy_diff = original_enemy_pocket.diff(board.get_base_board("B").get_pocket(self.color))
-                else:
-                    ally_diff = original_ally_pocket.diff(board.get_base_board("A").get_pocket(not self.color))
-                    enemy_diff = original_enemy_pocket.diff(board.get_base_board("A").get_pocket(self.color))
-                t = time.time()
-                # print(ally_diff)
-                # print(enemy_diff)
-                # print("ok")
-                to_protect = self.partner_comm.get_please_protect()
-                to_capture = self.partner_comm.get_please_capture()
-                res = self.utility(board, board_id, players, ally_diff_pocket=ally_diff, enemy_diff_pocket=enemy_diff,
-                                   to_protect=to_protect,
-                                   to_capture=to_capture)
-                self.statistics.eval_func_time(t)
-                self.statistics.eval_func_count_inc()
-                return res[self.color], chess.Move.null()
-            else:
-                t = time.time()
-                res = self.utility(board, board_id, players)
-                self.statistics.eval_func_time(t)
-                self.statistics.eval_func_count_inc()
-                return res[self.color], chess.Move.null()
+    def close_pool(self):
+        """
+        Stops the worker processes of parallel_root_search(), if there are any
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
 
-        # Other situations
-        val = float("inf")
-        best_move = None
-        moves = list()
-        for mv in self.get_moves(board.get_base_board(board_id)):
-            moves.append(mv)
+    def worker_copy(self) -> "PartneredAI":
+        """
+        Returns a copy of this agent to send to the worker processes: it doesn't
+        have a board, a pool, a transposition table or an evaluation cache (the workers
+        keep their own, see _search_root_move()) or the statistics of the game.
+        """
+        worker = copy.copy(self)
+        worker.board = None
+        worker._pool = None
+        worker.workers = 0
+        table = self.transposition_table
+        worker.worker_tt = (table.size, table.replacement) if table is not None else (0, None)
+        worker.transposition_table = None
+        worker.worker_eval_cache = self.eval_cache.size if self.eval_cache is not None else 0
+        worker.eval_cache = None
+        worker.move_buffers = list()
+        worker.statistics = Statistics(self.max_depth, detailed=False)
+        # the trace file stays with this agent
+        worker.tracer = None
+        worker.traced = bool(self.log)
+        return worker
+
+    def parallel_root_search(self, board: variant.BughouseSuperBoardT, depth: int,
+                             forbidden_moves=None) -> (float, chess.Move):
+        """
+        Searches the moves of the root to depth on the worker processes (root splitting).
+
+        Every root move is searched with the full window, so its value is exact and the result
+        doesn't depend on which worker searched what: the best move is the first move (in the
+        order of move_order_fn and the transposition table) with the best value, which is also
+        the move the sequential search would choose.
+
+        :return: the value (positive values are good for white, like minimax()) and the best move
+        :raises: :exc:`SearchTimeout` if the hard deadline passed in any of the workers
+        """
+        base_board = board.get_base_board(self.board_id)
+        moves = list(self.get_moves(base_board))
 
         # remove any forbidden moves if they exist
         if forbidden_moves:
             for mv in forbidden_moves:
                 try:
                     moves.remove(mv)
-                    self.log_forbidden_move_removal(mv)
+                    self.log_forbidden_move_removal(board, 0, self.board_id, "parallel_root_search", mv)
                 except:
                     pass
-
-        # logging
-        self.statistics.current_branching_max(len(moves))
-        self.log_avail_moves(board, moves, depth, board_id, "maximin")
+        if not moves:
+            raise UnboundLocalError("parallel_root_search: there are no moves to search; here are the"
+                                    " stats: states evaluated {0}, depth {1}".format(
+                                        self.statistics.get_states_evaluated(), depth))
 
         # order the moves in a specific way if provided
         if self.move_order_fn:
-            moves = self.move_order_fn(self=self, moves=moves)
-
-        for mv in moves:
-            self.log_before_push(board, mv, depth, board_id, "maximin")
-            board.push(mv, board_id)  # push first
-            self.log_after_push(board, mv, depth, board_id, "maximin")
-            nxt_dep = self.nxt_dep_func(self=self, depth=depth, move=mv) if self.nxt_dep_func else depth + 1
-            new_val, _ = self.minimax(board, board_id, nxt_dep, cutoff, a, b,
-                                                original_ally_pocket=original_ally_pocket,
-                                                original_enemy_pocket=original_enemy_pocket)
-            board.pop()  # then pop
-            self.log_after_pop(board, mv, depth, board_id, "maximin")
-            if new_val < val or best_move is None:
-                val = new_val
+            moves = self.move_order_fn(self=self, moves=moves, board=base_board, depth=0)
+        tt_key = None
+        if self.transposition_table is not None:
+            tt_key = board.zobrist_hash()
+            entry = self.transposition_table.probe(tt_key)
+            moves = self.tt_move_first(moves, entry.move if entry is not None else None)
+
+        worker = self.worker_copy()
+        tasks = [(worker, board, mv, depth, self.worker_search_id) for mv in moves]
+        results = self.get_pool().map(_search_root_move, tasks)
+
+        maximizing = base_board.turn == chess.WHITE
+        best_val = None
+        best_move = None
+        timed_out = False
+        for mv, (val, states, q_states, tt_hits, evals, eval_cache_hits, eval_cache_lookups) in zip(moves, results):
+            self.statistics.add_worker_stats(states, q_states, tt_hits, evals, eval_cache_hits, eval_cache_lookups)
+            if val is None:
+                timed_out = True
+            elif best_move is None or (val > best_val if maximizing else val < best_val):
+                best_val = val
                 best_move = mv
-            if val <= a:
-                if best_move is None:
-                    raise UnboundLocalError("maximin: best_move was about to be returned"
-                        " empty; here are the stats: states evaluated {0}, depth {1}, moves {2}"
-                        .format(self.statistics.get_states_evaluated(), depth, moves))
-                return val, best_move
-            b = min(b, val)
-        if best_move is None:
-            raise UnboundLocalError("maximin: best_move was about to be returned"
-                " empty; here are the stats: states evaluated {0}, depth {1}, moves {2}"
-                .format(self.statistics.get_states_evaluated(), depth, moves))
-        return val, best_move
+        if timed_out:
+            raise SearchTimeout()
+        if tt_key is not None and not forbidden_moves:
+            # negamax() keeps the scores of the side to move
+            score = best_val if maximizing else -best_val
+            self.tt_save(tt_key, 0, -math.inf, math.inf, score, best_move)
+        return best_val, best_move
+
+    def tt_new_search(self):
+        """
+        The evaluation of a communicating agent depends on the pockets at the root of the
+        search and on its partner's advice, so its old entries can't be reused for a new move.
+        """
+        if self.transposition_table is not None:
+            if self.communicating:
+                self.transposition_table.clear()
+            self.transposition_table.new_search()
+        self.worker_search_id += 1
 
     def partners_advice(self, advice: CommChannel):
         """
@@ -569,6 +1394,10 @@ class PartneredAI(AI):
         Do an alpha-beta minimax search with at most depth max_depth. Return the result.
         """
         self.statistics.single_move_reset()
+        self.tt_new_search()
+        self.move_ordering_new_search()
+        self.tt_horizon = self.max_depth
+        self.statistics.set_completed_depth(self.max_depth)
         # copy the board
         super_boardc = self.board.copy()
         def cutoff(b, d): return d >= self.max_depth
@@ -578,7 +1407,12 @@ class PartneredAI(AI):
         else:
             other_board = "A"
         while True:
-            if self.color:
+            if self.pvs:
+                best_val, best_move = self.pvs_root(super_boardc, cutoff, forbidden_moves)
+                if self.communicating:
+                    self.find_dangerous_drops(best_move, best_val)
+                    self.find_valuable_drops(best_move, best_val)
+            elif self.color:
                 # player is white: trying to maximize moves
                 if self.communicating:
                     original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color)
@@ -637,9 +1471,15 @@ class PartneredAI(AI):
         """
         # copy the board
         super_boardc = self.board.copy()
+        root_ply = len(super_boardc.board_push_pop_stack)
         dep_count = 1
         best_move = None
+        best_val = None
         self.statistics.single_move_reset()
+        self.tt_new_search()
+        self.move_ordering_new_search()
+        start = time.time()
+        soft_limit, hard_limit = self.time_limits(self.color)
         forbidden_moves = list()
         if self.board_id == "A":
             other_board = "B"
@@ -647,33 +1487,53 @@ class PartneredAI(AI):
             other_board = "A"
         while True:  # need to keep going if the chosen move causes fivefold repetition, and that is set to False
             while dep_count <= self.max_depth and self.statistics.get_states_evaluated() <= self.max_states:
+                # depth 1 is always searched completely, so that there is a move to return
+                if dep_count > 1 and soft_limit is not None:
+                    if time.time() - start >= soft_limit:
+                        break
+                    self.hard_deadline = start + hard_limit
                 self.statistics.iter_deep_reset()
                 def cutoff(b, d): return d >= dep_count
-                if self.color:
-                    # color is white: trying to maximize moves
-                    if self.communicating:
-                        original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color)
-                        original_enemy_pocket = super_boardc.get_base_board(other_board).get_pocket(self.color)
-                        best_val, best_move = self.minimax(super_boardc, self.board_id, 0, cutoff,
-                                                           original_ally_pocket=original_ally_pocket,
-                                                           original_enemy_pocket=original_enemy_pocket, forbidden_moves=forbidden_moves)
-                        # self.find_dangerous_drops(best_move, best_val) # why were these removed?
-                        # self.find_valuable_drops(best_move, best_val)
-                    else:
-                        _, best_move = self.minimax(super_boardc, self.board_id, 0, cutoff, forbidden_moves=forbidden_moves)
-                else:
-                    # color is black: trying to minimize moves
-                    if self.communicating:
-                        original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color)
-                        original_enemy_pocket = super_boardc.get_base_board(other_board).get_pocket(self.color)
-                        best_val, best_move = self.maximin(super_boardc, self.board_id, 0, cutoff,
-                                                           original_ally_pocket=original_ally_pocket,
-                                                           original_enemy_pocket=original_enemy_pocket, forbidden_moves=forbidden_moves)
-                        # self.find_dangerous_drops(best_move, best_val) # why were these removed?
-                        # self.find_valuable_drops(best_move, best_val)
+                self.tt_horizon = dep_count
+                if self.tracer is not None:
+                    self.tracer.iteration(dep_count)
+                try:
+                    if self.workers > 1:
+                        best_val, best_move = self.parallel_root_search(super_boardc, dep_count, forbidden_moves)
+                    elif self.pvs:
+                        best_val, best_move = self.pvs_root(super_boardc, cutoff, forbidden_moves,
+                                                            guess=best_val if dep_count > 1 else None)
+                    elif self.color:
+                        # color is white: trying to maximize moves
+                        if self.communicating:
+                            original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color)
+                            original_enemy_pocket = super_boardc.get_base_board(other_board).get_pocket(self.color)
+                            best_val, best_move = self.minimax(super_boardc, self.board_id, 0, cutoff,
+                                                               original_ally_pocket=original_ally_pocket,
+                                                               original_enemy_pocket=original_enemy_pocket, forbidden_moves=forbidden_moves)
+                            # self.find_dangerous_drops(best_move, best_val) # why were these removed?
+                            # self.find_valuable_drops(best_move, best_val)
+                        else:
+                            _, best_move = self.minimax(super_boardc, self.board_id, 0, cutoff, forbidden_moves=forbidden_moves)
                     else:
-                        _, best_move = self.maximin(super_boardc, self.board_id, 0, cutoff, forbidden_moves=forbidden_moves)
+                        # color is black: trying to minimize moves
+                        if self.communicating:
+                            original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color)
+                            original_enemy_pocket = super_boardc.get_base_board(other_board).get_pocket(self.color)
+                            best_val, best_move = self.maximin(super_boardc, self.board_id, 0, cutoff,
+                                                               original_ally_pocket=original_ally_pocket,
+                                                               original_enemy_pocket=original_enemy_pocket, forbidden_moves=forbidden_moves)
+                            # self.find_dangerous_drops(best_move, best_val) # why were these removed?
+                            # self.find_valuable_drops(best_move, best_val)
+                        else:
+                            _, best_move = self.maximin(super_boardc, self.board_id, 0, cutoff, forbidden_moves=forbidden_moves)
+                except SearchTimeout:
+                    # give up this depth; best_move is still the one of the last completed depth
+                    self.unwind(super_boardc, root_ply)
+                    break
+                self.statistics.set_completed_depth(dep_count)
                 dep_count += 1
+            self.hard_deadline = None
             if best_move is None:
                 raise UnboundLocalError("best_move was about to be returned empty; here are the stats: states evaluated {0}, dep_count {1}".format(
                     self.statistics.get_states_evaluated(), dep_count))
@@ -683,8 +1543,7 @@ class PartneredAI(AI):
                 super_boardc.pop()
                 if not is_fivefold_repetition:
                     if self.communicating:
-                        self.find_dangerous_drops(best_move, best_val)
-                        self.find_valuable_drops(best_move, best_val)
+                        self.advise_partner(best_move, best_val, None if hard_limit is None else start + hard_limit)
                     break
                 else:
                     dep_count = 1
@@ -692,13 +1551,25 @@ class PartneredAI(AI):
                     best_move = None
             else:
                 if self.communicating:
-                    self.find_dangerous_drops(best_move, best_val)
-                    self.find_valuable_drops(best_move, best_val)
+                    self.advise_partner(best_move, best_val, None if hard_limit is None else start + hard_limit)
                 break
         self.statistics.update()
         self.statistics.log()
         return best_move
 
+    def advise_partner(self, move: chess.Move, val, deadline: Optional[float] = None):
+        """
+        Runs find_dangerous_drops() and find_valuable_drops() for the move chosen with the value
+        val. They are searches too, so they stop at the deadline (a time.time() value, or None for
+        no deadline) of the move; the partner then only hears about the pieces probed by then.
+        """
+        self.hard_deadline = deadline
+        try:
+            self.find_dangerous_drops(move, val)
+            self.find_valuable_drops(move, val)
+        finally:
+            self.hard_deadline = None
+
     def find_dangerous_drops(self, move: chess.Move, old_val):
         """
         If communicating is set to True, this will check to see what additional
@@ -727,31 +1598,46 @@ class PartneredAI(AI):
                 if num > 0:
                     not_in_pos.remove(p)
 
+            # these searches evaluate against other original pockets than the real
+            # search did, so they must not use (or fill) the transposition table
+            transposition_table, self.transposition_table = self.transposition_table, None
+            # with a time limit, these only search as deep as the search of the move got
+            if self.time_limits(self.color)[0] is None:
+                probe_depth = self.max_depth
+            else:
+                probe_depth = self.statistics.completed_depth
+            def cutoff(b, d): return d >= probe_depth
             danger = dict()
             if self.board_id == "A":
                 other_board = "B"
             else:
                 other_board = "A"
-            for p, i in not_in_pos.pieces.items():
-                original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color).copy()
-                original_enemy_pocket = super_boardc.get_base_board(other_board).get_pocket(self.color).copy()
-                if i > 0:
-                    print("###########################")
-                    super_boardc.get_pocket(self.board_id)
-                    print(original_ally_pocket)
-                    print(original_enemy_pocket)
-                    super_boardc.push_to_pocket(p, self.board_id, not self.color)
-                    super_boardc.get_pocket(self.board_id)
-                    if self.color:
-                        new_val, new_best_move = self.maximin(super_boardc, self.board_id, 2,
-                                                                        original_ally_pocket=original_ally_pocket,
-                                                                        original_enemy_pocket=original_enemy_pocket)
-                    else:
-                        new_val, new_best_move = self.maximin(super_boardc, self.board_id, 2,
-                                                                        original_ally_pocket=original_ally_pocket,
-                                                                        original_enemy_pocket=original_enemy_pocket)
-                    danger[p] = new_val - old_val
-                    super_boardc.rm_from_pocket(p, self.board_id, not self.color)
+            try:
+                for p, i in not_in_pos.pieces.items():
+                    original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color).copy()
+                    original_enemy_pocket = super_boardc.get_base_board(other_board).get_pocket(self.color).copy()
+                    if i > 0:
+                        print("###########################")
+                        super_boardc.get_pocket(self.board_id)
+                        print(original_ally_pocket)
+                        print(original_enemy_pocket)
+                        super_boardc.push_to_pocket(p, self.board_id, not self.color)
+                        super_boardc.get_pocket(self.board_id)
+                        if self.color:
+                            new_val, new_best_move = self.maximin(super_boardc, self.board_id, 2, cutoff,
+                                                                            original_ally_pocket=original_ally_pocket,
+                                                                            original_enemy_pocket=original_enemy_pocket)
+                        else:
+                            new_val, new_best_move = self.maximin(super_boardc, self.board_id, 2, cutoff,
+                                                                            original_ally_pocket=original_ally_pocket,
+                                                                            original_enemy_pocket=original_enemy_pocket)
+                        danger[p] = new_val - old_val
+                        super_boardc.rm_from_pocket(p, self.board_id, not self.color)
+            except SearchTimeout:
+                # out of time for this move (see advise_partner()); the partner gets the pieces probed so far
+                pass
+            finally:
+                self.transposition_table = transposition_table
 
             self.tell_partner.set_please_protect(danger)
 
@@ -787,26 +1673,41 @@ class PartneredAI(AI):
                 if num > 0:
                     not_in_pos.remove(p)
 
+            # these searches evaluate against other original pockets than the real
+            # search did, so they must not use (or fill) the transposition table
+            transposition_table, self.transposition_table = self.transposition_table, None
+            # with a time limit, these only search as deep as the search of the move got
+            if self.time_limits(self.color)[0] is None:
+                probe_depth = self.max_depth
+            else:
+                probe_depth = self.statistics.completed_depth
+            def cutoff(b, d): return d >= probe_depth
             benefit = dict()
             if self.board_id == "A":
                 other_board = "B"
             else:
                 other_board = "A"
-            for p, i in not_in_pos.pieces.items():
-                original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color).copy()
-                original_enemy_pocket = super_boardc.get_base_board(other_board).get_pocket(self.color).copy()
-                if i > 0:
-                    super_boardc.push_to_pocket(p, self.board_id, self.color)
-                    if self.color:
-                        new_val, new_best_move = self.maximin(super_boardc, self.board_id, 2,
-                                                              original_ally_pocket=original_ally_pocket,
-                                                              original_enemy_pocket=original_enemy_pocket)
-                    else:
-                        new_val, new_best_move = self.maximin(super_boardc, self.board_id, 2,
-                                                              original_ally_pocket=original_ally_pocket,
-                                                              original_enemy_pocket=original_enemy_pocket)
-                    benefit[p] = new_val - old_val
-                    super_boardc.rm_from_pocket(p, self.board_id, self.color)
+            try:
+                for p, i in not_in_pos.pieces.items():
+                    original_ally_pocket = super_boardc.get_base_board(other_board).get_pocket(not self.color).copy()
+                    original_enemy_pocket = super_boardc.get_base_board(other_board).get_pocket(self.color).copy()
+                    if i > 0:
+                        super_boardc.push_to_pocket(p, self.board_id, self.color)
+                        if self.color:
+                            new_val, new_best_move = self.maximin(super_boardc, self.board_id, 2, cutoff,
+                                                                  original_ally_pocket=original_ally_pocket,
+                                                                  original_enemy_pocket=original_enemy_pocket)
+                        else:
+                            new_val, new_best_move = self.maximin(super_boardc, self.board_id, 2, cutoff,
+                                                                  original_ally_pocket=original_ally_pocket,
+                                                                  original_enemy_pocket=original_enemy_pocket)
+                        benefit[p] = new_val - old_val
+                        super_boardc.rm_from_pocket(p, self.board_id, self.color)
+            except SearchTimeout:
+                # out of time for this move (see advise_partner()); the partner gets the pieces probed so far
+                pass
+            finally:
+                self.transposition_table = transposition_table
 
             self.tell_partner.set_please_capture(benefit)
 
@@ -862,7 +1763,9 @@ class SolitaryAI(AI):
 
     def __init__(self, name: str, board: variant.BughouseSuperBoard, is_maxing: bool, boardA_color: chess.Color, boardB_color: chess.Color, eval_class: chess.utility.UtilityEvalSuper,
                  max_depth: int = MAX_DEPTH, print_stats: bool = False,
-                 log: bool = False, max_states: bool = 1000000, iter_deep: bool = True, nxt_dep_func=None, move_order_fn=None, allow_fivefold_repetition=False):
+                 log: bool = False, max_states: bool = 1000000, iter_deep: bool = True, nxt_dep_func=None, move_order_fn=None, allow_fivefold_repetition=False,
+                 tt_size: int = 0, tt_replacement: str = "depth", movetime: float = None,
+                 detailed_stats: bool = True, trace: str = None, eval_cache_size: int = 0):
     # def __init__(self, name: str, board: variant.BughouseSuperBoard, color_dic, is_maxing, eval_class: chess.utility.UtilityEvalSuper,
     #              max_depth: int = MAX_DEPTH):
         """
@@ -876,10 +1779,12 @@ class SolitaryAI(AI):
         """
         super().__init__(name, board, eval_class, max_depth=max_depth, print_stats=print_stats,
                          log=log, max_states=max_states, iter_deep=iter_deep, nxt_dep_func=nxt_dep_func,
-                         move_order_fn=move_order_fn, allow_fivefold_repetition=allow_fivefold_repetition)
+                         move_order_fn=move_order_fn, allow_fivefold_repetition=allow_fivefold_repetition,
+                         tt_size=tt_size, tt_replacement=tt_replacement, movetime=movetime,
+                         detailed_stats=detailed_stats, trace=trace, eval_cache_size=eval_cache_size)
         self.boardA_color = boardA_color
         self.boardB_color = boardB_color
-        self.statistics = Statistics(max_depth, print_stats)
+        self.statistics = Statistics(max_depth, print_stats, detailed=detailed_stats)
         self.is_maxing = is_maxing
 
     def utility(self, board, board_id: str, color: chess.Color):
@@ -951,6 +1856,7 @@ class SolitaryAI(AI):
             - the state's utility value if the cutoff depth has been reached,
                 null action (because we are not allowed to continue actions)
         """
+        self.check_time()
         color = board.get_base_board(board_id).turn # TODO: may need to change
 
         if cutoff is None:
@@ -964,66 +1870,75 @@ class SolitaryAI(AI):
                 return float('-Inf'), chess.Move.null()
 
         if cutoff(board, depth):
+            t = self.statistics.eval_start()
             eval_result = self.utility(board, board_id, color)
-            t = time.time()
-            self.statistics.eval_func_time(t)
-            self.statistics.eval_func_count_inc()
+            self.statistics.eval_end(t)
             return eval_result, None
 
         # Other situations
+        tt_key = None
+        if self.transposition_table is not None:
+            tt_key = board.zobrist_hash() ^ SOLITARY_TT_KEYS[board_id][move_count % 4]
+            tt_score, tt_move = self.tt_lookup(tt_key, depth, alpha, beta)
+            if tt_score is not None and depth > 0:
+                return tt_score, tt_move
+            alpha_orig, beta_orig = alpha, beta
+
         val = float('-Inf')
         best_move = None
-        moves = list()
-        for mv in self.get_moves(board.get_base_board(board_id)):
-            moves.append(mv)
-
-        # remove any forbidden moves if they exist
-        if forbidden_moves:
-            for mv in forbidden_moves:
-                try:
-                    moves.remove(mv)
-                    self.log_forbidden_move_removal(mv)
-                except:
-                    pass
+        moves = self.search_moves(board, board_id, depth, "minimax", forbidden_moves)
 
         # logging
-        self.statistics.current_branching_max(len(moves))
-        self.log_avail_moves(board, moves, depth, board_id, "minimax")
+        self.statistics.current_branching_max(len(moves), depth)
+        traced = self.traced
+        if traced:
+            self.log_avail_moves(board, moves, depth, board_id, "minimax")
 
         # order the moves in a specific way if provided
         if self.move_order_fn:
-            moves = self.move_order_fn(self=self, moves=moves)
+            moves = self.move_order_fn(self=self, moves=moves, board=board.get_base_board(board_id), depth=depth)
+        if tt_key is not None:
+            moves = self.tt_move_first(moves, tt_move)
 
         # save = board.get_base_board(board_id).turn
         for move in moves:
-            self.log_before_push(board, mv, depth, board_id, "minimax")
+            if traced:
+                self.log_before_push(board, move, depth, board_id, "minimax")
             # board.get_base_board(board_id).turn = save
             # board = self.board.copy()
             board.push(move, board_id) # push first
-            self.log_after_push(board, mv, depth, board_id, "minimax")
-            nxt_dep = self.nxt_dep_func(self=self, depth=depth, move=mv) if self.nxt_dep_func else depth + 1
+            if traced:
+                self.log_after_push(board, move, depth, board_id, "minimax")
+            nxt_dep = self.nxt_dep_func(self=self, depth=depth, move=move) if self.nxt_dep_func else depth + 1
             # possible = self.maximin(board, self.flip(board_id), nxt_dep, cutoff, alpha, beta)[0]
             if move_count % 4 == 3:
                 possible = self.minimax(board, self.flip(board_id), depth + 1, move_count + 1, cutoff, alpha, beta)[0]
             else:
                 possible = self.maximin(board, self.flip(board_id), depth + 1, move_count + 1, cutoff, alpha, beta)[0]
             board.pop() # then pop
-            self.log_after_pop(board, mv, depth, board_id, "minimax")
+            if traced:
+                self.log_after_pop(board, move, depth, board_id, "minimax")
+                self.trace_move(move, depth, board_id, "minimax", possible, alpha, beta)
             if possible > val:
                 val = possible
                 best_move = move
 
             alpha = max(alpha, val)
             if val >= beta:
+                self.record_cutoff(board.get_base_board(board_id), best_move, depth, moves)
                 # if best_move is None:
                 #     raise UnboundLocalError("minimax: best_move was about to be returned"
                 #         " empty; here are the stats: states evaluated {0}, depth {1}, moves {2}"
                 #         .format(self.statistics.get_states_evaluated(), depth, moves))
+                if tt_key is not None and not forbidden_moves:
+                    self.tt_save(tt_key, depth, alpha_orig, beta_orig, val, best_move)
                 return val, best_move
         # if best_move is None:
         #     raise UnboundLocalError("minimax: best_move was about to be returned"
         #         " empty; here are the stats: states evaluated {0}, depth {1}, moves {2}"
         #         .format(self.statistics.get_states_evaluated(), depth, moves))
+        if tt_key is not None and not forbidden_moves:
+            self.tt_save(tt_key, depth, alpha_orig, beta_orig, val, best_move)
         return val, best_move
 
     def maximin(self, board: variant.BughouseSuperBoardT, board_id: str, depth: int, move_count: int, cutoff=None, alpha=float('-Inf'), beta=float('Inf'), forbidden_moves=None) -> (float, chess.Move):
@@ -1044,6 +1959,7 @@ class SolitaryAI(AI):
             - the state's utility value if the cutoff depth has been reached,
                 null action (because we are not allowed to continue actions)
         """
+        self.check_time()
         color = board.get_base_board(board_id).turn # TODO: may need to change
 
         if cutoff is None:
@@ -1057,66 +1973,75 @@ class SolitaryAI(AI):
                 return float('Inf'), chess.Move.null()
 
         if cutoff(board, depth):
+            t = self.statistics.eval_start()
             eval_result = self.utility(board, board_id, color)
-            t = time.time()
-            self.statistics.eval_func_time(t)
-            self.statistics.eval_func_count_inc()
+            self.statistics.eval_end(t)
             return eval_result, None
 
         # Other situations
+        tt_key = None
+        if self.transposition_table is not None:
+            tt_key = board.zobrist_hash() ^ SOLITARY_TT_KEYS[board_id][move_count % 4]
+            tt_score, tt_move = self.tt_lookup(tt_key, depth, alpha, beta)
+            if tt_score is not None and depth > 0:
+                return tt_score, tt_move
+            alpha_orig, beta_orig = alpha, beta
+
         val = float('Inf')
         best_move = None
-        moves = list()
-        for mv in self.get_moves(board.get_base_board(board_id)):
-            moves.append(mv)
-
-        # remove any forbidden moves if they exist
-        if forbidden_moves:
-            for mv in forbidden_moves:
-                try:
-                    moves.remove(mv)
-                    self.log_forbidden_move_removal(mv)
-                except:
-                    pass
+        moves = self.search_moves(board, board_id, depth, "maximin", forbidden_moves)
 
         # logging
-        self.statistics.current_branching_max(len(moves))
-        self.log_avail_moves(board, moves, depth, board_id, "maximin")
+        self.statistics.current_branching_max(len(moves), depth)
+        traced = self.traced
+        if traced:
+            self.log_avail_moves(board, moves, depth, board_id, "maximin")
 
         # order the moves in a specific way if provided
         if self.move_order_fn:
-            moves = self.move_order_fn(self=self, moves=moves)
+            moves = self.move_order_fn(self=self, moves=moves, board=board.get_base_board(board_id), depth=depth)
+        if tt_key is not None:
+            moves = self.tt_move_first(moves, tt_move)
 
         # save = board.get_base_board(board_id).turn
         for move in moves:
             # board.get_base_board(board_id).turn = save
             # board = self.board.copy()
-            self.log_before_push(board, mv, depth, board_id, "maximin")
+            if traced:
+                self.log_before_push(board, move, depth, board_id, "maximin")
             board.push(move, board_id) # push first
-            self.log_after_push(board, mv, depth, board_id, "maximin")
-            nxt_dep = self.nxt_dep_func(self=self, depth=depth, move=mv) if self.nxt_dep_func else depth + 1
+            if traced:
+                self.log_after_push(board, move, depth, board_id, "maximin")
+            nxt_dep = self.nxt_dep_func(self=self, depth=depth, move=move) if self.nxt_dep_func else depth + 1
             # possible = self.minimax(board, self.flip(board_id), nxt_dep, cutoff, alpha, beta)[0]
             if move_count % 4 == 1:
                 possible = self.maximin(board, self.flip(board_id), depth + 1, move_count + 1, cutoff, alpha, beta)[0]
             else:
                 possible = self.minimax(board, self.flip(board_id), depth + 1, move_count + 1, cutoff, alpha, beta)[0]
             board.pop() # then pop
-            self.log_after_pop(board, mv, depth, board_id, "maximin")
+            if traced:
+                self.log_after_pop(board, move, depth, board_id, "maximin")
+                self.trace_move(move, depth, board_id, "maximin", possible, alpha, beta)
             if possible < val:
                 val = possible
                 best_move = move
 
             beta = min(beta, val)
             if val <= alpha:
+                self.record_cutoff(board.get_base_board(board_id), best_move, depth, moves)
                 # if best_move is None:
                 #     raise UnboundLocalError("maximin: best_move was about to be returned"
                 #         " empty; here are the stats: states evaluated {0}, depth {1}, moves {2}"
                 #         .format(self.statistics.get_states_evaluated(), depth, moves))
+                if tt_key is not None and not forbidden_moves:
+                    self.tt_save(tt_key, depth, alpha_orig, beta_orig, val, best_move)
                 return val, best_move
         # if best_move is None:
         #     raise UnboundLocalError("maximin: best_move was about to be returned"
         #         " empty; here are the stats: states evaluated {0}, depth {1}, moves {2}"
         #         .format(self.statistics.get_states_evaluated(), depth, moves))
+        if tt_key is not None and not forbidden_moves:
+            self.tt_save(tt_key, depth, alpha_orig, beta_orig, val, best_move)
         return val, best_move
 
     # def choose_move(self, board_id) -> chess.Move:
@@ -1139,6 +2064,9 @@ class SolitaryAI(AI):
         Do an alpha-beta minimax search with at most depth max_depth. Return the result.
         """
         self.statistics.single_move_reset()
+        self.tt_new_search()
+        self.move_ordering_new_search()
+        self.tt_horizon = self.max_depth
         # copy the board
         super_boardc = self.board.copy()
         def cutoff(b, d): return d >= self.max_depth
@@ -1197,9 +2125,14 @@ class SolitaryAI(AI):
         print(color)
 
         super_boardc = self.board.copy()
+        root_ply = len(super_boardc.board_push_pop_stack)
         dep_count = 1
         best_move = None
         self.statistics.single_move_reset()
+        self.tt_new_search()
+        self.move_ordering_new_search()
+        start = time.time()
+        soft_limit, hard_limit = self.time_limits(color)
         forbidden_moves = list()
         if board_id == "A":
             other_board = "B"
@@ -1207,15 +2140,30 @@ class SolitaryAI(AI):
             other_board = "A"
         while True:  # need to keep going if the chosen move causes fivefold repetition, and that is set to False
             while dep_count <= self.max_depth and self.statistics.get_states_evaluated() <= self.max_states:
+                # depth 1 is always searched completely, so that there is a move to return
+                if dep_count > 1 and soft_limit is not None:
+                    if time.time() - start >= soft_limit:
+                        break
+                    self.hard_deadline = start + hard_limit
                 self.statistics.iter_deep_reset()
                 def cutoff(b, d): return d >= dep_count
-                if self.is_maxing:
-                    # trying to maximize moves
-                    _, best_move = self.minimax(super_boardc, board_id, 0, 0, cutoff, forbidden_moves=forbidden_moves)
-                else:
-                    # trying to minimize moves
-                    _, best_move = self.maximin(super_boardc, board_id, 0, 0, cutoff, forbidden_moves=forbidden_moves)
+                self.tt_horizon = dep_count
+                if self.tracer is not None:
+                    self.tracer.iteration(dep_count)
+                try:
+                    if self.is_maxing:
+                        # trying to maximize moves
+                        _, best_move = self.minimax(super_boardc, board_id, 0, 0, cutoff, forbidden_moves=forbidden_moves)
+                    else:
+                        # trying to minimize moves
+                        _, best_move = self.maximin(super_boardc, board_id, 0, 0, cutoff, forbidden_moves=forbidden_moves)
+                except SearchTimeout:
+                    # give up this depth; best_move is still the one of the last completed depth
+                    self.unwind(super_boardc, root_ply)
+                    break
+                self.statistics.set_completed_depth(dep_count)
                 dep_count += 1
+            self.hard_deadline = None
             # if best_move is None:
             #     raise UnboundLocalError("best_move was about to be returned empty; here are the stats: states evaluated {0}, dep_count {1}".format(
             #         self.statistics.get_states_evaluated(), dep_count))
@@ -1244,23 +2192,68 @@ class SolitaryAI(AI):
         pass
 
 class Statistics:
+    """
+    Counts what the search of an agent does. The counters are plain integers and fixed-size
+    arrays (see the STATS_ constants), so counting costs about as much as an addition:
+
+    - states (nodes), quiescence states, evaluations, transposition table hits and
+      evaluation cache lookups and hits (and the hit rate of the cache: a SolitaryAI
+      looks up two scores per evaluation),
+    - with detailed: the states and the moves generated per ply (the branching factor),
+      the cutoffs by the index of the move that caused them (how good the move ordering
+      is), the time per depth of iterative deepening, and the time of one evaluation out of
+      sample_rate (the total is estimated from them).
+
+    states, q_states, tt_hits, eval_func_count, eval_cache_hits and eval_cache_lookups are per iteration of iterative deepening
+    (max_states is checked against them); update() adds up the iterations of the move and
+    keeps a record of the move in self.records. With print_stats, every record is also
+    appended as a line of JSON to one file per game; export() writes all the records of the
+    game at once (as JSON lines or CSV).
+    """
+
+    # the fields of a record; the ones ending in _by_ply, _by_index or _by_depth are lists
+    FIELDS = ["agent", "move", "states", "q_states", "evals", "tt_hits", "eval_cache_hits",
+              "eval_cache_lookups", "eval_cache_hit_rate", "completed_depth",
+              "max_branching", "seconds", "eval_seconds", "states_by_ply", "branching_by_ply",
+              "cutoffs_by_index", "seconds_by_depth"]
 
-    def __init__(self, max_depth, print_stats: bool = False, board_id=None, color=None):
+    def __init__(self, max_depth, print_stats: bool = False, board_id=None, color=None, detailed: bool = True,
+                 sample_rate: int = EVAL_TIME_SAMPLE_RATE):
+        """
+        :param detailed: count per ply, per move index and per depth, and time the evaluations
+        :param sample_rate: time one out of this many evaluations; 0 to time none
+        """
         self.print_stats = print_stats
-        self.msgs = list()
         self.max_depth = max_depth
-        self.statistics = dict()
+        self.detailed = detailed
+        self.sample_rate = sample_rate if detailed else 0
+        self.records = list()
         self.total_states = 0
         self.branching = 0
-        self.avg_states_per_move = 0.0
-        self.avg_eval_func_time = 0.0
-        self.total_eval_func_time = 0
+        self.cur_move = 0
+        # per iteration
         self.states = 0
+        self.q_states = 0
+        self.tt_hits = 0
+        self.eval_func_count = 0
+        self.eval_cache_hits = 0
+        self.eval_cache_lookups = 0
+        self.leaf_states = 0
+        # per move
         self.cur_branching = 0
-        self.cur_move = 0
+        self.completed_depth = 0
+        # the states, q_states, evals, tt_hits, eval_cache_hits and eval_cache_lookups of the finished iterations
+        self._move = [0, 0, 0, 0, 0, 0]
         self._eval_func_time = 0.0
-        self.eval_func_count = 1
-        self.leaf_states = 0
+        self._eval_samples = 0
+        self._move_start = None
+        self._depth_start = None
+        self._depth_index = -1
+        self._zeros = array.array("q", bytes(8 * max(STATS_MAX_PLY, STATS_CUTOFF_SLOTS)))
+        self.states_by_ply = array.array("q", self._zeros[:STATS_MAX_PLY])
+        self.moves_by_ply = array.array("q", self._zeros[:STATS_MAX_PLY])
+        self.cutoffs_by_index = array.array("q", self._zeros[:STATS_CUTOFF_SLOTS])
+        self.seconds_by_depth = array.array("d", [0.0] * STATS_MAX_PLY)
         self.board_id = board_id
         self.color = color
         if self.board_id is not None and self.color is not None:
@@ -1270,10 +2263,16 @@ class Statistics:
         else:
             self.agent_name = None
             self.id_str = None
+        self.filename = None
+        if self.print_stats:
+            if self.agent_name is not None:
+                self.filename = "stats_{1}_{0}.jsonl".format(int(time.time()), self.agent_name)
+            else:
+                self.filename = "stats_{0}.jsonl".format(int(time.time()))
 
     def append_stats(self, filename):
         """
-        Appends all the stats stored in self.msgs to the end of filename
+        Appends the stats of all the moves so far to the end of filename
         with a header identifying this AI.
         """
         with open(filename, "a") as f:
@@ -1285,81 +2284,224 @@ class Statistics:
             builder.append(self.id_str)
         else:
             builder.append("Unidentified agent divider \n")
-        for m in self.msgs:
-            builder.append(m)
-            builder.append("\n")
+        for record in self.records:
+            builder.append("Move number {move}: states {states}, quiescence states {q_states}, evaluations {evals},"
+                           " transposition table hits {tt_hits}, evaluation cache hits {eval_cache_hits}/{eval_cache_lookups}"
+                           " ({eval_cache_hit_rate:.1%}), completed depth {completed_depth},"
+                           " max branching factor {max_branching}, {seconds:.3f}s (evaluation about {eval_seconds:.3f}s)\n"
+                           .format(**record))
+        builder.append("Total States for game: {}\n".format(self.total_states))
+        builder.append("Max branching factor for game: {}\n".format(self.branching))
         return "".join(builder)
 
     def single_move_reset(self):
         self.states = 0
+        self.q_states = 0
+        self.eval_func_count = 0
+        self.tt_hits = 0
+        self.eval_cache_hits = 0
+        self.eval_cache_lookups = 0
         self.leaf_states = 0
-        self.cur_branching = 0
         self.cur_move += 1
+        self.cur_branching = 0
+        self.completed_depth = 0
+        self._move = [0, 0, 0, 0, 0, 0]
         self._eval_func_time = 0.0
-        self.eval_func_count = 1
+        self._eval_samples = 0
+        self._move_start = time.time()
+        self._depth_start = None
+        self._depth_index = -1
+        if self.detailed:
+            self.states_by_ply[:] = self._zeros[:STATS_MAX_PLY]
+            self.moves_by_ply[:] = self._zeros[:STATS_MAX_PLY]
+            self.cutoffs_by_index[:] = self._zeros[:STATS_CUTOFF_SLOTS]
+            self.seconds_by_depth[:] = array.array("d", [0.0] * STATS_MAX_PLY)
 
     def iter_deep_reset(self):
+        """
+        Starts a new iteration (depth) of iterative deepening
+        """
+        self._end_depth()
+        self._end_iteration()
+        if self.detailed:
+            self._depth_start = time.time()
+            self._depth_index += 1
+
+    def _end_depth(self):
+        if self._depth_start is not None and 0 <= self._depth_index < STATS_MAX_PLY:
+            self.seconds_by_depth[self._depth_index] += time.time() - self._depth_start
+        self._depth_start = None
+
+    def _end_iteration(self):
+        move = self._move
+        move[0] += self.states
+        move[1] += self.q_states
+        move[2] += self.eval_func_count
+        move[3] += self.tt_hits
+        move[4] += self.eval_cache_hits
+        move[5] += self.eval_cache_lookups
         self.states = 0
+        self.q_states = 0
+        self.eval_func_count = 0
+        self.tt_hits = 0
+        self.eval_cache_hits = 0
+        self.eval_cache_lookups = 0
         self.leaf_states = 0
-        self.cur_branching = 0
-        self._eval_func_time = 0.0
-        self.eval_func_count = 1
+
+    def _move_totals(self):
+        """
+        Returns the states, q_states, evals, tt_hits, eval_cache_hits and eval_cache_lookups of the move so far
+        """
+        states, q_states, evals, tt_hits, eval_cache_hits, eval_cache_lookups = self._move
+        return (states + self.states, q_states + self.q_states, evals + self.eval_func_count,
+                tt_hits + self.tt_hits, eval_cache_hits + self.eval_cache_hits,
+                eval_cache_lookups + self.eval_cache_lookups)
 
     def update(self):
-        # self.cur_branching = self.states ** (1.0 / (self.max_depth - 1))
-        # self.cur_branching = self.leaf_states ** (1.0 / self.max_depth)
-        self.cur_branching = self.eval_func_count ** (1.0 / self.max_depth)
-        self.total_states += self.states
-        self.avg_states_per_move = self.total_states / self.cur_move
+        """
+        Ends the move and keeps a record of it; the counters of the last iteration are
+        kept until the next move
+        """
+        self._end_depth()
+        states = self._move_totals()[0]
+        self.total_states += states
         self.branching = max(self.cur_branching, self.branching)
-        new_eval_count = self.total_eval_func_time + self.eval_func_count
-        self.avg_eval_func_time = (self.avg_eval_func_time * self.total_eval_func_time +
-             self._eval_func_time) / new_eval_count
-        self.total_eval_func_time = new_eval_count
+        self.records.append(self.move_record())
+
+    def move_record(self) -> dict:
+        """
+        Returns the record of the last move, see FIELDS
+        """
+        states, q_states, evals, tt_hits, eval_cache_hits, eval_cache_lookups = self._move_totals()
+        eval_seconds = self._eval_func_time / self._eval_samples * evals if self._eval_samples else 0.0
+        record = {
+            "agent": self.agent_name,
+            "move": self.cur_move,
+            "states": states,
+            "q_states": q_states,
+            "evals": evals,
+            "tt_hits": tt_hits,
+            "eval_cache_hits": eval_cache_hits,
+            "eval_cache_lookups": eval_cache_lookups,
+            "eval_cache_hit_rate": eval_cache_hits / eval_cache_lookups if eval_cache_lookups else 0.0,
+            "completed_depth": self.completed_depth,
+            "max_branching": self.cur_branching,
+            "seconds": time.time() - self._move_start if self._move_start is not None else 0.0,
+            "eval_seconds": eval_seconds,
+            "states_by_ply": [],
+            "branching_by_ply": [],
+            "cutoffs_by_index": [],
+            "seconds_by_depth": [],
+        }
+        if self.detailed:
+            plies = [ply for ply in range(STATS_MAX_PLY) if self.states_by_ply[ply]]
+            last = plies[-1] + 1 if plies else 0
+            record["states_by_ply"] = self.states_by_ply[:last].tolist()
+            record["branching_by_ply"] = [self.moves_by_ply[ply] / self.states_by_ply[ply]
+                                          if self.states_by_ply[ply] else 0.0 for ply in range(last)]
+            record["cutoffs_by_index"] = self.cutoffs_by_index.tolist()
+            record["seconds_by_depth"] = self.seconds_by_depth[:max(self._depth_index + 1, 0)].tolist()
+        return record
 
     def log(self):
-        builder = list()
-        builder.append("Move number {} \n".format(self.cur_move))
-        builder.append("Total States for game: {}\n".format(self.total_states))
-        builder.append("Max branching factor for game: {}\n".format(self.branching))
-        builder.append("Average states per move for game: {}\n".format(self.avg_states_per_move))
-        builder.append("Average eval function execution time for game: {}\n".format(self.avg_eval_func_time))
-        builder.append("Eval function execution count: {}\n".format(self.total_eval_func_time))
-        builder.append("States for current turn: {}\n".format(self.states))
-        builder.append("Current turn branching factor: {}\n".format(self.cur_branching))
-        builder.append("Current turn eval function time: {}\n".format(self._eval_func_time))
-        builder.append("Current turn eval function count: {}\n".format(self.eval_func_count))
-        cur_turn_avg_eval = self._eval_func_time / self.eval_func_count
-        builder.append("Current turn eval function average time: {}\n".format(cur_turn_avg_eval))
-        built = "".join(builder)
-        self.msgs.append(built)
-
-        if not self.print_stats:
+        """
+        Appends the record of the last move to the stats file of the game if print_stats
+        """
+        if not self.print_stats or not self.records:
             return
-        print("logging" + str(self.cur_move))
-        if self.agent_name is not None:
-            filename = "stats_{1}_{2}_{0}.txt".format(int(time.time()), self.agent_name, self.cur_move)
+        with open(self.filename, "a") as f:
+            f.write(json.dumps(self.records[-1]) + "\n")
+
+    def export(self, filename, fmt: str = None):
+        """
+        Writes the records of all the moves of the game to filename.
+
+        :param fmt: "jsonl" (a line of JSON per move) or "csv" (the lists are separated by
+            spaces); by default, "csv" if filename ends with .csv, otherwise "jsonl"
+        """
+        if fmt is None:
+            fmt = "csv" if filename.endswith(".csv") else "jsonl"
+        if fmt == "jsonl":
+            with open(filename, "w") as f:
+                for record in self.records:
+                    f.write(json.dumps(record) + "\n")
+        elif fmt == "csv":
+            with open(filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(self.FIELDS)
+                for record in self.records:
+                    writer.writerow([" ".join(str(x) for x in record[field]) if isinstance(record[field], list)
+                                     else record[field] for field in self.FIELDS])
         else:
-            filename = "stats_{0}_{1}.txt".format(int(time.time()), self.cur_move)
-        with open(filename, "w+") as f:
-            if self.id_str is not None:
-                f.write(self.id_str)
-            f.write(built)
+            raise ValueError("Unknown stats format {}".format(fmt))
 
     def inc_states(self):
         self.states += 1
 
-    def eval_func_count_inc(self):
+    def eval_start(self):
+        """
+        Counts an evaluation; returns the time it starts at if it is timed, otherwise None
+        """
         self.eval_func_count += 1
+        if self.sample_rate and self.eval_func_count % self.sample_rate == 0:
+            return time.perf_counter()
+        return None
 
-    def eval_func_time(self, t):
-        self._eval_func_time += time.time() - t
+    def eval_end(self, t):
+        """
+        :param t: what eval_start() returned
+        """
+        if t is not None:
+            self._eval_func_time += time.perf_counter() - t
+            self._eval_samples += 1
+
+    def current_branching_max(self, branching, ply=0):
+        """
+        Counts a state at ply that has branching moves
+        """
+        if branching > self.cur_branching:
+            self.cur_branching = branching
+        if self.detailed and ply < STATS_MAX_PLY:
+            self.states_by_ply[ply] += 1
+            self.moves_by_ply[ply] += branching
 
-    def current_branching_max(self, branching):
-        self.cur_branching = max(self.cur_branching, branching)
+    def inc_cutoffs(self, index):
+        """
+        Counts a cutoff caused by the move at index of the searched moves
+        """
+        self.cutoffs_by_index[min(index, STATS_CUTOFF_SLOTS - 1)] += 1
 
     def get_states_evaluated(self):
         return self.states
 
     def inc_leaf(self):
         self.leaf_states += 1
+
+    def inc_tt_hits(self):
+        self.tt_hits += 1
+
+    def inc_eval_cache_hits(self):
+        self.eval_cache_hits += 1
+
+    def inc_eval_cache_lookups(self):
+        self.eval_cache_lookups += 1
+
+    def set_completed_depth(self, depth):
+        self.completed_depth = depth
+
+    def add_worker_stats(self, states, q_states, tt_hits, evals=0, eval_cache_hits=0, eval_cache_lookups=0):
+        """
+        Adds the counts of a worker process (see PartneredAI.parallel_root_search())
+        """
+        self.states += states
+        self.q_states += q_states
+        self.tt_hits += tt_hits
+        self.eval_func_count += evals
+        self.eval_cache_hits += eval_cache_hits
+        self.eval_cache_lookups += eval_cache_lookups
+
+    def inc_q_states(self):
+        self.q_states += 1
+
+    def get_q_states(self):
+        return self.q_states
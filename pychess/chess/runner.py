@@ -3,10 +3,14 @@ from pychess import chess as chess
 from pychess.chess import variant as variant
 from pychess.chess import ai as ai
 from pychess.chess.ai import CommChannel as CommChannel
+import json
 import logging
+import multiprocessing as mp
+from multiprocessing.connection import wait
 import pickle
 import random
 import time
+import traceback
 
 
 class PrescribedAgent:
@@ -188,6 +192,204 @@ class HumanAgent:
         return ai.CommChannel()
 
 
+# The partner of every player, by (board_id, color)
+PARTNERS = {
+    (chess.A, chess.WHITE): (chess.B, chess.BLACK),
+    (chess.A, chess.BLACK): (chess.B, chess.WHITE),
+    (chess.B, chess.WHITE): (chess.A, chess.BLACK),
+    (chess.B, chess.BLACK): (chess.A, chess.WHITE),
+}
+
+
+def _agent_board(agent):
+    """
+    Returns the super board an agent plays on (the one of its AI for a solitary AI handler),
+    or None if it has none.
+    """
+    if isinstance(agent, ai.SolitaryAIHandler):
+        return agent.ai.board
+    return getattr(agent, "board", None)
+
+
+class _AgentError:
+    """
+    Sent by _agent_process() instead of an answer when the agent has failed.
+    """
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _agent_process(agent, conn):
+    """
+    Runs an agent in its own process for Runner.play_async(). The agent keeps its own
+    copy of the board, which is kept up to date with the events sent through conn:
+
+    ("push", uci, board_id): a move was played (the pocket transfers follow from it)
+    ("advice", comm): the partner's advice
+    ("move",): choose a move; answers (uci, advice) after pushing the move on its own board
+    ("stats",): answers the statistics of the agent
+    ("stop",): ends the process
+
+    Once an event has raised an exception, every event that expects an answer is
+    answered with an _AgentError holding its traceback.
+    """
+    board = _agent_board(agent)
+    error = None
+    try:
+        while True:
+            event = conn.recv()
+            if event[0] == "stop":
+                break
+            if error is None:
+                try:
+                    if event[0] == "push":
+                        board.push(chess.Move.from_uci(event[1]), event[2])
+                    elif event[0] == "advice":
+                        agent.partners_advice(event[1])
+                    elif event[0] == "move":
+                        move = agent.choose_move()
+                        board.push(move, agent.board_id)
+                        conn.send((move.uci(), agent.give_advice()))
+                    elif event[0] == "stats":
+                        conn.send(agent.statistics.return_stats())
+                except Exception:
+                    error = _AgentError(traceback.format_exc())
+            if error is not None and event[0] in ("move", "stats"):
+                conn.send(error)
+    finally:
+        conn.close()
+
+
+def _receive(conn, name):
+    """
+    Receives the answer of the process of an agent of Runner.play_async().
+
+    :raises RuntimeError: if the agent failed or its process ended
+    """
+    try:
+        answer = conn.recv()
+    except EOFError:
+        raise RuntimeError("The process of agent {} ended unexpectedly".format(name))
+    if isinstance(answer, _AgentError):
+        raise RuntimeError("Agent {} failed:\n{}".format(name, answer.text))
+    return answer
+
+
+def _make_eval(team):
+    """
+    Makes the evaluation class of a team of a tournament matchup (see Runner.tournament()).
+
+    The set_<option>() methods of the evaluation classes set class attributes, so the options
+    are set on a subclass made for the team: the other team (which may use the same class) and
+    the later games of the worker process keep their own options. The subclass can't be pickled
+    by name, so its instances are pickled as the team they are made from.
+    """
+    base = getattr(chess.utility, team.get("eval", "BasicMaterialEvaluationBughouseBase"))
+    eval_type = type(base.__name__, (base,), {"__reduce__": lambda self: (_make_eval, (team,))})
+    for option, value in team.get("eval_options", dict()).items():
+        # e.g. "pocket_val" calls set_pocket_val()
+        getattr(eval_type, "set_" + option)(value)
+    return eval_type()
+
+
+def _make_team(team, board, seats):
+    """
+    Makes the agents of a team of a tournament matchup (see Runner.tournament()).
+
+    :param seats: the (board_id, color) of the two players of the team
+    :return: a dictionary of the agents by seat
+    """
+    agent = team.get("agent", "PartneredAI")
+    options = dict(team.get("options", dict()))
+    # the hooks are given by the name of the method of ai.AI
+    for hook in ("move_order_fn", "nxt_dep_func"):
+        if isinstance(options.get(hook), str):
+            options[hook] = getattr(ai.AI, options[hook])
+    names = {seat: "{0}{1}".format("white" if seat[1] else "black", seat[0]) for seat in seats}
+    if agent == "PartneredAI":
+        return {seat: ai.PartneredAI(names[seat], board, seat[0], seat[1], _make_eval(team),
+                                     max_depth=team.get("depth", ai.MAX_DEPTH), **options)
+                for seat in seats}
+    elif agent == "SolitaryAI":
+        colors = dict(seats)
+        solitary = ai.SolitaryAI(team.get("name", "solitary"), board, colors[chess.A] == chess.WHITE,
+                                 colors[chess.A], colors[chess.B], _make_eval(team),
+                                 max_depth=team.get("depth", ai.MAX_DEPTH), **options)
+        return {seat: ai.SolitaryAIHandler(names[seat], solitary, seat[0], seat[1]) for seat in seats}
+    elif agent == "RandomAgent":
+        return {seat: RandomAgent(names[seat], board, seat[0], seat[1]) for seat in seats}
+    raise ValueError("Unknown agent {} in tournament matchup".format(agent))
+
+
+def _game_result(board):
+    """
+    Returns the result of a game for the team of whiteA and blackB: "1-0" if
+    it won, "0-1" if it lost, "1/2-1/2" for a draw and "*" if the game isn't over.
+    """
+    is_over = board.is_game_over()
+    if not is_over:
+        return "*"
+    for board_id, status in zip((chess.A, chess.B), is_over):
+        base_board = board.get_base_board(board_id)
+        if status == "stalemate/checkmate" and base_board.is_check():
+            # the player to move is checkmated
+            lost = (board_id, base_board.turn)
+            return "0-1" if lost in ((chess.A, chess.WHITE), (chess.B, chess.BLACK)) else "1-0"
+    return "1/2-1/2"
+
+
+def _play_tournament_game(task):
+    """
+    Plays one game of a tournament in a worker process of Runner.tournament().
+
+    :param task: (matchup, game number)
+    :return: the record of the game, see Runner.tournament()
+    """
+    matchup, game = task
+    seed = matchup.get("seed", 0) + game
+    random.seed(seed)
+    teams = list(matchup["teams"])
+    team_names = [team.get("name", "team{}".format(i + 1)) for i, team in enumerate(teams)]
+    # the teams change sides every other game
+    if game % 2 and matchup.get("swap_sides", True):
+        teams.reverse()
+        team_names.reverse()
+    board = variant.BughouseSuperBoard()
+    agents = dict()
+    agents.update(_make_team(teams[0], board, [(chess.A, chess.WHITE), (chess.B, chess.BLACK)]))
+    agents.update(_make_team(teams[1], board, [(chess.B, chess.WHITE), (chess.A, chess.BLACK)]))
+    players = [agents[(chess.A, chess.WHITE)], agents[(chess.B, chess.WHITE)],
+               agents[(chess.A, chess.BLACK)], agents[(chess.B, chess.BLACK)]]
+
+    start = time.time()
+    moves = Runner.play(board, players, matchup.get("max_moves", 500), log_moves=False, show_board=False)
+    seconds = time.time() - start
+
+    nodes = dict()
+    for p in players:
+        # the two handlers of a solitary AI share its statistics
+        stats = p.ai.statistics if isinstance(p, ai.SolitaryAIHandler) else p.statistics
+        nodes[p.name] = getattr(stats, "total_states", 0)
+    result = _game_result(board)
+    first, second = team_names
+    winner = {"1-0": first, "0-1": second}.get(result)
+    is_over = board.is_game_over()
+    return {
+        "matchup": matchup.get("name"),
+        "game": game,
+        "seed": seed,
+        "whiteA_blackB": first,
+        "whiteB_blackA": second,
+        "result": result,
+        "winner": winner,
+        "status": list(is_over) if is_over else None,
+        "moves": [[board_id, uci] for (board_id, uci) in moves],
+        "plies": len(moves),
+        "seconds": seconds,
+        "nodes": nodes,
+    }
+
+
 class Runner:
     """
     This class is a simple setup (without all of the engine.py nastiness)
@@ -195,12 +397,15 @@ class Runner:
     """
 
     @staticmethod
-    def play(board, players, max_moves=200, log_moves=True, log_stats_after=False):
+    def play(board, players, max_moves=200, log_moves=True, log_stats_after=False, show_board=True):
         """
         :param players: a list of the agents in the order [whiteA, whiteB, blackA, blackB]
+        :param show_board: print the board after every move
+        :return: the record of the game: a list of (board_id, uci) in the order the moves were played
         """
         [whiteA, whiteB, blackA, blackB] = players
         total_moves = 0
+        record = list()
         try:
             while not board.is_game_over() and total_moves < max_moves:
                 p = players[total_moves % 4]
@@ -208,6 +413,7 @@ class Runner:
                 if log_moves:
                     logging.info("move: {name} moved {move}".format(name=p.name, move=move))
                 board.push(move, p.board_id)
+                record.append((p.board_id, move.uci()))
                 # push advice to partner
                 if p is whiteA:
                     blackB.partners_advice(p.give_advice())
@@ -220,19 +426,215 @@ class Runner:
                 else:
                     # if this happens, we've got a problem
                     raise NotImplementedError
-                print(board.unicode_ext(borders=True, labels=True, play_info=(p.color, p.board_id, move), pockets=True))
+                if show_board:
+                    print(board.unicode_ext(borders=True, labels=True, play_info=(p.color, p.board_id, move), pockets=True))
                 total_moves += 1
             is_over = board.is_game_over()
             if is_over:
                 # print(board.status())
-                print("Game over! A status:{}, B status:{}".format(is_over[0], is_over[1]))
+                if show_board:
+                    print("Game over! A status:{}, B status:{}".format(is_over[0], is_over[1]))
                 logging.info("Game over! A status:{}, B status:{}".format(is_over[0], is_over[1]))
-            print(board.unicode_ext(borders=True, labels=True))
+            if show_board:
+                print(board.unicode_ext(borders=True, labels=True))
         finally:
             if log_stats_after:
                 for p in players:
                     logging.info(p.statistics.return_stats())
                     logging.info("\n")
+        return record
+
+    @staticmethod
+    def play_async(board, players, max_moves=200, log_moves=True, log_stats_after=False, deterministic=False,
+                   show_board=True):
+        """
+        Plays a game where both boards are played at the same time, like in real bughouse: every agent
+        searches in its own process, and the moves (and the pocket transfers that follow from them)
+        and the advice to the partners are sent to the agents as events.
+
+        When not deterministic, a move is played as soon as it is chosen, so the order of the moves on
+        the two boards depends on how long the agents think. When deterministic, the two players to move
+        search from the same position and their moves are played in the order A, B; the game is then the
+        same every time for agents that don't depend on time or randomness. Any game can be played again
+        exactly with replay() from the record this returns.
+
+        The agents can't be human players (the processes have no input), and they are copied into the
+        processes: board and the agents in players aren't changed by their searches. The handlers of a
+        solitary AI each get their own copy of the AI. An exception raised by an agent in its process is
+        raised again here as a RuntimeError with its traceback.
+
+        :param players: a list of the agents in the order [whiteA, whiteB, blackA, blackB]
+        :param deterministic: play the moves in a fixed order instead of when they are chosen
+        :param show_board: print the board after every move
+        :return: the record of the game: a list of (board_id, uci) in the order the moves were played
+        """
+        for p in players:
+            if isinstance(p, HumanAgent) or _agent_board(p) is None:
+                raise ValueError("play_async() can't play {}: it needs agents that choose their moves on a board "
+                                 "of their own".format(p.name))
+        ctx = mp.get_context()
+        conns = dict()
+        processes = list()
+        names = dict()
+        for p in players:
+            conn, child_conn = ctx.Pipe()
+            # not a daemon, so that agents can have worker processes of their own
+            process = ctx.Process(target=_agent_process, args=(p, child_conn), name=p.name)
+            process.start()
+            child_conn.close()
+            conns[(p.board_id, p.color)] = conn
+            names[(p.board_id, p.color)] = p.name
+            processes.append(process)
+
+        record = list()
+        # the boards whose player to move is searching
+        searching = dict()
+
+        def start_search(board_id):
+            key = (board_id, board.get_base_board(board_id).turn)
+            conns[key].send(("move",))
+            searching[board_id] = key
+
+        def play(board_id, uci, advice):
+            key = searching.pop(board_id)
+            move = chess.Move.from_uci(uci)
+            if log_moves:
+                logging.info("move: {name} moved {move}".format(name=names[key], move=move))
+            board.push(move, board_id)
+            record.append((board_id, uci))
+            # the player that moved has already pushed the move on its own board
+            for other, conn in conns.items():
+                if other != key:
+                    conn.send(("push", uci, board_id))
+            conns[PARTNERS[key]].send(("advice", advice))
+            if show_board:
+                print(board.unicode_ext(borders=True, labels=True, play_info=(key[1], board_id, move), pockets=True))
+
+        try:
+            while not board.is_game_over() and len(record) < max_moves:
+                for board_id in (chess.A, chess.B):
+                    if board_id not in searching:
+                        start_search(board_id)
+                if deterministic:
+                    for board_id in (chess.A, chess.B):
+                        key = searching[board_id]
+                        uci, advice = _receive(conns[key], names[key])
+                        if not board.is_game_over() and len(record) < max_moves:
+                            play(board_id, uci, advice)
+                        else:
+                            del searching[board_id]
+                else:
+                    by_conn = {conns[key]: board_id for board_id, key in searching.items()}
+                    for conn in wait(list(by_conn)):
+                        uci, advice = _receive(conn, names[searching[by_conn[conn]]])
+                        if not board.is_game_over() and len(record) < max_moves:
+                            play(by_conn[conn], uci, advice)
+                        else:
+                            del searching[by_conn[conn]]
+            # wait for the searches that are still going on, their moves aren't played
+            for board_id, key in list(searching.items()):
+                _receive(conns[key], names[key])
+            is_over = board.is_game_over()
+            if is_over:
+                if show_board:
+                    print("Game over! A status:{}, B status:{}".format(is_over[0], is_over[1]))
+                logging.info("Game over! A status:{}, B status:{}".format(is_over[0], is_over[1]))
+            if show_board:
+                print(board.unicode_ext(borders=True, labels=True))
+            if log_stats_after:
+                for p in players:
+                    conn = conns[(p.board_id, p.color)]
+                    conn.send(("stats",))
+                    logging.info(_receive(conn, p.name))
+                    logging.info("\n")
+            for conn in conns.values():
+                conn.send(("stop",))
+        finally:
+            for process in processes:
+                process.join(timeout=1)
+                if process.is_alive():
+                    process.terminate()
+            for conn in conns.values():
+                conn.close()
+        return record
+
+    @staticmethod
+    def replay(board, record, log_moves=True):
+        """
+        Plays the moves of a game recorded by play_async() again, in the same order.
+
+        :param record: a list of (board_id, uci)
+        """
+        for board_id, uci in record:
+            move = chess.Move.from_uci(uci)
+            if log_moves:
+                logging.info("move: board {board_id} {move}".format(board_id=board_id, move=move))
+            board.push(move, board_id)
+        return board
+
+    @staticmethod
+    def tournament(matchups, processes=None, results_file=None):
+        """
+        Plays the games of a list of matchups on a pool of processes, one game per task.
+
+        A matchup is a dictionary:
+
+        {"name": "position v pocket", "games": 4, "seed": 0, "max_moves": 500, "swap_sides": True,
+         "teams": [team, team]}
+
+        where a team is a dictionary like
+
+        {"name": "position", "agent": "PartneredAI", "eval": "BasicPlusPositionEvalBughouseBase",
+         "eval_options": {"diff_positions": True}, "depth": 4,
+         "options": {"communicating": True, "max_states": 1000000, "move_order_fn": "heuristic_move_reorder"}}
+
+        agent is "PartneredAI", "SolitaryAI" or "RandomAgent"; eval is the name of a class of chess.utility
+        and every eval option calls its set_<option>(); options are the keyword arguments of the agent
+        (move_order_fn and nxt_dep_func by the name of the method of ai.AI). The first team plays whiteA and
+        blackB, and the teams change sides every other game unless swap_sides is False. Game i is played
+        with the seed seed + i, so games of agents that don't depend on time can be played again.
+
+        Every game gives a record (a dictionary) with the matchup name, game number, seed, the teams by
+        side, the result for the team of whiteA and blackB ("1-0", "0-1", "1/2-1/2" or "*" when max_moves
+        was reached), the winner, the status of the boards, the moves as (board_id, uci), the number of
+        plies, the time in seconds and the states searched by every player.
+
+        :param matchups: the list of matchups
+        :param processes: the number of processes; default is the number of CPUs
+        :param results_file: if given, every record is appended to it as a line of JSON as soon as
+            the game (and all the games before it) are over
+        :return: the records of the games, in the order of the matchups and games
+        """
+        tasks = [(matchup, game) for matchup in matchups for game in range(matchup.get("games", 1))]
+        records = list()
+        with mp.Pool(processes) as pool:
+            for record in pool.imap(_play_tournament_game, tasks):
+                logging.info("tournament: {matchup} game {game}: {result} in {plies} plies, {seconds:.1f}s".format(
+                    **record))
+                if results_file is not None:
+                    with open(results_file, "a") as f:
+                        f.write(json.dumps(record) + "\n")
+                records.append(record)
+        return records
+
+    @staticmethod
+    def tournament_summary(records):
+        """
+        Adds up the points of every team in the records of tournament(), by matchup.
+
+        :return: a dictionary {matchup name: {team name: points}}, where a win is 1 point and a draw 1/2
+        """
+        summary = dict()
+        for record in records:
+            points = summary.setdefault(record["matchup"], dict())
+            for team in (record["whiteA_blackB"], record["whiteB_blackA"]):
+                points.setdefault(team, 0.0)
+            if record["winner"] is not None:
+                points[record["winner"]] += 1
+            elif record["result"] == "1/2-1/2":
+                points[record["whiteA_blackB"]] += 0.5
+                points[record["whiteB_blackA"]] += 0.5
+        return summary
 
     @staticmethod
     def play_solitary(board, players, max_moves=200, log_moves=True, log_stats_after=False):
@@ -2,6 +2,7 @@
 # Bryce's import
 from pychess import chess as chess
 from pychess.chess import variant
+import json
 import random
 # import __init__ as chess
 # import variant
@@ -9,12 +10,9 @@ import random
 from typing import ClassVar, Callable, Dict, Generic, Hashable, Iterable, Iterator, List, Mapping, MutableSet, Optional, SupportsInt, Tuple, Type, TypeVar, Union
 import random
 
-PAWN_VAL = 100
-KNIGHT_VAL = 320
-BISHOP_VAL = 325
-ROOK_VAL = 500
-QUEEN_VAL = 975
-KING_VAL = 32767
+# the value of every piece type, indexed by piece type (see BughousePocket.material()), shared with Board.see()
+PIECE_VALUES = chess.PIECE_VALUES
+PAWN_VAL, KNIGHT_VAL, BISHOP_VAL, ROOK_VAL, QUEEN_VAL, KING_VAL = PIECE_VALUES[1:]
 
 MOBILITY_WEIGHT = 2
 
@@ -120,21 +118,56 @@ KING_TABLE_B = [
 #     -0.01, -0.03, -0.05, -0.04, -0.06, -0.04, -0.02, -0.015
 # ]
 
-PAWN_TABLE_W_DIFF = [sum(i) for i in zip(PAWN_TABLE_W, [random.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+# the seed of the noise in the diff tables, so that they are the same in every run (and process)
+PST_DIFF_SEED = 0x707374
+_diff_rng = random.Random(PST_DIFF_SEED)
 
-PAWN_TABLE_B_DIFF = [sum(i) for i in zip(PAWN_TABLE_B, [random.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+PAWN_TABLE_W_DIFF = [sum(i) for i in zip(PAWN_TABLE_W, [_diff_rng.uniform(-0.1, 0.1) for _ in range(0, 64)])]
 
-KNIGHT_TABLE_W_DIFF = [sum(i) for i in zip(KNIGHT_TABLE_W, [random.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+PAWN_TABLE_B_DIFF = [sum(i) for i in zip(PAWN_TABLE_B, [_diff_rng.uniform(-0.1, 0.1) for _ in range(0, 64)])]
 
-KNIGHT_TABLE_B_DIFF = [sum(i) for i in zip(KNIGHT_TABLE_B, [random.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+KNIGHT_TABLE_W_DIFF = [sum(i) for i in zip(KNIGHT_TABLE_W, [_diff_rng.uniform(-0.1, 0.1) for _ in range(0, 64)])]
 
-BISHOP_TABLE_W_DIFF = [sum(i) for i in zip(BISHOP_TABLE_W, [random.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+KNIGHT_TABLE_B_DIFF = [sum(i) for i in zip(KNIGHT_TABLE_B, [_diff_rng.uniform(-0.1, 0.1) for _ in range(0, 64)])]
 
-BISHOP_TABLE_B_DIFF = [sum(i) for i in zip(BISHOP_TABLE_B, [random.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+BISHOP_TABLE_W_DIFF = [sum(i) for i in zip(BISHOP_TABLE_W, [_diff_rng.uniform(-0.1, 0.1) for _ in range(0, 64)])]
 
-KING_TABLE_W_DIFF = [sum(i) for i in zip(KING_TABLE_W, [random.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+BISHOP_TABLE_B_DIFF = [sum(i) for i in zip(BISHOP_TABLE_B, [_diff_rng.uniform(-0.1, 0.1) for _ in range(0, 64)])]
 
-KING_TABLE_B_DIFF = [sum(i) for i in zip(KING_TABLE_B, [random.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+KING_TABLE_W_DIFF = [sum(i) for i in zip(KING_TABLE_W, [_diff_rng.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+
+KING_TABLE_B_DIFF = [sum(i) for i in zip(KING_TABLE_B, [_diff_rng.uniform(-0.1, 0.1) for _ in range(0, 64)])]
+del _diff_rng
+
+# the piece-square tables that every bughouse board keeps summed up for both colors, so the
+# evaluations below can read them in O(1) (see variant.BughouseBaseBoard.eval_terms()):
+# the white tables and the black tables, indexed by piece type
+EVAL_TABLES = variant.BughouseEvalTables(PIECE_VALUES, [
+    [None, PAWN_TABLE_W, KNIGHT_TABLE_W, BISHOP_TABLE_W, None, None, KING_TABLE_W],
+    [None, PAWN_TABLE_B, KNIGHT_TABLE_B, BISHOP_TABLE_B, None, None, KING_TABLE_B]])
+# where the material and the sums of the white and black tables of each color are in the terms
+MATERIAL_TERM = EVAL_TABLES.material_index
+PST_W_TERM = EVAL_TABLES.table_index[0]
+PST_B_TERM = EVAL_TABLES.table_index[1]
+
+
+def use_eval_tables(board_class: Type[variant.BughouseBaseBoard] = variant.BughouseBaseBoard) -> None:
+    """
+    Makes the boards of board_class keep the terms of EVAL_TABLES up to date, so that the
+    evaluations below read the material and the piece-square sums in O(1) instead of
+    scanning the board. The AIs call this when they are created; without it the boards
+    (e.g. of perft) don't pay for the terms on every push() and pop().
+    """
+    board_class.set_eval_tables(EVAL_TABLES)
+
+# the same tables with the diff positions (see set_diff_positions()), for batch evaluation
+DIFF_TABLES = [
+    [None, PAWN_TABLE_W_DIFF, KNIGHT_TABLE_W_DIFF, BISHOP_TABLE_W_DIFF, None, None, KING_TABLE_W_DIFF],
+    [None, PAWN_TABLE_B_DIFF, KNIGHT_TABLE_B_DIFF, BISHOP_TABLE_B_DIFF, None, None, KING_TABLE_B_DIFF]]
+
+# the number of snapshots batch_utility() scores at a time; every snapshot takes 768 bytes
+# of squares while it's being scored
+BATCH_CHUNK_SIZE = 65536
 
 
 def basic_material_eval_bughouse_base(board: variant.BughouseBaseBoardT, player: chess.Color,
@@ -173,6 +206,86 @@ def basic_material_eval(board, player,
 
     return float(val)
 
+
+def _numpy():
+    """
+    Imports numpy, which only batch evaluation needs
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("batch evaluation needs numpy, install it with pip install numpy")
+    return numpy
+
+
+def snapshot_dtype():
+    """
+    @returns the numpy dtype of the snapshots that batch evaluation scores: the bitboards
+    of the pieces ("pieces") and the pocket counts ("pockets"), both indexed by
+    [color][piece_type - 1]
+    """
+    np = _numpy()
+    return np.dtype([("pieces", "<u8", (2, 6)), ("pockets", "u1", (2, 6))])
+
+
+def board_snapshot(board: variant.BughouseBaseBoardT) -> tuple:
+    """
+    @returns the snapshot of board (see snapshot_dtype()) as nested tuples, which don't
+    need numpy and can be put into a snapshot array as they are
+    """
+    pieces = []
+    pockets = []
+    for color in [chess.BLACK, chess.WHITE]:
+        occupied = board.occupied_co[color]
+        pieces.append((board.pawns & occupied, board.knights & occupied, board.bishops & occupied,
+                       board.rooks & occupied, board.queens & occupied, board.kings & occupied))
+        pocket = board.pockets[color]
+        pockets.append(tuple(pocket.count(pt) for pt in chess.PIECE_TYPES))
+    return tuple(pieces), tuple(pockets)
+
+
+def eval_snapshots(boards: Iterable[variant.BughouseBaseBoardT]):
+    """
+    @returns a numpy array with the snapshots of boards, to score with batch_utility()
+    """
+    np = _numpy()
+    return np.array([board_snapshot(board) for board in boards], dtype=snapshot_dtype())
+
+
+def child_snapshots(board: variant.BughouseBaseBoardT, moves: Optional[Iterable[chess.Move]] = None):
+    """
+    @returns a numpy array with the snapshots of the positions after each of moves (by
+    default the legal moves) on board, so all children of a node can be scored with a
+    single batch_utility() call. The moves are pushed and popped on board itself, without
+    touching the pockets of the other board.
+    """
+    np = _numpy()
+    if moves is None:
+        moves = board.generate_legal_moves()
+    snapshots = []
+    for move in moves:
+        board.push(move)
+        snapshots.append(board_snapshot(board))
+        board.pop()
+    return np.array(snapshots, dtype=snapshot_dtype())
+
+
+def _batch_tables(np, tables):
+    """
+    @returns the piece-square tables (indexed by piece type, None for no table) as a
+    float array indexed by [piece_type - 1][square]
+    """
+    return np.array([table if table else [0] * 64 for table in tables[1:]], dtype=float)
+
+
+def _batch_squares(np, snapshots):
+    """
+    @returns a uint8 array indexed by [snapshot][color][piece_type - 1][square], that is 1
+    where the snapshot has a piece of that color and piece type
+    """
+    pieces = np.ascontiguousarray(snapshots["pieces"], dtype="<u8")
+    return np.unpackbits(pieces.view(np.uint8).reshape(pieces.shape + (8,)), axis=-1, bitorder="little")
+
 """
 Here we can put information regarding whatever with respect to evaluation.
 
@@ -206,6 +319,12 @@ class UtilityEvalSuper(Generic[chess.BoardT]):
     QUEEN_VAL = 975
     KING_VAL = 32767
 
+    use_legal_mobility = False
+
+    @classmethod
+    def set_legal_mobility(cls, val):
+        cls.use_legal_mobility = val
+
     @classmethod
     def utility(cls, board: variant.BughouseSuperBoardT, board_id: str, players_eval: dict,
                 ally_diff_pocket: variant.BughousePocketT = None, enemy_diff_pocket: variant.BughousePocketT = None,
@@ -266,7 +385,48 @@ class UtilityEvalSuper(Generic[chess.BoardT]):
         """
         # return cls._utility(board, player)
         raise NotImplementedError
-        
+
+    @classmethod
+    def batch_utility(cls, snapshots, player: chess.Color, chunk_size: int = BATCH_CHUNK_SIZE):
+        """
+        Scores many positions at once with vectorized popcounts and piece-square lookups,
+        for example all children of a node (see child_snapshots()), or millions of
+        positions to tune the evaluation parameters with. Needs numpy.
+
+        params:
+            - @snapshots: a numpy array of snapshots (see eval_snapshots())
+            - @player: the player to evaluate the positions for
+
+        @returns a float numpy array with the _utility() of every snapshot for player
+        (without the diff pockets). Sub-classes that support this implement _batch_utility().
+        """
+        np = _numpy()
+        scores = np.empty(len(snapshots), dtype=float)
+        for start in range(0, len(snapshots), chunk_size):
+            chunk = snapshots[start:start + chunk_size]
+            scores[start:start + len(chunk)] = cls._batch_utility(np, chunk, _batch_squares(np, chunk), player)
+        return scores
+
+    @classmethod
+    def _batch_utility(cls, np, snapshots, squares, player: chess.Color):
+        """
+        The batch_utility() helper method, for a chunk of snapshots and their squares (see
+        _batch_squares()).
+        """
+        raise NotImplementedError("{} has no batch evaluation".format(cls.__name__))
+
+    @classmethod
+    def batch_material(cls, np, squares):
+        """
+        @returns the material of white minus the material of black, like
+        basic_material_eval_bughouse_base(), for every snapshot
+        """
+        values = np.array([cls.PAWN_VAL, cls.KNIGHT_VAL, cls.BISHOP_VAL, cls.ROOK_VAL,
+                           cls.QUEEN_VAL, cls.KING_VAL], dtype=float)
+        counts = squares.sum(axis=-1, dtype=np.int64)
+        # numpy takes bools for masks, so the colors index as ints
+        return counts[:, int(chess.WHITE)] @ values - counts[:, int(chess.BLACK)] @ values
+
     @classmethod
     def basic_material_eval_bughouse_base(cls, board: variant.BughouseBaseBoardT, player: chess.Color,
                                           ally_diff_pocket=None, enemy_diff_pocket=None, to_protect=None,
@@ -274,6 +434,9 @@ class UtilityEvalSuper(Generic[chess.BoardT]):
         """
         @returns the float value of the material score for player in state
         """
+        terms = board.eval_terms()
+        if terms is not None:
+            return terms[MATERIAL_TERM[chess.WHITE]] - terms[MATERIAL_TERM[chess.BLACK]]
         val = 0
         bo = board.occupied_co[chess.BLACK]
         wo = board.occupied_co[chess.WHITE]
@@ -287,6 +450,27 @@ class UtilityEvalSuper(Generic[chess.BoardT]):
 
         return val
 
+    @classmethod
+    def mobility(cls, board: variant.BughouseBaseBoardT, player: chess.Color) -> int:
+        """
+        @returns the number of moves (not counting drops) of player's pieces
+
+        By default these are the pseudo-legal moves, less the ones that pinned
+        pieces can't make, counted from the attack bitboards (see
+        chess.BaseBoard.mobility()). With use_legal_mobility the legal moves
+        are generated and counted instead, which is a lot slower.
+        """
+        if not cls.use_legal_mobility:
+            return board.mobility(player, pinned=True)
+        original_turn = board.turn
+        board.turn = player
+        mobility = 0
+        for move in board.generate_legal_moves():
+            if not move.drop:
+                mobility += 1
+        board.turn = original_turn
+        return mobility
+
     @classmethod
     def basic_material_eval_bughouse_super(cls, board: variant.BughouseSuperBoardT, player,
                                            ally_diff_pocket=None,
@@ -309,6 +493,10 @@ class BasicMaterialEvaluationBughouseBase(UtilityEvalSuper):
                  enemy_diff_pocket=None, to_protect=None, to_capture=None) -> float:
         return float(cls.basic_material_eval_bughouse_base(board, player))
 
+    @classmethod
+    def _batch_utility(cls, np, snapshots, squares, player: chess.Color):
+        return cls.batch_material(np, squares)
+
 
 class BasicPlusPositionEvalBughouseBase(UtilityEvalSuper):
     """ 
@@ -331,36 +519,49 @@ class BasicPlusPositionEvalBughouseBase(UtilityEvalSuper):
     def set_diff_positions(cls, val):
         cls.use_diff_positions = val
 
+    @classmethod
+    def _batch_utility(cls, np, snapshots, squares, player: chess.Color):
+        tables = DIFF_TABLES if cls.use_diff_positions else EVAL_TABLES.tables
+        if player:
+            pst = np.tensordot(squares[:, int(chess.WHITE)], _batch_tables(np, tables[0]), axes=2)
+        else:
+            pst = np.tensordot(squares[:, int(chess.BLACK)], _batch_tables(np, tables[1]), axes=2)
+        return cls.batch_material(np, squares) + pst
+
     @classmethod
     def _utility(cls, board: variant.BughouseBaseBoardT, player: chess.Color,
                  ally_diff_pocket: variant.BughousePocketT = None, enemy_diff_pocket: variant.BughousePocketT = None,
                  to_protect=None, to_capture=None) -> float:
         val = cls.basic_material_eval_bughouse_base(board, player)
+        terms = None if cls.use_diff_positions else board.eval_terms()
         if player: # player is white
             wo = board.occupied_co[chess.WHITE]
-            for sq in chess.SQUARES:
-                bb_sq = chess.BB_SQUARES[sq]
-                if bb_sq & wo:
-                    if bb_sq & board.pawns:
-                        if cls.use_diff_positions:
-                            val += PAWN_TABLE_W_DIFF[sq]
-                        else:
-                            val += PAWN_TABLE_W[sq]
-                    elif bb_sq & board.knights:
-                        if cls.use_diff_positions:
-                            val += KNIGHT_TABLE_W_DIFF[sq]
-                        else:
-                            val += KNIGHT_TABLE_W[sq]
-                    elif bb_sq & board.bishops:
-                        if cls.use_diff_positions:
-                            val += BISHOP_TABLE_W_DIFF[sq]
-                        else:
-                            val += BISHOP_TABLE_W[sq]
-                    elif bb_sq & board.kings:
-                        if cls.use_diff_positions:
-                            val += cls.KING_TABLE_W_DIFF[sq]
-                        else:
-                            val += KING_TABLE_W[sq]
+            if terms is not None:
+                val += terms[PST_W_TERM[chess.WHITE]]
+            else:
+                for sq in chess.SQUARES:
+                    bb_sq = chess.BB_SQUARES[sq]
+                    if bb_sq & wo:
+                        if bb_sq & board.pawns:
+                            if cls.use_diff_positions:
+                                val += PAWN_TABLE_W_DIFF[sq]
+                            else:
+                                val += PAWN_TABLE_W[sq]
+                        elif bb_sq & board.knights:
+                            if cls.use_diff_positions:
+                                val += KNIGHT_TABLE_W_DIFF[sq]
+                            else:
+                                val += KNIGHT_TABLE_W[sq]
+                        elif bb_sq & board.bishops:
+                            if cls.use_diff_positions:
+                                val += BISHOP_TABLE_W_DIFF[sq]
+                            else:
+                                val += BISHOP_TABLE_W[sq]
+                        elif bb_sq & board.kings:
+                            if cls.use_diff_positions:
+                                val += cls.KING_TABLE_W_DIFF[sq]
+                            else:
+                                val += KING_TABLE_W[sq]
             if ally_diff_pocket is None:
                 return float(val)
             else:
@@ -386,29 +587,32 @@ class BasicPlusPositionEvalBughouseBase(UtilityEvalSuper):
                 return float(val)
         else: # player is black
             bo = board.occupied_co[chess.BLACK]
-            for sq in chess.SQUARES:
-                bb_sq = chess.BB_SQUARES[sq]
-                if bb_sq & bo:
-                    if bb_sq & board.pawns:
-                        if cls.use_diff_positions:
-                            val += PAWN_TABLE_B_DIFF[sq]
-                        else:
-                            val += PAWN_TABLE_B[sq]
-                    elif bb_sq & board.knights:
-                        if cls.use_diff_positions:
-                            val += KNIGHT_TABLE_B_DIFF
-                        else:
-                            val += KNIGHT_TABLE_B[sq]
-                    elif bb_sq & board.bishops:
-                        if cls.use_diff_positions:
-                            val += BISHOP_TABLE_B_DIFF
-                        else:
-                            val += BISHOP_TABLE_B[sq]
-                    elif bb_sq & board.kings:
-                        if cls.use_diff_positions:
-                            val += KING_TABLE_B_DIFF
-                        else:
-                            val += KING_TABLE_B[sq]
+            if terms is not None:
+                val += terms[PST_B_TERM[chess.BLACK]]
+            else:
+                for sq in chess.SQUARES:
+                    bb_sq = chess.BB_SQUARES[sq]
+                    if bb_sq & bo:
+                        if bb_sq & board.pawns:
+                            if cls.use_diff_positions:
+                                val += PAWN_TABLE_B_DIFF[sq]
+                            else:
+                                val += PAWN_TABLE_B[sq]
+                        elif bb_sq & board.knights:
+                            if cls.use_diff_positions:
+                                val += KNIGHT_TABLE_B_DIFF
+                            else:
+                                val += KNIGHT_TABLE_B[sq]
+                        elif bb_sq & board.bishops:
+                            if cls.use_diff_positions:
+                                val += BISHOP_TABLE_B_DIFF
+                            else:
+                                val += BISHOP_TABLE_B[sq]
+                        elif bb_sq & board.kings:
+                            if cls.use_diff_positions:
+                                val += KING_TABLE_B_DIFF
+                            else:
+                                val += KING_TABLE_B[sq]
             if ally_diff_pocket is None:
                 return float(val)
             else:
@@ -580,6 +784,19 @@ class BasicPlusPositionPlusPocketValEvalBughouseBase(UtilityEvalSuper):
     def set_diff_positions(cls, val):
         cls.use_diff_positions = val
 
+    @classmethod
+    def _batch_utility(cls, np, snapshots, squares, player: chess.Color):
+        tables = DIFF_TABLES if cls.use_diff_positions else EVAL_TABLES.tables
+        values = np.array(PIECE_VALUES[1:], dtype=float)
+        pocket = snapshots["pockets"][:, int(player)].astype(float) @ values * cls.pocket_val
+        if player:
+            pst = np.tensordot(squares[:, int(chess.WHITE)], _batch_tables(np, tables[0]), axes=2)
+            return cls.batch_material(np, squares) + pst + pocket
+        else:
+            # like _utility(), this sums the black tables over the pieces of both colors
+            pst = np.tensordot(squares.sum(axis=1), _batch_tables(np, tables[1]), axes=2)
+            return cls.batch_material(np, squares) + pst - pocket
+
     @classmethod
     def set_pocket_val(cls, val):
         cls.pocket_val = val
@@ -589,47 +806,39 @@ class BasicPlusPositionPlusPocketValEvalBughouseBase(UtilityEvalSuper):
                  ally_diff_pocket: variant.BughousePocketT = None, enemy_diff_pocket: variant.BughousePocketT = None,
                  to_protect=None, to_capture=None) -> float:
         val = cls.basic_material_eval_bughouse_base(board, player)
+        terms = None if cls.use_diff_positions else board.eval_terms()
         # Subtract dropped pieces from material val to decentivize instant drops
         self_pocket = board.get_pocket(player)
         if player:  # player is white
             wo = board.occupied_co[chess.WHITE]
-            for sq in chess.SQUARES:
-                bb_sq = chess.BB_SQUARES[sq]
-                if bb_sq & wo:
-                    if bb_sq & board.pawns:
-                        if cls.use_diff_positions:
-                            val += PAWN_TABLE_W_DIFF[sq]
-                        else:
-                            val += PAWN_TABLE_W[sq]
-                    elif bb_sq & board.knights:
-                        if cls.use_diff_positions:
-                            val += KNIGHT_TABLE_W_DIFF[sq]
-                        else:
-                            val += KNIGHT_TABLE_W[sq]
-                    elif bb_sq & board.bishops:
-                        if cls.use_diff_positions:
-                            val += BISHOP_TABLE_W_DIFF[sq]
-                        else:
-                            val += BISHOP_TABLE_W[sq]
-                    elif bb_sq & board.kings:
-                        if cls.use_diff_positions:
-                            val += cls.KING_TABLE_W_DIFF[sq]
-                        else:
-                            val += KING_TABLE_W[sq]
+            if terms is not None:
+                val += terms[PST_W_TERM[chess.WHITE]]
+            else:
+                for sq in chess.SQUARES:
+                    bb_sq = chess.BB_SQUARES[sq]
+                    if bb_sq & wo:
+                        if bb_sq & board.pawns:
+                            if cls.use_diff_positions:
+                                val += PAWN_TABLE_W_DIFF[sq]
+                            else:
+                                val += PAWN_TABLE_W[sq]
+                        elif bb_sq & board.knights:
+                            if cls.use_diff_positions:
+                                val += KNIGHT_TABLE_W_DIFF[sq]
+                            else:
+                                val += KNIGHT_TABLE_W[sq]
+                        elif bb_sq & board.bishops:
+                            if cls.use_diff_positions:
+                                val += BISHOP_TABLE_W_DIFF[sq]
+                            else:
+                                val += BISHOP_TABLE_W[sq]
+                        elif bb_sq & board.kings:
+                            if cls.use_diff_positions:
+                                val += cls.KING_TABLE_W_DIFF[sq]
+                            else:
+                                val += KING_TABLE_W[sq]
             if self_pocket is not None:
-                for p, v in self_pocket.pieces.items():
-                    if p == chess.KING:
-                        val += v * KING_VAL * cls.pocket_val
-                    elif p == chess.QUEEN:
-                        val += v * QUEEN_VAL * cls.pocket_val
-                    elif p == chess.ROOK:
-                        val += v * ROOK_VAL * cls.pocket_val
-                    elif p == chess.BISHOP:
-                        val += v * BISHOP_VAL * cls.pocket_val
-                    elif p == chess.KNIGHT:
-                        val += v * KNIGHT_VAL * cls.pocket_val
-                    else:  # p == chess.PAWN
-                        val += v * PAWN_VAL * cls.pocket_val
+                val += self_pocket.material(PIECE_VALUES) * cls.pocket_val
             if ally_diff_pocket is None:
                 return float(val)
             else:
@@ -655,42 +864,34 @@ class BasicPlusPositionPlusPocketValEvalBughouseBase(UtilityEvalSuper):
                 return float(val)
         else:  # player is black
             bo = board.occupied_co[chess.BLACK]
-            for sq in chess.SQUARES:
-                bb_sq = chess.BB_SQUARES[sq]
-                if bb_sq & board.pawns:
-                    if cls.use_diff_positions:
-                        val += PAWN_TABLE_B_DIFF[sq]
-                    else:
-                        val += PAWN_TABLE_B[sq]
-                elif bb_sq & board.knights:
-                    if cls.use_diff_positions:
-                        val += KNIGHT_TABLE_B_DIFF
-                    else:
-                        val += KNIGHT_TABLE_B[sq]
-                elif bb_sq & board.bishops:
-                    if cls.use_diff_positions:
-                        val += BISHOP_TABLE_B_DIFF
-                    else:
-                        val += BISHOP_TABLE_B[sq]
-                elif bb_sq & board.kings:
-                    if cls.use_diff_positions:
-                        val += KING_TABLE_B_DIFF
-                    else:
-                        val += KING_TABLE_B[sq]
+            if terms is not None:
+                # like the loop below, this sums the black tables over the pieces of both colors
+                val += terms[PST_B_TERM[chess.WHITE]] + terms[PST_B_TERM[chess.BLACK]]
+            else:
+                for sq in chess.SQUARES:
+                    bb_sq = chess.BB_SQUARES[sq]
+                    if bb_sq & board.pawns:
+                        if cls.use_diff_positions:
+                            val += PAWN_TABLE_B_DIFF[sq]
+                        else:
+                            val += PAWN_TABLE_B[sq]
+                    elif bb_sq & board.knights:
+                        if cls.use_diff_positions:
+                            val += KNIGHT_TABLE_B_DIFF
+                        else:
+                            val += KNIGHT_TABLE_B[sq]
+                    elif bb_sq & board.bishops:
+                        if cls.use_diff_positions:
+                            val += BISHOP_TABLE_B_DIFF
+                        else:
+                            val += BISHOP_TABLE_B[sq]
+                    elif bb_sq & board.kings:
+                        if cls.use_diff_positions:
+                            val += KING_TABLE_B_DIFF
+                        else:
+                            val += KING_TABLE_B[sq]
             if self_pocket is not None:
-                for p, v in self_pocket.pieces.items():
-                    if p == chess.KING:
-                        val -= v * KING_VAL * cls.pocket_val
-                    elif p == chess.QUEEN:
-                        val -= v * QUEEN_VAL * cls.pocket_val
-                    elif p == chess.ROOK:
-                        val -= v * ROOK_VAL * cls.pocket_val
-                    elif p == chess.BISHOP:
-                        val -= v * BISHOP_VAL * cls.pocket_val
-                    elif p == chess.KNIGHT:
-                        val -= v * KNIGHT_VAL * cls.pocket_val
-                    else:  # p == chess.PAWN
-                        val -= v * PAWN_VAL * cls.pocket_val
+                val -= self_pocket.material(PIECE_VALUES) * cls.pocket_val
             if ally_diff_pocket is None:
                 return float(val)
             else:
@@ -716,6 +917,106 @@ class BasicPlusPositionPlusPocketValEvalBughouseBase(UtilityEvalSuper):
                 return float(val)
 
 
+class PieceSquareTableEvalBughouseBase(UtilityEvalSuper):
+    """
+    This class evaluates an instance of a _BughouseBaseBoardState with a single flat
+    table that holds the value of every piece of either color on every square, its
+    material and its piece-square value in one, so evaluating only takes a lookup for
+    every piece on the board (found with scan_forward()) instead of testing all
+    64 squares. The pockets of both sides are added at pocket_val of their material.
+
+    Unlike the other evaluations this one is the same for both players: it is
+    positive when white is better.
+
+    The table is indexed by (color * 7 + piece_type) * 64 + square. By default it is
+    made from PIECE_VALUES and the piece-square tables of this module, set_tables_file()
+    loads it from a JSON file instead (see set_tables()).
+    """
+
+    pocket_val = 0.5
+    table = ()  # type: Tuple[float, ...]
+
+    @classmethod
+    def set_pocket_val(cls, val):
+        cls.pocket_val = val
+
+    @classmethod
+    def set_tables(cls, values: List[float], white: Dict[str, List[float]], black: Dict[str, List[float]]):
+        """
+        Sets the table from the piece values and the piece-square tables of each color.
+
+        params:
+            - @values: the value of every piece type, indexed by piece type
+            - @white: the piece-square table of every white piece type, by piece name
+              (e.g. "pawn"), indexed by square (a1 first); missing piece types score 0
+            - @black: the same for black. Like PAWN_TABLE_B and friends, these are from
+              white's point of view, so they are negative where black is better
+        """
+        table = []
+        for color, tables in [(chess.BLACK, black), (chess.WHITE, white)]:
+            for piece_type in range(7):
+                pst = tables.get(chess.PIECE_NAMES[piece_type], [0] * 64) if piece_type else [0] * 64
+                if len(pst) != 64:
+                    raise ValueError("expected 64 squares in the {} {} table, got {}".format(
+                        chess.COLOR_NAMES[color], chess.PIECE_NAMES[piece_type], len(pst)))
+                value = values[piece_type] if color == chess.WHITE else -values[piece_type]
+                table.extend(value + pst[sq] for sq in chess.SQUARES)
+        cls.table = tuple(table)
+
+    @classmethod
+    def set_tables_file(cls, filename: str):
+        """
+        Loads the table from a JSON file with the arguments of set_tables(), e.g.
+        {"values": [0, 100, 320, 325, 500, 975, 32767], "white": {"pawn": [...], ...},
+        "black": {"pawn": [...], ...}}
+        """
+        with open(filename) as f:
+            tables = json.load(f)
+        cls.set_tables(tables["values"], tables.get("white", dict()), tables.get("black", dict()))
+
+    @classmethod
+    def _utility(cls, board: variant.BughouseBaseBoardT, player: chess.Color,
+                 ally_diff_pocket: variant.BughousePocketT = None, enemy_diff_pocket: variant.BughousePocketT = None,
+                 to_protect=None, to_capture=None) -> float:
+        table = cls.table
+        val = 0
+        for color in chess.COLORS:
+            occupied = board.occupied_co[color]
+            for piece_type, bb in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                                   (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                                   (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+                offset = (color * 7 + piece_type) * 64
+                for sq in chess.scan_forward(bb & occupied):
+                    val += table[offset + sq]
+        val += (board.pockets[chess.WHITE].material(PIECE_VALUES) -
+                board.pockets[chess.BLACK].material(PIECE_VALUES)) * cls.pocket_val
+        if ally_diff_pocket is not None:
+            sign = 1 if player else -1
+            for p, v in to_protect.items():
+                # Failed to protect piece
+                if enemy_diff_pocket.pieces[p] > 0:
+                    val -= sign * v
+            for p, v in to_capture.items():
+                # Succeeded in capturing piece
+                if ally_diff_pocket.pieces[p] > 0:
+                    val += sign * v
+        return float(val)
+
+    @classmethod
+    def _batch_utility(cls, np, snapshots, squares, player: chess.Color):
+        table = np.array(cls.table, dtype=float).reshape(2, 7, 64)[:, 1:]
+        values = np.array(PIECE_VALUES[1:], dtype=float)
+        pockets = snapshots["pockets"].astype(float) @ values
+        # numpy takes bools for masks, so the colors index as ints
+        pocket = pockets[:, int(chess.WHITE)] - pockets[:, int(chess.BLACK)]
+        return np.tensordot(squares, table, axes=3) + pocket * cls.pocket_val
+
+
+PieceSquareTableEvalBughouseBase.set_tables(PIECE_VALUES, *[
+    {chess.PIECE_NAMES[piece_type]: pst for piece_type, pst in enumerate(tables) if pst}
+    for tables in EVAL_TABLES.tables])
+
+
 class BasicPlusMobilityEvalBughouseBase(UtilityEvalSuper):
     """
     This class evaluates an instance of a _BughouseBaseBoardState for the defined player
@@ -739,31 +1040,13 @@ class BasicPlusMobilityEvalBughouseBase(UtilityEvalSuper):
 
         # Subtract dropped pieces from material val to decentivize instant drops
         self_pocket = board.get_pocket(player)
-        original_turn = board.turn
-        board.turn = player
         if player: # player is white
-            mobility = 0
-            for move in board.generate_legal_moves():
-                if not move.drop:
-                    mobility += 1
+            mobility = cls.mobility(board, player)
 
             val += mobility * MOBILITY_WEIGHT
-            board.turn = original_turn
 
             if self_pocket is not None:
-                for p, v in self_pocket.pieces.items():
-                    if p == chess.KING:
-                        val += v * KING_VAL * cls.pocket_val
-                    elif p == chess.QUEEN:
-                        val += v * QUEEN_VAL * cls.pocket_val
-                    elif p == chess.ROOK:
-                        val += v * ROOK_VAL * cls.pocket_val
-                    elif p == chess.BISHOP:
-                        val += v * BISHOP_VAL * cls.pocket_val
-                    elif p == chess.KNIGHT:
-                        val += v * KNIGHT_VAL * cls.pocket_val
-                    else:  # p == chess.PAWN
-                        val += v * PAWN_VAL * cls.pocket_val
+                val += self_pocket.material(PIECE_VALUES) * cls.pocket_val
             if ally_diff_pocket is None:
                 return float(val)
             else:
@@ -777,28 +1060,12 @@ class BasicPlusMobilityEvalBughouseBase(UtilityEvalSuper):
                         val += v
                 return float(val)
         else: # player is black
-            mobility = 0
-            for move in board.generate_legal_moves():
-                if not move.drop:
-                    mobility += 1
+            mobility = cls.mobility(board, player)
 
             val -= mobility * MOBILITY_WEIGHT
-            board.turn = original_turn
 
             if self_pocket is not None:
-                for p, v in self_pocket.pieces.items():
-                    if p == chess.KING:
-                        val -= v * KING_VAL * cls.pocket_val
-                    elif p == chess.QUEEN:
-                        val -= v * QUEEN_VAL * cls.pocket_val
-                    elif p == chess.ROOK:
-                        val -= v * ROOK_VAL * cls.pocket_val
-                    elif p == chess.BISHOP:
-                        val -= v * BISHOP_VAL * cls.pocket_val
-                    elif p == chess.KNIGHT:
-                        val -= v * KNIGHT_VAL * cls.pocket_val
-                    else:  # p == chess.PAWN
-                        val -= v * PAWN_VAL * cls.pocket_val
+                val -= self_pocket.material(PIECE_VALUES) * cls.pocket_val
             if ally_diff_pocket is None:
                 return float(val)
             else:
@@ -839,41 +1106,39 @@ class BasicPlusPositionPlusMobilityEvalBughouseBase(UtilityEvalSuper):
                  ally_diff_pocket: variant.BughousePocketT = None, enemy_diff_pocket: variant.BughousePocketT = None,
                  to_protect=None, to_capture=None) -> float:
         val = cls.basic_material_eval_bughouse_base(board, player)
-        original_turn = board.turn
-        board.turn = player
+        terms = None if cls.use_diff_positions else board.eval_terms()
         if player: # player is white
-            mobility = 0
-            for move in board.generate_legal_moves():
-                if not move.drop:
-                    mobility += 1
+            mobility = cls.mobility(board, player)
 
             val += mobility * MOBILITY_WEIGHT
-            board.turn = original_turn
 
             wo = board.occupied_co[chess.WHITE]
-            for sq in chess.SQUARES:
-                bb_sq = chess.BB_SQUARES[sq]
-                if bb_sq & wo:
-                    if bb_sq & board.pawns:
-                        if cls.use_diff_positions:
-                            val += PAWN_TABLE_W_DIFF[sq]
-                        else:
-                            val += PAWN_TABLE_W[sq]
-                    elif bb_sq & board.knights:
-                        if cls.use_diff_positions:
-                            val += KNIGHT_TABLE_W_DIFF[sq]
-                        else:
-                            val += KNIGHT_TABLE_W[sq]
-                    elif bb_sq & board.bishops:
-                        if cls.use_diff_positions:
-                            val += BISHOP_TABLE_W_DIFF[sq]
-                        else:
-                            val += BISHOP_TABLE_W[sq]
-                    elif bb_sq & board.kings:
-                        if cls.use_diff_positions:
-                            val += KING_TABLE_W_DIFF[sq]
-                        else:
-                            val += KING_TABLE_W[sq]
+            if terms is not None:
+                val += terms[PST_W_TERM[chess.WHITE]]
+            else:
+                for sq in chess.SQUARES:
+                    bb_sq = chess.BB_SQUARES[sq]
+                    if bb_sq & wo:
+                        if bb_sq & board.pawns:
+                            if cls.use_diff_positions:
+                                val += PAWN_TABLE_W_DIFF[sq]
+                            else:
+                                val += PAWN_TABLE_W[sq]
+                        elif bb_sq & board.knights:
+                            if cls.use_diff_positions:
+                                val += KNIGHT_TABLE_W_DIFF[sq]
+                            else:
+                                val += KNIGHT_TABLE_W[sq]
+                        elif bb_sq & board.bishops:
+                            if cls.use_diff_positions:
+                                val += BISHOP_TABLE_W_DIFF[sq]
+                            else:
+                                val += BISHOP_TABLE_W[sq]
+                        elif bb_sq & board.kings:
+                            if cls.use_diff_positions:
+                                val += KING_TABLE_W_DIFF[sq]
+                            else:
+                                val += KING_TABLE_W[sq]
             if ally_diff_pocket is None:
                 return float(val)
             else:
@@ -887,37 +1152,37 @@ class BasicPlusPositionPlusMobilityEvalBughouseBase(UtilityEvalSuper):
                         val += v
                 return float(val)
         else: # player is black
-            mobility = 0
-            for move in board.generate_legal_moves():
-                if not move.drop:
-                    mobility += 1
+            mobility = cls.mobility(board, player)
 
             val -= mobility * MOBILITY_WEIGHT
-            board.turn = original_turn
 
             bo = board.occupied_co[chess.BLACK]
-            for sq in chess.SQUARES:
-                bb_sq = chess.BB_SQUARES[sq]
-                if bb_sq & board.pawns:
-                    if cls.use_diff_positions:
-                        val += PAWN_TABLE_B_DIFF[sq]
-                    else:
-                        val += PAWN_TABLE_B[sq]
-                elif bb_sq & board.knights:
-                    if cls.use_diff_positions:
-                        val += KNIGHT_TABLE_B_DIFF
-                    else:
-                        val += KNIGHT_TABLE_B[sq]
-                elif bb_sq & board.bishops:
-                    if cls.use_diff_positions:
-                        val += BISHOP_TABLE_B_DIFF
-                    else:
-                        val += BISHOP_TABLE_B[sq]
-                elif bb_sq & board.kings:
-                    if cls.use_diff_positions:
-                        val += KING_TABLE_B_DIFF
-                    else:
-                        val += KING_TABLE_B[sq]
+            if terms is not None:
+                # like the loop below, this sums the black tables over the pieces of both colors
+                val += terms[PST_B_TERM[chess.WHITE]] + terms[PST_B_TERM[chess.BLACK]]
+            else:
+                for sq in chess.SQUARES:
+                    bb_sq = chess.BB_SQUARES[sq]
+                    if bb_sq & board.pawns:
+                        if cls.use_diff_positions:
+                            val += PAWN_TABLE_B_DIFF[sq]
+                        else:
+                            val += PAWN_TABLE_B[sq]
+                    elif bb_sq & board.knights:
+                        if cls.use_diff_positions:
+                            val += KNIGHT_TABLE_B_DIFF
+                        else:
+                            val += KNIGHT_TABLE_B[sq]
+                    elif bb_sq & board.bishops:
+                        if cls.use_diff_positions:
+                            val += BISHOP_TABLE_B_DIFF
+                        else:
+                            val += BISHOP_TABLE_B[sq]
+                    elif bb_sq & board.kings:
+                        if cls.use_diff_positions:
+                            val += KING_TABLE_B_DIFF
+                        else:
+                            val += KING_TABLE_B[sq]
             if ally_diff_pocket is None:
                 return float(val)
             else:
@@ -970,16 +1235,10 @@ class BasicPlusPositionPlusMobilityEvalBughouseBaseBeale(UtilityEvalSuper):
                  ally_diff_pocket: variant.BughousePocketT = None, enemy_diff_pocket: variant.BughousePocketT = None,
                  to_protect=None, to_capture=None) -> float:
         val = cls.basic_material_eval_bughouse_base(board, player)
-        occupied_turn = board.turn
-        board.turn = player
         if player: # player is white
-            mobility = 0
-            for move in board.generate_legal_moves():
-                if not move.drop:
-                    mobility += 1
+            mobility = cls.mobility(board, player)
 
             val += mobility * MOBILITY_WEIGHT
-            board.turn = occupied_turn
             wo = board.occupied_co[chess.WHITE]
             for sq in chess.SQUARES:
                 bb_sq = chess.BB_SQUARES[sq]
@@ -1005,13 +1264,9 @@ class BasicPlusPositionPlusMobilityEvalBughouseBaseBeale(UtilityEvalSuper):
                         val += 2*v
                 return float(val)
         else: # player is black
-            mobility = 0
-            for move in board.generate_legal_moves():
-                if not move.drop:
-                    mobility += 1
+            mobility = cls.mobility(board, player)
 
             val -= mobility * MOBILITY_WEIGHT
-            board.turn = occupied_turn
             bo = board.occupied_co[chess.BLACK]
             for sq in chess.SQUARES:
                 bb_sq = chess.BB_SQUARES[sq]
@@ -21,10 +21,17 @@ from pychess import chess as chess
 
 import copy
 import itertools
-import traceback
+import random
 
 from typing import Dict, Generic, Hashable, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar, Union
 
+# The piece types that can be dropped, in the order the drops are generated
+DROP_PIECE_TYPES = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+
+# The interned drop moves, by piece type and square
+DROP_MOVES = [[chess.Move.from_code(chess.move_code(square, square, drop=pt)) for square in chess.SQUARES]
+              if pt in DROP_PIECE_TYPES else None for pt in range(chess.KING + 1)]
+
 
 class SuicideBoard(chess.Board):
     aliases = ["Suicide", "Suicide chess"]
@@ -123,6 +130,11 @@ class SuicideBoard(chess.Board):
                 if not self.is_en_passant(move):
                     yield move
 
+    def legal_moves_into(self, buffer: List[chess.Move], from_mask: chess.Bitboard = chess.BB_ALL,
+                         to_mask: chess.Bitboard = chess.BB_ALL) -> List[chess.Move]:
+        buffer[:] = self.generate_legal_moves(from_mask, to_mask)
+        return buffer
+
     def is_legal(self, move: chess.Move) -> bool:
         if not super().is_legal(move):
             return False
@@ -306,6 +318,11 @@ class AtomicBoard(chess.Board):
             if self.is_legal(move):
                 yield move
 
+    def legal_moves_into(self, buffer: List[chess.Move], from_mask: chess.Bitboard = chess.BB_ALL,
+                         to_mask: chess.Bitboard = chess.BB_ALL) -> List[chess.Move]:
+        buffer[:] = self.generate_legal_moves(from_mask, to_mask)
+        return buffer
+
     def status(self) -> chess.Status:
         status = super().status()
         status &= ~chess.STATUS_OPPOSITE_CHECK
@@ -371,6 +388,11 @@ class RacingKingsBoard(chess.Board):
             if not self._gives_check(move):
                 yield move
 
+    def legal_moves_into(self, buffer: List[chess.Move], from_mask: chess.Bitboard = chess.BB_ALL,
+                         to_mask: chess.Bitboard = chess.BB_ALL) -> List[chess.Move]:
+        buffer[:] = self.generate_legal_moves(from_mask, to_mask)
+        return buffer
+
     def is_variant_end(self) -> bool:
         if not self.kings & chess.BB_RANK_8:
             return False
@@ -752,20 +774,52 @@ class CrazyhouseBoard(chess.Board):
             return super().is_legal(move)
 
     def generate_pseudo_legal_drops(self, to_mask: chess.Bitboard = chess.BB_ALL) -> Iterator[chess.Move]:
+        from_code = chess.Move.from_code
         for to_square in chess.scan_forward(to_mask & ~self.occupied):
+            code = to_square | to_square << chess.MOVE_TO_SHIFT | chess.MOVE_DROP_FLAG
             for pt, count in self.pockets[self.turn].pieces.items():
                 if count and (pt != chess.PAWN or not chess.BB_BACKRANKS & chess.BB_SQUARES[to_square]):
-                    yield chess.Move(to_square, to_square, drop=pt)
+                    yield from_code(code | pt << chess.MOVE_PIECE_SHIFT)
 
     def generate_legal_drops(self, to_mask: chess.Bitboard = chess.BB_ALL) -> Iterator[chess.Move]:
         return self.generate_pseudo_legal_drops(to_mask=self.legal_drop_squares_mask() & to_mask)
 
+    def legal_drops_into(self, buffer: List[chess.Move], to_mask: chess.Bitboard = chess.BB_ALL) -> List[chess.Move]:
+        """
+        Appends the legal drops to *buffer* (piece type by piece type, each
+        over the whole target bitboard) and returns it.
+        """
+        targets = self.legal_drop_squares_mask() & to_mask & ~self.occupied
+        if not targets:
+            return buffer
+        pocket = self.pockets[self.turn]
+        append = buffer.append
+        for pt in DROP_PIECE_TYPES:
+            if pocket.count(pt):
+                drops = DROP_MOVES[pt]
+                bb = targets & ~chess.BB_BACKRANKS if pt == chess.PAWN else targets
+                # scan_forward(), inlined
+                while bb:
+                    r = bb & -bb
+                    append(drops[r.bit_length() - 1])
+                    bb ^= r
+        return buffer
+
     def generate_legal_moves(self, from_mask: chess.Bitboard = chess.BB_ALL, to_mask: chess.Bitboard = chess.BB_ALL) -> \
     Iterator[chess.Move]:
         return itertools.chain(
             super().generate_legal_moves(from_mask, to_mask),
             self.generate_legal_drops(from_mask & to_mask))
 
+    def legal_moves_into(self, buffer: List[chess.Move], from_mask: chess.Bitboard = chess.BB_ALL,
+                         to_mask: chess.Bitboard = chess.BB_ALL) -> List[chess.Move]:
+        """
+        Like :func:`~chess.Board.legal_moves_into()`, followed by the legal
+        drops (see :func:`legal_drops_into()`).
+        """
+        super().legal_moves_into(buffer, from_mask, to_mask)
+        return self.legal_drops_into(buffer, from_mask & to_mask)
+
     def parse_san(self, san: str) -> chess.Move:
         if "@" in san:
             uci = san.rstrip("+# ")
@@ -894,57 +948,108 @@ class BughousePocket:
         chess.KNIGHT: 8
     }
 
+    # the piece types that can be in a pocket, in the order pieces lists them
+    PIECE_TYPES = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+
+    # every piece type gets 6 bits in key(); that is enough for MAX_POS of every piece
+    KEY_BITS = 6
+
+    __slots__ = ("_counts", "_key")
+
     def __init__(self, symbols: Iterable[str] = "") -> None:
-        self.pieces = {}  # type: Dict[chess.PieceType, int]
-        for p in chess.PIECE_TYPES:
-            # initialize all pieces (except king) to 0; important for the check in remove
-            self.pieces[p] = 0
-        del self.pieces[chess.KING]
+        # the counts, indexed by piece type (the king and index 0 are always 0)
+        self._counts = [0, 0, 0, 0, 0, 0, 0]
+        # the counts packed into a single int, see key()
+        self._key = 0
         for symbol in symbols:
             self.add(chess.PIECE_SYMBOLS.index(symbol))
 
+    @property
+    def pieces(self) -> Dict[chess.PieceType, int]:
+        """
+        The count of every piece type (except the king) that can be in a pocket.
+        This is a new dict, changing it does not change the pocket.
+        """
+        counts = self._counts
+        return {pt: counts[pt] for pt in self.PIECE_TYPES}
+
     def unicode(self, is_white):
         pocket_str = ""
-        for piece, num in self.pieces.items():
+        for piece in self.PIECE_TYPES:
             if is_white:
                 piece_str = self.PIECE_NUM_LETTERS[piece].upper()
             else:
                 piece_str = self.PIECE_NUM_LETTERS[piece]
-            pocket_str += (self.UNICODE_PIECE_SYMBOLS[piece_str] + " ") * num
+            pocket_str += (self.UNICODE_PIECE_SYMBOLS[piece_str] + " ") * self._counts[piece]
         return pocket_str
 
     def add(self, pt: chess.PieceType) -> None:
-        self.pieces[pt] = self.pieces.get(pt, 0) + 1
-        if self.pieces[pt] > self.MAX_POS[pt]:
-            raise ValueError("can't have {0} pieces of {1}".format(self.pieces[pt] + 1, self.PIECE_NUM_LETTERS[pt]))
+        if self._counts[pt] >= self.MAX_POS[pt]:
+            raise ValueError("can't have {0} pieces of {1}".format(self._counts[pt] + 1, self.PIECE_NUM_LETTERS[pt]))
+        self._counts[pt] += 1
+        self._key += 1 << (pt * self.KEY_BITS)
 
     def size(self):
-        return len(self.pieces)
+        return len(self.PIECE_TYPES)
 
     def remove(self, pt: chess.PieceType) -> None:
-        if self.pieces.get(pt, 0) == 0:
+        if self._counts[pt] == 0:
             raise ValueError("can't have less than 0 pieces in a pocket")
-        self.pieces[pt] -= 1
+        self._counts[pt] -= 1
+        self._key -= 1 << (pt * self.KEY_BITS)
 
     def count(self, piece_type: chess.PieceType) -> int:
-        return self.pieces.get(piece_type, 0)
+        return self._counts[piece_type]
 
     def reset(self) -> None:
-        self.pieces.clear()
+        self._counts = [0, 0, 0, 0, 0, 0, 0]
+        self._key = 0
+
+    def key(self) -> int:
+        """
+        Returns the counts packed into one int (KEY_BITS bits per piece type).
+        Two pockets have the same key exactly when they hold the same pieces, so
+        this can be used for hashing and as an immutable snapshot (see from_key()).
+        """
+        return self._key
+
+    @classmethod
+    def from_key(cls: Type[BughousePocketT], key: int) -> BughousePocketT:
+        """
+        Returns a new pocket with the pieces of the snapshot key (see key()).
+        """
+        pocket = cls()
+        mask = (1 << cls.KEY_BITS) - 1
+        for pt in cls.PIECE_TYPES:
+            pocket._counts[pt] = (key >> (pt * cls.KEY_BITS)) & mask
+        pocket._key = key
+        return pocket
+
+    def material(self, values) -> int:
+        """
+        Returns the value of the pieces in the pocket.
+
+        :param values: the value of every piece type, indexed by piece type
+            (e.g. [0, PAWN_VAL, KNIGHT_VAL, BISHOP_VAL, ROOK_VAL, QUEEN_VAL, KING_VAL])
+        """
+        counts = self._counts
+        return (counts[chess.PAWN] * values[chess.PAWN] + counts[chess.KNIGHT] * values[chess.KNIGHT] +
+                counts[chess.BISHOP] * values[chess.BISHOP] + counts[chess.ROOK] * values[chess.ROOK] +
+                counts[chess.QUEEN] * values[chess.QUEEN])
 
     def __str__(self) -> str:
         return "".join(chess.piece_symbol(pt) * self.count(pt) for pt in reversed(chess.PIECE_TYPES))
 
     def __len__(self) -> int:
-        return sum(self.pieces.values())
+        return sum(self._counts)
 
     def __repr__(self) -> str:
         return "BughousePocket('{}')".format(str(self))
 
     def copy(self: BughousePocketT) -> BughousePocketT:
-        pocket = type(self)()
-        # pocket.pieces = dict()
-        pocket.pieces = copy.copy(self.pieces)
+        pocket = object.__new__(type(self))
+        pocket._counts = self._counts.copy()
+        pocket._key = self._key
         return pocket
 
     def diff(self, other: BughousePocketT) -> BughousePocketT:
@@ -954,14 +1059,9 @@ class BughousePocket:
         :param other:
         :return:
         """
-        new_pocket = BughousePocket()
-        for p in chess.PIECE_TYPES:
-            if not (p in self.pieces) and not (p in other.pieces):
-                new_pocket.pieces[p] = 0
-            elif not (p in self.pieces):
-                new_pocket.pieces[p] = other.pieces[p]
-            else:
-                new_pocket.pieces[p] = other.pieces[p] - self.pieces[p]
+        new_pocket = object.__new__(BughousePocket)
+        new_pocket._counts = [o - s for o, s in zip(other._counts, self._counts)]
+        new_pocket._key = other._key - self._key
         return new_pocket
 
     def same_as(self, string: str):
@@ -987,48 +1087,193 @@ class BughousePocket:
         :param string: the string representation of a pocket to check against
         :raise ValueError: if a letter in string is not a valid letter or is a king
         """
-        pieces_c = copy.copy(self.pieces)
+        pieces_c = self._counts.copy()
         for l in string:
-            if l not in self.PIECE_LETTERS_NUM:
+            if l not in self.PIECE_LETTERS_NUM or self.PIECE_LETTERS_NUM[l] == chess.KING:
                 raise ValueError("{0} is not a valid piece type letter representation".format(l))
-            elif l not in pieces_c or pieces_c[l] == 0:
+            pt = self.PIECE_LETTERS_NUM[l]
+            if pieces_c[pt] == 0:
                 # incorrect amount of piece type l
                 return False
-            else: 
-                pieces_c[l] -= 1
-        if len(pieces_c) == 0:
-            return True 
-        return False
+            pieces_c[pt] -= 1
+        return not any(pieces_c)
 
 
-class _BughouseBaseBoardState(Generic[BughouseBaseBoardT], chess._BoardState[BughouseBaseBoardT]):
-    """ I believe everything in here is correct, but, I 
-    might be missing something that we should be doing.
+# The part of the value of a captured piece that the capturing team gets back in the
+# static exchange evaluation of a bughouse board, since the piece goes to the pocket of
+# the partner (see BughouseBaseBoard.see())
+SEE_POCKET_SHARE = 0.5
 
-    TODO: We should really add a __hash__() function in order to check 
-    whether two states are the same. However, there are some issues with trying to
-    do this that would result in some massive refactoring. Firstly, the Python standard
-    requires that (and for good reason) only immutable objects implement __hash__(),
-    because otherwise, if it can be mutated, then something that was put in a hash
-    bucket could end up being in the wrong hashbucket if something mutates it in the future.
-    And as of right now, _BughouseBaseBoard is mutable because of 1) the pockets and 2)
-    the Bughouse BaseBoard it holds is also mutable. In fact, the only classes that implement the
-    __hash__() function in the original python-chess code are Move and Piece.
+
+# The seed for the bughouse Zobrist keys. The keys have to be the same in every
+# process (and every run) so that hashes can be compared between them.
+BUGHOUSE_ZOBRIST_SEED = 0x6275676875736521
+
+
+class BughouseZobristKeys:
+    """
+    The random 64 bit keys used to Zobrist hash a single bughouse base board.
+
+    Board A and board B use different keys, so the hash of a super board is
+    simply the xor of the hashes of its two base boards.
+
+    pieces[color][piece_type][square], promoted[square], castling[square]
+    (for the rook squares in castling_rights), ep[file] and turn (xored in
+    when it is white's turn) work like the polyglot keys. pockets[color][piece_type][count]
+    is the key of a pocket holding count pieces of piece_type; the key for a
+    count of 0 is always 0, so an empty pocket does not change the hash.
     """
 
+    def __init__(self, rng: random.Random) -> None:
+        self.pieces = [[[rng.getrandbits(64) for _ in chess.SQUARES] for _ in range(7)] for _ in chess.COLORS]
+        self.promoted = [rng.getrandbits(64) for _ in chess.SQUARES]
+        self.castling = [rng.getrandbits(64) for _ in chess.SQUARES]
+        self.ep = [rng.getrandbits(64) for _ in range(8)]
+        self.turn = rng.getrandbits(64)
+        self.pockets = [[[0] + [rng.getrandbits(64) for _ in range(BughousePocket.MAX_POS.get(pt, 0))]
+                         if pt else [] for pt in range(7)] for _ in chess.COLORS]
+
+
+_zobrist_rng = random.Random(BUGHOUSE_ZOBRIST_SEED)
+BUGHOUSE_ZOBRIST_KEYS = {
+    chess.A: BughouseZobristKeys(_zobrist_rng),
+    chess.B: BughouseZobristKeys(_zobrist_rng)
+}  # type: Dict[str, BughouseZobristKeys]
+del _zobrist_rng
+
+
+class BughouseEvalTables:
+    """
+    The weights of the evaluation terms that a BughouseBaseBoard keeps up to date
+    on every change of the board (see BughouseBaseBoard.eval_terms()).
+
+    values[piece_type] is the value of a piece, both on the board and in a pocket,
+    and tables[t][piece_type][square] is the t-th piece-square table (None for the
+    piece types it does not score).
+
+    The terms are a flat list, with the material on the board of color at
+    material_index[color], the sum of tables[t] over the pieces of color at
+    table_index[t][color] and the material in the pocket of color at
+    pocket_index[color].
+    """
+
+    def __init__(self, values: List[int], tables: List[List[Optional[List[int]]]]) -> None:
+        self.values = list(values)
+        self.tables = [[list(table) if table else None for table in pst] for pst in tables]
+        self.material_index = [chess.BLACK, chess.WHITE]
+        self.table_index = [[2 + 2 * t + chess.BLACK, 2 + 2 * t + chess.WHITE] for t in range(len(tables))]
+        self.pocket_index = [2 + 2 * len(tables) + chess.BLACK, 2 + 2 * len(tables) + chess.WHITE]
+        self.size = 4 + 2 * len(tables)
+        # piece_terms[color][piece_type][square]: the (index, weight) pairs a piece adds to the terms
+        self.piece_terms = [[[self._piece_terms(color, piece_type, square) for square in chess.SQUARES]
+                             if piece_type else [] for piece_type in range(7)]
+                            for color in (chess.BLACK, chess.WHITE)]
+
+    def _piece_terms(self, color: chess.Color, piece_type: chess.PieceType, square: chess.Square) \
+            -> Tuple[Tuple[int, int], ...]:
+        terms = [(self.material_index[color], self.values[piece_type])]
+        for t, pst in enumerate(self.tables):
+            if pst[piece_type] and pst[piece_type][square]:
+                terms.append((self.table_index[t][color], pst[piece_type][square]))
+        return tuple(terms)
+
+    def compute(self, board: "BughouseBaseBoard") -> List[int]:
+        """
+        Computes the terms of board from scratch
+        """
+        terms = [0] * self.size
+        for color in chess.COLORS:
+            occupied = board.occupied_co[color]
+            piece_terms = self.piece_terms[color]
+            for piece_type, bb in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                                   (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                                   (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+                for square in chess.scan_forward(bb & occupied):
+                    for index, weight in piece_terms[piece_type][square]:
+                        terms[index] += weight
+            terms[self.pocket_index[color]] = board.pockets[color].material(self.values)
+        return terms
+
+
+class _BughouseBaseBoardState(Generic[BughouseBaseBoardT]):
+    """
+    The undo record that BughouseBaseBoard.push() puts on the stack.
+
+    This holds the same bitboards and counters as chess._BoardState, but nothing
+    that has to be copied: a push changes at most one piece in this board's pockets
+    (a drop) and appends at most one entry to pushed_pieces, so instead of copies of
+    the pockets and pushed_pieces we only remember the dropped piece type and how
+    long pushed_pieces was. This keeps push()/pop() O(1) no matter how long the game is.
+
+    The pieces that a capture sends to the partner's pocket live on the other board,
+    and are taken back by BughouseSuperBoard.pop() (see BughouseBaseBoard.pop()).
+    """
+
+    __slots__ = ("pawns", "knights", "bishops", "rooks", "queens", "kings",
+                 "occupied_w", "occupied_b", "occupied", "promoted",
+                 "turn", "castling_rights", "ep_square", "halfmove_clock", "fullmove_number",
+                 "drop", "pushed_count", "zobrist", "eval_terms")
+
     def __init__(self, board: BughouseBaseBoardT) -> None:
-        super().__init__(board)
-        self.pockets_w = board.pockets[chess.WHITE].copy()
-        self.pockets_b = board.pockets[chess.BLACK].copy()
-        self.pushed_pieces = board.pushed_pieces.copy()
+        self.pawns = board.pawns
+        self.knights = board.knights
+        self.bishops = board.bishops
+        self.rooks = board.rooks
+        self.queens = board.queens
+        self.kings = board.kings
+
+        self.occupied_w = board.occupied_co[chess.WHITE]
+        self.occupied_b = board.occupied_co[chess.BLACK]
+        self.occupied = board.occupied
+
+        self.promoted = board.promoted
+
+        self.turn = board.turn
+        self.castling_rights = board.castling_rights
+        self.ep_square = board.ep_square
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_number = board.fullmove_number
+
+        # the piece type taken out of the pocket of the side to move; set by push()
+        self.drop = None  # type: Optional[chess.PieceType]
+        self.pushed_count = len(board.pushed_pieces)
+        self.zobrist = board._zobrist
+        # a snapshot of the terms; restore() copies it back into the board's own list
+        self.eval_terms = tuple(board._eval_terms) if board._eval_terms is not None else None
 
     def restore(self, board: BughouseBaseBoardT) -> None:
-        # if len(board.pockets[chess.BLACK]) > 1:
-        #     breakpoint()
-        super().restore(board)
-        board.pockets[chess.WHITE] = self.pockets_w.copy()
-        board.pockets[chess.BLACK] = self.pockets_b.copy()
-        board.pushed_pieces = self.pushed_pieces.copy()
+        board.pawns = self.pawns
+        board.knights = self.knights
+        board.bishops = self.bishops
+        board.rooks = self.rooks
+        board.queens = self.queens
+        board.kings = self.kings
+
+        board.occupied_co[chess.WHITE] = self.occupied_w
+        board.occupied_co[chess.BLACK] = self.occupied_b
+        board.occupied = self.occupied
+
+        board.promoted = self.promoted
+
+        board.turn = self.turn
+        board.castling_rights = self.castling_rights
+        board.ep_square = self.ep_square
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+
+        if self.drop:
+            # the hash is restored below, so this goes around add_to_pocket()
+            board.pockets[self.turn].add(self.drop)
+        del board.pushed_pieces[self.pushed_count:]
+        board._zobrist = self.zobrist
+        if self.eval_terms is None:
+            board._eval_terms = None
+        elif board._eval_terms is None:
+            board._eval_terms = list(self.eval_terms)
+        else:
+            # the states are shared by copies of the board (see copy()), so their terms are
+            # copied back instead of handing the board a list they could both change
+            board._eval_terms[:] = self.eval_terms
 
 
 class BughouseBaseBoard(chess.Board):
@@ -1048,6 +1293,12 @@ class BughouseBaseBoard(chess.Board):
     tbz_magic = None
     one_king = True
 
+    # the weights of the incrementally updated evaluation terms (see eval_terms() and
+    # set_eval_tables()); boards without tables don't keep terms
+    eval_tables = None  # type: Optional[BughouseEvalTables]
+    # recompute the terms on every eval_terms() and raise if the incremental ones differ
+    check_eval_terms = False
+
     # TODO:
     # Need to fix reset() to include changes to turns
     #   and do something with castling rights
@@ -1060,8 +1311,16 @@ class BughouseBaseBoard(chess.Board):
     # the other board's pockets are not directly accessible, but can be pushed to
     def __init__(self, board_id: str, fen: Optional[str] = starting_fen, chess960: bool = False) -> None:
         self.pockets = [BughousePocket(), BughousePocket()]
-        super().__init__(fen, chess960=chess960)
         self.board_id = board_id
+        # the zobrist hash is kept up to date on every change of the board (see zobrist_hash());
+        # copy() creates boards without an id and then sets the id and the keys itself
+        self._zobrist_keys = BUGHOUSE_ZOBRIST_KEYS.get(board_id, BUGHOUSE_ZOBRIST_KEYS[chess.A])
+        self._zobrist = 0
+        self._eval_terms = None  # type: Optional[List[int]]
+        # the legal drop squares of the last position they were asked for (see legal_drop_squares_mask())
+        self._drop_squares_key = None  # type: Optional[int]
+        self._drop_squares = chess.BB_EMPTY
+        super().__init__(fen, chess960=chess960)
         self.opposite_board_id = chess.opposite_bughouse_board_id(board_id)
         self.pushed_pieces = list()
         # Required, immediately call set_super_board
@@ -1072,10 +1331,12 @@ class BughouseBaseBoard(chess.Board):
     def reset_board(self) -> None:
         super().reset_board()
         self._reset_pockets()
+        self._reset_zobrist()
 
     def clear_board(self) -> None:
         super().clear_board()
         self._reset_pockets()
+        self._reset_zobrist()
         # TODO: something with clear_stack
 
     def _reset_pockets(self) -> None:
@@ -1086,11 +1347,25 @@ class BughouseBaseBoard(chess.Board):
         return _BughouseBaseBoardState(self)
 
     def push(self, move: chess.Move, pocket_pushing: bool=False) -> None:
+        castling_rights = self.castling_rights
+        ep_square = self.ep_square
         super().push(move, pocket_pushing)
         if move.drop:
-            self.pockets[not self.turn].remove(move.drop)  # so, this needs to stay as 'not self.turn' because
+            self._stack[-1].drop = move.drop
+            self.rm_from_pocket(move.drop, not self.turn)  # so, this needs to stay as 'not self.turn' because
             # super().push(move) switches the turn before returning
 
+        # the pieces were hashed by _set_piece_at/_remove_piece_at, the rest is hashed here
+        keys = self._zobrist_keys
+        zobrist = self._zobrist ^ keys.turn
+        if ep_square is not None:
+            zobrist ^= keys.ep[ep_square & 7]
+        if self.ep_square is not None:
+            zobrist ^= keys.ep[self.ep_square & 7]
+        for square in chess.scan_forward(castling_rights ^ self.castling_rights):
+            zobrist ^= keys.castling[square]
+        self._zobrist = zobrist
+
     def pop(self, pocket_popping: bool=False) -> None:
         if pocket_popping:
             pc = self.pushed_pieces.pop()
@@ -1124,7 +1399,13 @@ class BughouseBaseBoard(chess.Board):
         """
         Adds piece_type to color's pocket
         """
-        self.pockets[color].add(piece_type)
+        pocket = self.pockets[color]
+        count = pocket.count(piece_type)
+        pocket.add(piece_type)
+        pocket_keys = self._zobrist_keys.pockets[color][piece_type]
+        self._zobrist ^= pocket_keys[count] ^ pocket_keys[count + 1]
+        if self._eval_terms is not None:
+            self._eval_terms[self.eval_tables.pocket_index[color]] += self.eval_tables.values[piece_type]
 
     def rm_from_pocket(self, piece_type: chess.PieceType, color: chess.Color) -> None:
         """
@@ -1132,7 +1413,39 @@ class BughouseBaseBoard(chess.Board):
         no pieces of piece_typeconnected_kings = {bool} False in color's pocket, throws a
         value error
         """
-        self.pockets[color].remove(piece_type)
+        pocket = self.pockets[color]
+        count = pocket.count(piece_type)
+        pocket.remove(piece_type)
+        pocket_keys = self._zobrist_keys.pockets[color][piece_type]
+        self._zobrist ^= pocket_keys[count] ^ pocket_keys[count - 1]
+        if self._eval_terms is not None:
+            self._eval_terms[self.eval_tables.pocket_index[color]] -= self.eval_tables.values[piece_type]
+
+    def _remove_piece_at(self, square: chess.Square) -> Optional[chess.PieceType]:
+        mask = chess.BB_SQUARES[square]
+        color = bool(self.occupied_co[chess.WHITE] & mask)
+        promoted = self.promoted & mask
+        piece_type = super()._remove_piece_at(square)
+        if piece_type:
+            self._zobrist ^= self._zobrist_keys.pieces[color][piece_type][square]
+            if promoted:
+                self._zobrist ^= self._zobrist_keys.promoted[square]
+            terms = self._eval_terms
+            if terms is not None:
+                for index, weight in self.eval_tables.piece_terms[color][piece_type][square]:
+                    terms[index] -= weight
+        return piece_type
+
+    def _set_piece_at(self, square: chess.Square, piece_type: chess.PieceType, color: chess.Color, promoted: bool = False) -> None:
+        super()._set_piece_at(square, piece_type, color, promoted)  # hashes the removal of the old piece
+        if piece_type in chess.PIECE_TYPES:
+            self._zobrist ^= self._zobrist_keys.pieces[color][piece_type][square]
+            if promoted:
+                self._zobrist ^= self._zobrist_keys.promoted[square]
+            terms = self._eval_terms
+            if terms is not None:
+                for index, weight in self.eval_tables.piece_terms[color][piece_type][square]:
+                    terms[index] += weight
 
     def get_pocket(self, color: chess.Color):
         """
@@ -1148,6 +1461,7 @@ class BughouseBaseBoard(chess.Board):
         This sets the dict representing the pocket for color to pocket.
         """
         self.pockets[color] = pocket
+        self._reset_zobrist()
 
     def can_claim_fifty_moves(self) -> bool:
         return False
@@ -1161,9 +1475,112 @@ class BughouseBaseBoard(chess.Board):
     def _transposition_key(self) -> Hashable:
         return (super()._transposition_key(),
                 self.promoted,
-                str(self.pockets[chess.WHITE]), str(self.pockets[chess.BLACK]))
+                self.pockets[chess.WHITE].key(), self.pockets[chess.BLACK].key())
+
+    def zobrist_hash(self) -> int:
+        """
+        Returns a 64 bit Zobrist hash of this board: the pieces, promoted pieces,
+        both pockets, the side to move, castling rights and the en passant square.
+
+        Unlike _transposition_key() the hash also depends on which board this is
+        (see BughouseZobristKeys).
+
+        The hash is updated incrementally by push(), add_to_pocket(), rm_from_pocket()
+        and friends, and restored by pop(), so this is O(1). Changing a pocket directly
+        (e.g. get_pocket(color).add(piece_type)) bypasses this; use add_to_pocket() and
+        rm_from_pocket() instead.
+        """
+        return self._zobrist
+
+    def _reset_zobrist(self) -> None:
+        self._zobrist = self._compute_zobrist_hash()
+        self._drop_squares_key = None
+        self._reset_eval_terms()
+
+    def eval_terms(self) -> Optional[List[int]]:
+        """
+        Returns the evaluation terms of this board (see BughouseEvalTables), or None
+        if no eval_tables are set.
+
+        Like the zobrist hash, the terms are updated incrementally by push(),
+        add_to_pocket(), rm_from_pocket() and friends, and restored by pop(), so
+        reading them is O(1). With check_eval_terms set they are compared to the
+        terms computed from scratch, and a ValueError is raised if they differ.
+
+        The returned list is the board's own and must not be changed.
+        """
+        if self.check_eval_terms and self._eval_terms is not None:
+            terms = self.eval_tables.compute(self)
+            if terms != self._eval_terms:
+                raise ValueError("incremental eval terms {} differ from the recomputed {} in {}".format(
+                    self._eval_terms, terms, self.fen()))
+        return self._eval_terms
+
+    @classmethod
+    def set_eval_tables(cls, tables: BughouseEvalTables) -> None:
+        """
+        Sets the tables of the evaluation terms that the boards of this class keep up to
+        date from then on (see eval_terms()). Until they are set, boards keep no terms,
+        which makes push() and pop() a little cheaper. Boards set up before pick up the
+        terms when they are copied (or set up again with set_fen(), reset(), ...).
+
+        :raises: :exc:`ValueError` if other tables are set already: the boards that keep
+            terms go on updating them with the tables of their class
+        """
+        if cls.eval_tables is not None and cls.eval_tables is not tables:
+            raise ValueError("{} already keeps the terms of other eval tables".format(cls.__name__))
+        cls.eval_tables = tables
+
+    def _reset_eval_terms(self) -> None:
+        if self.eval_tables is None:
+            self._eval_terms = None
+        else:
+            self._eval_terms = self.eval_tables.compute(self)
+
+    def _compute_zobrist_hash(self) -> int:
+        """
+        Computes the zobrist hash from scratch
+        """
+        keys = self._zobrist_keys
+        zobrist = 0
+        for color in chess.COLORS:
+            occupied = self.occupied_co[color]
+            piece_keys = keys.pieces[color]
+            for piece_type, bb in ((chess.PAWN, self.pawns), (chess.KNIGHT, self.knights),
+                                   (chess.BISHOP, self.bishops), (chess.ROOK, self.rooks),
+                                   (chess.QUEEN, self.queens), (chess.KING, self.kings)):
+                for square in chess.scan_forward(bb & occupied):
+                    zobrist ^= piece_keys[piece_type][square]
+            pocket_keys = keys.pockets[color]
+            for piece_type, count in self.pockets[color].pieces.items():
+                zobrist ^= pocket_keys[piece_type][count]
+        for square in chess.scan_forward(self.promoted):
+            zobrist ^= keys.promoted[square]
+        for square in chess.scan_forward(self.castling_rights):
+            zobrist ^= keys.castling[square]
+        if self.ep_square is not None:
+            zobrist ^= keys.ep[chess.square_file(self.ep_square)]
+        if self.turn == chess.WHITE:
+            zobrist ^= keys.turn
+        return zobrist
 
     def legal_drop_squares_mask(self) -> chess.Bitboard:
+        """
+        Returns the empty squares that a drop can go to without leaving the
+        king in check.
+
+        The mask is computed once per position: it is kept until the next
+        push(), pop() or other change of the hash (see zobrist_hash()), or of
+        the side to move.
+        """
+        # the hash includes the side to move, but not when turn is set directly
+        key = self._zobrist if self.turn else ~self._zobrist
+        if key != self._drop_squares_key:
+            self._drop_squares = self._legal_drop_squares_mask() & ~self.occupied & chess.BB_ALL
+            self._drop_squares_key = key
+        return self._drop_squares
+
+    def _legal_drop_squares_mask(self) -> chess.Bitboard:
         king = self.king(self.turn)
         if king is None:
             return ~self.occupied
@@ -1177,6 +1594,25 @@ class BughouseBaseBoard(chess.Board):
         else:
             return chess.BB_EMPTY
 
+    def checking_drop_squares(self) -> List[chess.Bitboard]:
+        """
+        Returns, by piece type, the squares that a piece of that type would
+        give check from if it were dropped there by the side to move (no
+        squares if the other side has no king).
+        """
+        king = self.king(not self.turn)
+        if king is None:
+            return [chess.BB_EMPTY] * (chess.KING + 1)
+        diagonal = chess.BB_DIAG_ATTACKS[king][chess.BB_DIAG_MASKS[king] & self.occupied]
+        straight = chess.BB_ROOK_ATTACKS[king][chess.BB_ROOK_MASKS[king] & self.occupied]
+        return [chess.BB_EMPTY,
+                chess.BB_PAWN_ATTACKS[not self.turn][king] & ~chess.BB_BACKRANKS,
+                chess.BB_KNIGHT_ATTACKS[king],
+                diagonal,
+                straight,
+                diagonal | straight,
+                chess.BB_EMPTY]
+
     def legal_drop_squares(self) -> chess.SquareSet:
         return chess.SquareSet(self.legal_drop_squares_mask())
 
@@ -1198,20 +1634,81 @@ class BughouseBaseBoard(chess.Board):
             return super().is_legal(move)
 
     def generate_pseudo_legal_drops(self, to_mask: chess.Bitboard = chess.BB_ALL) -> Iterator[chess.Move]:
-        for to_square in chess.scan_forward(to_mask & ~self.occupied):
-            for pt, count in self.pockets[self.turn].pieces.items():
-                if count and (pt != chess.PAWN or not chess.BB_BACKRANKS & chess.BB_SQUARES[to_square]):
-                    yield chess.Move(to_square, to_square, drop=pt)
+        targets = to_mask & ~self.occupied
+        pocket = self.pockets[self.turn]
+        for pt in DROP_PIECE_TYPES:
+            if pocket.count(pt):
+                drops = DROP_MOVES[pt]
+                for to_square in chess.scan_forward(targets & ~chess.BB_BACKRANKS if pt == chess.PAWN else targets):
+                    yield drops[to_square]
 
     def generate_legal_drops(self, to_mask: chess.Bitboard = chess.BB_ALL) -> Iterator[chess.Move]:
         return self.generate_pseudo_legal_drops(to_mask=self.legal_drop_squares_mask() & to_mask)
 
+    def legal_drops_into(self, buffer: List[chess.Move], to_mask: chess.Bitboard = chess.BB_ALL,
+                         checks: bool = False) -> List[chess.Move]:
+        """
+        Appends the legal drops to *buffer* (piece type by piece type, each
+        over the whole target bitboard) and returns it.
+
+        :param checks: only the drops that give check (see checking_drop_squares())
+        """
+        targets = self.legal_drop_squares_mask() & to_mask
+        if not targets:
+            return buffer
+        pocket = self.pockets[self.turn]
+        checking_squares = self.checking_drop_squares() if checks else None
+        append = buffer.append
+        for pt in DROP_PIECE_TYPES:
+            if pocket.count(pt):
+                drops = DROP_MOVES[pt]
+                bb = targets & ~chess.BB_BACKRANKS if pt == chess.PAWN else targets
+                if checks:
+                    bb &= checking_squares[pt]
+                # scan_forward(), inlined
+                while bb:
+                    r = bb & -bb
+                    append(drops[r.bit_length() - 1])
+                    bb ^= r
+        return buffer
+
+    def generate_legal_checking_drops(self) -> Iterator[chess.Move]:
+        """
+        Generates the legal drops that give check.
+        """
+        return iter(self.legal_drops_into([], checks=True))
+
+    def see(self, move: chess.Move, values: Optional[List[float]] = None,
+            pocket_share: float = SEE_POCKET_SHARE) -> float:
+        """
+        Static exchange evaluation (see chess.Board.see()) for bughouse: every
+        captured piece also goes to the pocket of the partner of the side that
+        captured it (a promoted piece as a pawn), which is worth pocket_share of
+        its value to that side. Drops to recapture are not taken into account.
+
+        :param values: the piece values by piece type, default chess.PIECE_VALUES
+        :param pocket_share: the part of the value of a captured piece that its
+            capturer gets back in the partner's pocket
+        """
+        values = values or chess.PIECE_VALUES
+        pocket_values = [value * pocket_share for value in values] if pocket_share else None
+        return self._see(move, values, pocket_values)
+
     def generate_legal_moves(self, from_mask: chess.Bitboard = chess.BB_ALL, to_mask: chess.Bitboard = chess.BB_ALL) -> \
     Iterator[chess.Move]:
         return itertools.chain(
             super().generate_legal_moves(from_mask, to_mask),
             self.generate_legal_drops(from_mask & to_mask))
 
+    def legal_moves_into(self, buffer: List[chess.Move], from_mask: chess.Bitboard = chess.BB_ALL,
+                         to_mask: chess.Bitboard = chess.BB_ALL) -> List[chess.Move]:
+        """
+        Like :func:`~chess.Board.legal_moves_into()`, followed by the legal
+        drops (see :func:`legal_drops_into()`).
+        """
+        super().legal_moves_into(buffer, from_mask, to_mask)
+        return self.legal_drops_into(buffer, from_mask & to_mask)
+
     def parse_san(self, san: str) -> chess.Move:
         if "@" in san:
             uci = san.rstrip("+# ")
@@ -1257,6 +1754,7 @@ class BughouseBaseBoard(chess.Board):
         super().set_fen(position_part + " " + info_part)
         self.pockets[chess.WHITE] = white_pocket
         self.pockets[chess.BLACK] = black_pocket
+        self._reset_zobrist()
 
     def board_fen(self, *, promoted: Optional[bool] = None) -> str:
         if promoted is None:
@@ -1279,6 +1777,12 @@ class BughouseBaseBoard(chess.Board):
         board.pushed_pieces = self.pushed_pieces.copy()
         board.board_id = self.board_id
         board.opposite_board_id = self.opposite_board_id
+        board._zobrist_keys = self._zobrist_keys
+        board._zobrist = self._zobrist
+        if self._eval_terms is not None:
+            board._eval_terms = list(self._eval_terms)
+        else:
+            board._reset_eval_terms()
         # Immediately use set_super_board()
         return board
 
@@ -1387,44 +1891,26 @@ class BughouseBaseBoard(chess.Board):
 
     def is_repetition(self, count=3) -> bool:
         """
-        Tries to fix the issue with the existing is_repetition function.
+        Checks if the current position has repeated 3 (or a given number of)
+        times.
 
-        Specifically, the existing is_repetition function uses 'switchyard' to 
-        keep track of the moves that they 
+        Every state on the stack remembers the zobrist hash of the position it was
+        pushed from, so, unlike chess.Board.is_repetition(), this does not need to
+        pop and push moves (which would also move pieces in and out of the
+        pockets of the other board); it only compares hashes.
         """
-        # Fast check, based on occupancy only.
-        maybe_repetitions = 1
+        if count <= 1:
+            return True
+        zobrist = self._zobrist
+        castling_rights = self.castling_rights
         for state in reversed(self._stack):
-            if state.occupied == self.occupied:
-                maybe_repetitions += 1
-                if maybe_repetitions >= count:
-                    break
-        if maybe_repetitions < count:
-            return False
-
-        # Check full replay.
-        transposition_key = self._transposition_key()
-
-        # try:
-        peek_idx = -1 # the index of the move we are peeking
-        while True:
-            if count <= 1:
-                return True
-
-            if len(self.move_stack) < count - 1:
+            # castling rights can't come back, so neither can any earlier position
+            if state.castling_rights != castling_rights:
                 break
-
-            move = self.move_stack[peek_idx]
-            peek_idx -= 1
-
-            if self.is_irreversible(move):
-                break
-
-            if self._transposition_key() == transposition_key:
+            if state.zobrist == zobrist:
                 count -= 1
-        # except:
-
-
+                if count <= 1:
+                    return True
         return False
 
 
@@ -1760,6 +2246,12 @@ class BughouseSuperBoard(chess.Board):
         return (self.boardA._transposition_key(),
                 self.boardB._transposition_key())
 
+    def zobrist_hash(self) -> int:
+        """
+        Returns a 64 bit Zobrist hash of both boards, including all four pockets.
+        """
+        return self.boardA.zobrist_hash() ^ self.boardB.zobrist_hash()
+
     def legal_drop_squares_mask(self, target: str) -> chess.Bitboard:
         if target == self.BOARD_A:
             return self.boardA.legal_drop_squares_mask()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the popcount implementations on bitboards taken from real positions.
+"""
+
+from pychess import chess
+from pychess.chess import variant
+import argparse
+import platform
+import random
+import timeit
+
+
+def sample_bitboards(count, seed):
+    rng = random.Random(seed)
+    board = variant.BughouseBaseBoard("A")
+    bitboards = []
+
+    while len(bitboards) < count:
+        moves = list(board.legal_moves)
+        if not moves or len(board.move_stack) > 120:
+            board.reset()
+            continue
+        board.push(rng.choice(moves))
+
+        bitboards.append(board.occupied)
+        for color in chess.COLORS:
+            bitboards.append(board.occupied_co[color])
+            bitboards.append(board.pieces_mask(chess.PAWN, color))
+            bitboards.append(board.attacks_mask(board.king(color)))
+
+    return bitboards[:count]
+
+
+def main(count, repeat, seed):
+    implementations = [
+        ("bin().count", chess._old_popcount),
+        ("nibble loop", chess._nibble_popcount),
+        ("bin() fallback", chess._bin_popcount),
+    ]
+    if hasattr(int, "bit_count"):
+        implementations.append(("int.bit_count", int.bit_count))
+
+    bitboards = sample_bitboards(count, seed)
+    expected = [bin(bb).count("1") for bb in bitboards]
+
+    print("Python", platform.python_version(), platform.python_implementation())
+    print("popcount is", getattr(chess.popcount, "__qualname__", chess.popcount))
+
+    baseline = None
+    for name, f in implementations:
+        if [f(bb) for bb in bitboards] != expected:
+            raise ValueError("{} gave a wrong result".format(name))
+
+        best = min(timeit.repeat(lambda: [f(bb) for bb in bitboards], number=1, repeat=repeat))
+        ns = best * 1e9 / count
+        if baseline is None:
+            baseline = ns
+        print("%-14s %8.1f ns/call %6.2fx" % (name, ns, baseline / ns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--count", type=int, default=100000,
+        help="Number of bitboards. Defaults to 100000")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+        help="Timing repetitions, the best is reported. Defaults to 5")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    main(args.count, args.repeat, args.seed)
@@ -2,10 +2,15 @@ import pychess
 from pychess import chess as chess
 from pychess.chess import variant as variant
 from pychess.chess import ai as ai 
+from pychess.chess import runner as runner
 from pychess.chess.ai import CommChannel as CommChannel
 
+import pytest
 import unittest
 import logging
+import time
+import io
+import contextlib
 
 def test1():
     board = variant.BughouseBaseBoard('A', "rnbqkbnr/pppppppp/8/8/8/7N/PPPPPPPP/RNBQKB1R[] b KQkq - 0 2")
@@ -234,6 +239,935 @@ def test8():
     print("{} pockets {}".format('B', super_board.get_base_board('B').pockets))
 
 
+def test_zobrist_hash():
+    """
+    The hash has to come back after a push/pop (including the pocket the
+    captured piece went to), and transpositions have to hash the same
+    """
+    super_board = variant.BughouseSuperBoard()
+    start = super_board.zobrist_hash()
+    moves = [("e2e4", 'A'), ("d7d5", 'A'), ("e4d5", 'A'), ("g1f3", 'B')]
+    hashes = [start]
+    for (mv, b) in moves:
+        super_board.push(chess.Move.from_uci(mv), b)
+        hashes.append(super_board.zobrist_hash())
+    assert len(set(hashes)) == len(hashes)
+    # the captured pawn is in black's pocket on board B now
+    assert super_board.get_base_board('B').get_pocket(chess.BLACK).count(chess.PAWN) == 1
+    for h in reversed(hashes[:-1]):
+        super_board.pop()
+        assert super_board.zobrist_hash() == h
+    assert super_board.zobrist_hash() == start
+
+    # the same moves in another order reach the same position
+    other = variant.BughouseSuperBoard()
+    for (mv, b) in [("g1f3", 'B'), ("e2e4", 'A'), ("d7d5", 'A'), ("e4d5", 'A')]:
+        other.push(chess.Move.from_uci(mv), b)
+    assert other.zobrist_hash() == hashes[-1]
+
+
+def test_zobrist_hash_incremental():
+    """
+    The incrementally updated hash has to match the hash computed from scratch,
+    also through drops, pocket pushes and pops
+    """
+    super_board = variant.BughouseSuperBoard()
+    moves = [("e2e4", 'A'), ("d7d5", 'A'), ("e4d5", 'A'), ("d8d5", 'A'),
+             ("P@e4", 'B'), ("b1c3", 'A'), ("d5a2", 'A'), ("P@d5", 'B')]
+    for (mv, b) in moves:
+        super_board.push(chess.Move.from_uci(mv), b)
+        for board in (super_board.boardA, super_board.boardB):
+            assert board.zobrist_hash() == board._compute_zobrist_hash()
+    super_board.push_to_pocket(chess.QUEEN, 'A', chess.WHITE)
+    assert super_board.boardA.zobrist_hash() == super_board.boardA._compute_zobrist_hash()
+    super_board.rm_from_pocket(chess.QUEEN, 'A', chess.WHITE)
+    copied = super_board.copy()
+    assert copied.zobrist_hash() == super_board.zobrist_hash()
+    while super_board.board_push_pop_stack:
+        super_board.pop()
+        for board in (super_board.boardA, super_board.boardB):
+            assert board.zobrist_hash() == board._compute_zobrist_hash()
+    assert super_board.zobrist_hash() == variant.BughouseSuperBoard().zobrist_hash()
+
+
+def test_push_pop_pockets():
+    super_board = variant.BughouseSuperBoard()
+    for (mv, b) in [("e2e4", 'A'), ("d7d5", 'A'), ("e4d5", 'A')]:
+        super_board.push(chess.Move.from_uci(mv), b)
+    assert super_board.boardB.get_pocket(chess.BLACK).count(chess.PAWN) == 1
+    assert super_board.boardA.pushed_pieces == [None, None, chess.PAWN]
+    super_board.push(chess.Move.from_uci("g1f3"), 'B')
+    fen = super_board.boardB.fen()
+    super_board.push(chess.Move.from_uci("P@e5"), 'B')
+    assert super_board.boardB.get_pocket(chess.BLACK).count(chess.PAWN) == 0
+    super_board.pop()
+    assert super_board.boardB.get_pocket(chess.BLACK).count(chess.PAWN) == 1
+    assert super_board.boardB.fen() == fen
+    super_board.pop()
+    super_board.pop()
+    assert super_board.boardB.get_pocket(chess.BLACK).count(chess.PAWN) == 0
+    assert super_board.boardA.pushed_pieces == [None, None]
+
+
+def test_pocket():
+    pocket = variant.BughousePocket("qnpp")
+    assert pocket.count(chess.PAWN) == 2 and pocket.count(chess.KING) == 0
+    assert len(pocket) == 4 and str(pocket) == "qnpp"
+    assert pocket.pieces == {chess.PAWN: 2, chess.KNIGHT: 1, chess.BISHOP: 0, chess.ROOK: 0, chess.QUEEN: 1}
+    assert pocket.same_as("pqpn") and not pocket.same_as("qnp")
+    assert pocket.material([0, 1, 3, 3, 5, 9, 0]) == 14
+
+    snapshot = pocket.copy()
+    pocket.remove(chess.PAWN)
+    assert snapshot.count(chess.PAWN) == 2
+    assert pocket.key() != snapshot.key()
+    pocket.add(chess.PAWN)
+    assert pocket.key() == snapshot.key()
+    assert variant.BughousePocket.from_key(pocket.key()).pieces == pocket.pieces
+
+    diff = variant.BughousePocket("p").diff(pocket)
+    assert diff.pieces == {chess.PAWN: 1, chess.KNIGHT: 1, chess.BISHOP: 0, chess.ROOK: 0, chess.QUEEN: 1}
+
+    for symbols, removed in [("", chess.ROOK), ("qqqq", chess.KING)]:
+        try:
+            pocket = variant.BughousePocket(symbols)
+            pocket.add(chess.QUEEN)
+            pocket.remove(removed)
+        except ValueError:
+            pass
+        else:
+            assert False, "expected a ValueError"
+
+
+def test_repetition():
+    super_board = variant.BughouseSuperBoard()
+    for i in range(4):
+        assert not super_board.is_fivefold_repetition()
+        for mv in ["g1f3", "g8f6", "f3g1", "f6g8"]:
+            super_board.push(chess.Move.from_uci(mv), 'A')
+        assert super_board.boardA.is_repetition(3) == (i >= 1)
+    assert super_board.is_fivefold_repetition()
+
+
+def test_transposition_table():
+    table = ai.TranspositionTable(4, "depth")
+    table.store(5, 3, ai.TranspositionTable.EXACT, 1.0, chess.Move.from_uci("e2e4"))
+    # same slot, shallower search: kept
+    table.store(9, 1, ai.TranspositionTable.LOWER, 2.0, None)
+    assert table.probe(9) is None
+    assert table.probe(5).score == 1.0
+    # a new search may replace it
+    table.new_search()
+    table.store(9, 1, ai.TranspositionTable.LOWER, 2.0, None)
+    assert table.probe(5) is None
+    assert table.probe(9).flag == ai.TranspositionTable.LOWER
+
+    always = ai.TranspositionTable(4, "always")
+    always.store(5, 3, ai.TranspositionTable.EXACT, 1.0, None)
+    always.store(9, 1, ai.TranspositionTable.EXACT, 2.0, None)
+    assert always.probe(9).score == 2.0 and len(always) == 1
+
+
+def test_transposition_table_search():
+    """
+    A fixed depth search has to find the same value with and without the table
+    """
+    super_board = variant.BughouseSuperBoard()
+    for mv in ["e2e4", "d7d5", "e4d5", "g8f6"]:
+        super_board.push(chess.Move.from_uci(mv), 'A')
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    results = []
+    for tt_size in [0, 2 ** 12]:
+        whiteA = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=4,
+                                iter_deep=False, tt_size=tt_size)
+        whiteA.tt_horizon = 4
+        val, _ = whiteA.minimax(super_board.copy(), 'A', 0, lambda b, d: d >= 4, forbidden_moves=[])
+        results.append((val, whiteA.statistics.get_states_evaluated()))
+    assert results[0][0] == results[1][0]
+    assert results[1][1] < results[0][1]
+
+
+def test_pvs_search():
+    """
+    Principal variation search (also with an aspiration window that fails) has to find the
+    same value as minimax/maximin, for white and for black to move
+    """
+    super_board = variant.BughouseSuperBoard()
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    for mv in ["e2e4", "d7d5", "e4d5", "g8f6", "f1b5"]:
+        super_board.push(chess.Move.from_uci(mv), 'A')
+        color = super_board.boardA.turn
+        agent = ai.PartneredAI("A", super_board, chess.A, color, eval_class, False, max_depth=3,
+                               iter_deep=False, tt_size=2 ** 12)
+        agent.tt_horizon = 3
+        search = agent.minimax if color == chess.WHITE else agent.maximin
+        val, _ = search(super_board.copy(), 'A', 0, lambda b, d: d >= 3, forbidden_moves=[])
+        pvs_agent = ai.PartneredAI("A", super_board, chess.A, color, eval_class, False, max_depth=3,
+                                   iter_deep=False, tt_size=2 ** 12, pvs=True)
+        pvs_agent.tt_horizon = 3
+        for guess in [None, val + 1000, val - 1000]:
+            pvs_val, _ = pvs_agent.pvs_root(super_board.copy(), lambda b, d: d >= 3, guess=guess)
+            assert pvs_val == val
+
+
+def test_minimax_is_negamax():
+    """
+    minimax() and maximin() are negamax() with the value from white's point of view, for
+    either side to move, and search the same states
+    """
+    super_board = variant.BughouseSuperBoard()
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    for mv in ["e2e4", "d7d5", "e4d5"]:
+        super_board.push(chess.Move.from_uci(mv), 'A')
+        color = super_board.boardA.turn
+        sign = 1 if color == chess.WHITE else -1
+        agent = ai.PartneredAI("A", super_board, chess.A, color, eval_class, False, max_depth=2,
+                               iter_deep=False)
+        val, move = agent.negamax(super_board.copy(), 'A', 0, lambda b, d: d >= 2)
+        states = agent.statistics.get_states_evaluated()
+        for search in [agent.minimax, agent.maximin]:
+            agent.statistics.iter_deep_reset()
+            assert search(super_board.copy(), 'A', 0, lambda b, d: d >= 2) == (sign * val, move)
+            assert agent.statistics.get_states_evaluated() == states
+
+
+def test_advise_partner_deadline():
+    """
+    The drop probes for the partner stop at the deadline of the move, with what they found so far
+    """
+    super_board = variant.BughouseSuperBoard()
+    for mv in ["e2e4", "d7d5"]:
+        super_board.push(chess.Move.from_uci(mv), 'A')
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    # the probes search from depth 2 to max_depth
+    agent = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, True, max_depth=4,
+                           iter_deep=False, tt_size=2 ** 10)
+    move = chess.Move.from_uci("e4d5")
+    agent.advise_partner(move, 0)
+    assert len(agent.tell_partner.get_please_protect()) == 5
+    agent.tell_partner = ai.CommChannel()
+    table = agent.transposition_table
+    agent.advise_partner(move, 0, deadline=time.time() - 1)
+    assert len(agent.tell_partner.get_please_protect()) < 5
+    assert agent.transposition_table is table
+    assert agent.hard_deadline is None
+
+
+def test_solitary_nxt_dep_func():
+    """
+    The solitary AI passes every move it searches to nxt_dep_func
+    """
+    moves = list()
+
+    def nxt_dep_func(self, depth, move):
+        moves.append(move)
+        return depth + 1
+    super_board = variant.BughouseSuperBoard()
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    agent = ai.SolitaryAI("solitary", super_board, True, chess.WHITE, chess.BLACK, eval_class, max_depth=1,
+                          iter_deep=False, nxt_dep_func=nxt_dep_func)
+    _, move = agent.minimax(super_board.copy(), 'A', 0, 0, lambda b, d: d >= 2)
+    assert move in moves and all(isinstance(mv, chess.Move) for mv in moves)
+
+
+def test_pvs_forbidden_moves():
+    """
+    Principal variation search must not choose a forbidden move, and has to find the same
+    value without it as maximin
+    """
+    super_board = variant.BughouseSuperBoard()
+    for mv in ["e2e4", "d7d5"]:
+        super_board.push(chess.Move.from_uci(mv), 'A')
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    forbidden = [chess.Move.from_uci("e4d5")]
+    agent = ai.PartneredAI("A", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=2,
+                           iter_deep=False)
+    val, move = agent.minimax(super_board.copy(), 'A', 0, lambda b, d: d >= 2, forbidden_moves=forbidden)
+    pvs_agent = ai.PartneredAI("A", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=2,
+                               iter_deep=False, pvs=True)
+    pvs_val, pvs_move = pvs_agent.pvs_root(super_board.copy(), lambda b, d: d >= 2, forbidden_moves=forbidden)
+    assert pvs_move not in forbidden
+    assert pvs_val == val
+
+
+def test_parallel_root_search():
+    """
+    The moves of the root searched on worker processes have to give the same value and
+    move as the sequential search
+    """
+    super_board = variant.BughouseSuperBoard()
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    for mv in ["e2e4", "d7d5", "e4d5"]:
+        super_board.push(chess.Move.from_uci(mv), 'A')
+        color = super_board.boardA.turn
+        agent = ai.PartneredAI("A", super_board, chess.A, color, eval_class, False, max_depth=3,
+                               iter_deep=False)
+        search = agent.minimax if color == chess.WHITE else agent.maximin
+        val, move = search(super_board.copy(), 'A', 0, lambda b, d: d >= 3, forbidden_moves=[])
+        parallel_agent = ai.PartneredAI("A", super_board, chess.A, color, eval_class, False, max_depth=3,
+                                        iter_deep=False, workers=2)
+        try:
+            assert parallel_agent.parallel_root_search(super_board.copy(), 3) == (val, move)
+        finally:
+            parallel_agent.close_pool()
+
+
+def test_root_search_task_stats():
+    """
+    Tasks of the same chunk share one unpickled worker agent; each task has to report only
+    the states it searched itself
+    """
+    import pickle
+    super_board = variant.BughouseSuperBoard()
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    agent = ai.PartneredAI("A", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=2,
+                           iter_deep=False)
+    worker = agent.worker_copy()
+    moves = [chess.Move.from_uci(uci) for uci in ["e2e4", "d2d4", "g1f3", "b1c3", "c2c4", "g2g3"]]
+    tasks = [(worker, super_board, mv, 2, 0) for mv in moves]
+    alone = [ai._search_root_move(pickle.loads(pickle.dumps(task))) for task in tasks]
+    chunk = [ai._search_root_move(task) for task in pickle.loads(pickle.dumps(tasks))]
+    assert [result[:4] for result in chunk] == [result[:4] for result in alone]
+    assert sum(result[1] for result in chunk) == sum(result[1] for result in alone)
+
+
+def test_root_search_task_eval_stats():
+    """
+    Like the states, the evaluations and evaluation cache hits and lookups of a task of a chunk
+    have to be its own
+    """
+    import pickle
+    super_board = variant.BughouseSuperBoard()
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    agent = ai.PartneredAI("A", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=3,
+                           iter_deep=False, eval_cache_size=2 ** 10)
+    worker = agent.worker_copy()
+    moves = [chess.Move.from_uci(uci) for uci in ["g1f3", "b1c3", "e2e4", "d2d4"]]
+    tasks = [(worker, super_board, mv, 3, 0) for mv in moves]
+    ai._worker_eval_caches.clear()
+    alone = [ai._search_root_move(pickle.loads(pickle.dumps(task))) for task in tasks]
+    ai._worker_eval_caches.clear()
+    chunk = [ai._search_root_move(task) for task in pickle.loads(pickle.dumps(tasks))]
+    ai._worker_eval_caches.clear()
+    assert [result[4:] for result in chunk] == [result[4:] for result in alone]
+    assert sum(result[5] for result in chunk) > 0
+
+
+def test_play_async():
+    """
+    Deterministic concurrent games have to be the same every time, and their record has to
+    replay to the same position. Without show_board, nothing is printed
+    """
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    records = list()
+    for show_board in [True, False]:
+        super_board = variant.BughouseSuperBoard()
+        players = [ai.PartneredAI(name, super_board, board_id, color, eval_class, True, max_depth=2)
+                   for (name, board_id, color) in [("whiteA", chess.A, chess.WHITE), ("whiteB", chess.B, chess.WHITE),
+                                                   ("blackA", chess.A, chess.BLACK), ("blackB", chess.B, chess.BLACK)]]
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            record = runner.Runner.play_async(super_board, players, max_moves=8, deterministic=True,
+                                              show_board=show_board)
+        assert bool(output.getvalue()) == show_board
+        assert len(record) == 8
+        assert [board_id for (board_id, _) in record] == [chess.A, chess.B] * 4
+        replayed = runner.Runner.replay(variant.BughouseSuperBoard(), record)
+        assert replayed.zobrist_hash() == super_board.zobrist_hash()
+        records.append(record)
+    assert records[0] == records[1]
+
+
+def test_play_async_agents():
+    """
+    Concurrent games can be played by solitary AIs, and an agent failing in its process fails the game
+    """
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    super_board = variant.BughouseSuperBoard()
+    first = ai.SolitaryAI("first", super_board, True, chess.WHITE, chess.BLACK, eval_class, max_depth=2)
+    second = ai.SolitaryAI("second", super_board, False, chess.BLACK, chess.WHITE, eval_class, max_depth=2)
+    players = [ai.SolitaryAIHandler("whiteA", first, chess.A, chess.WHITE),
+               ai.SolitaryAIHandler("whiteB", second, chess.B, chess.WHITE),
+               ai.SolitaryAIHandler("blackA", second, chess.A, chess.BLACK),
+               ai.SolitaryAIHandler("blackB", first, chess.B, chess.BLACK)]
+    record = runner.Runner.play_async(super_board, players, max_moves=8, deterministic=True, show_board=False)
+    assert len(record) == 8
+    replayed = runner.Runner.replay(variant.BughouseSuperBoard(), record, log_moves=False)
+    assert replayed.zobrist_hash() == super_board.zobrist_hash()
+
+    super_board = variant.BughouseSuperBoard()
+    players = [runner.PrescribedAgent(name, super_board, board_id, color, moves)
+               for (name, board_id, color, moves) in [("whiteA", chess.A, chess.WHITE, ["e2e4"]),
+                                                      ("whiteB", chess.B, chess.WHITE, ["d2d4"]),
+                                                      ("blackA", chess.A, chess.BLACK, ["e7e5"]),
+                                                      ("blackB", chess.B, chess.BLACK, ["d7d5"])]]
+    try:
+        # the agents run out of moves
+        runner.Runner.play_async(super_board, players, max_moves=8, deterministic=True, show_board=False)
+    except RuntimeError as error:
+        assert "IndexError" in str(error)
+    else:
+        assert False, "expected a RuntimeError"
+
+    players[0] = runner.HumanAgent("human", super_board, chess.A, chess.WHITE)
+    try:
+        runner.Runner.play_async(super_board, players, show_board=False)
+    except ValueError:
+        pass
+    else:
+        assert False, "expected a ValueError"
+
+
+def test_tournament():
+    """
+    The games of a tournament are played with their seeds (so they can be played again) and the
+    teams change sides every other game
+    """
+    matchups = [{"name": "material v random", "games": 2, "seed": 3, "max_moves": 20,
+                 "teams": [{"name": "material", "eval": "BasicMaterialEvaluationBughouseBase", "depth": 1},
+                           {"name": "random", "agent": "RandomAgent"}]}]
+    records = runner.Runner.tournament(matchups, processes=2)
+    assert [(r["game"], r["seed"]) for r in records] == [(0, 3), (1, 4)]
+    assert [r["whiteA_blackB"] for r in records] == ["material", "random"]
+    for record in records:
+        assert record["plies"] == len(record["moves"]) <= 20
+        replayed = runner.Runner.replay(variant.BughouseSuperBoard(), record["moves"], log_moves=False)
+        assert bool(replayed.is_game_over()) == (record["status"] is not None)
+    again = runner.Runner.tournament(matchups, processes=1)
+    assert [r["moves"] for r in records] == [r["moves"] for r in again]
+    summary = runner.Runner.tournament_summary(records)
+    assert set(summary["material v random"]) == {"material", "random"}
+
+
+def test_tournament_eval_options():
+    """
+    Teams using the same evaluation class keep their own eval_options, also in the later
+    games of the same worker process
+    """
+    import pickle
+    eval_name = "BasicPlusPositionPlusPocketValEvalBughouseBase"
+    base = getattr(chess.utility, eval_name)
+    defaults = (base.pocket_val, base.use_legal_mobility)
+    teams = [{"name": "small", "eval": eval_name, "depth": 1,
+              "eval_options": {"pocket_val": 0.1, "legal_mobility": True}},
+             {"name": "large", "eval": eval_name, "depth": 1,
+              "eval_options": {"pocket_val": 0.9, "legal_mobility": False}}]
+    small, large = [runner._make_eval(team) for team in teams]
+    assert (small.pocket_val, small.use_legal_mobility) == (0.1, True)
+    assert (large.pocket_val, large.use_legal_mobility) == (0.9, False)
+    assert (base.pocket_val, base.use_legal_mobility) == defaults
+    assert isinstance(small, base)
+    copied = pickle.loads(pickle.dumps(small))
+    assert (type(copied).pocket_val, type(copied).use_legal_mobility) == (0.1, True)
+
+    board = variant.BughouseBaseBoard('A', "4k3/8/8/8/8/8/8/4K3[QQ] w - - 0 1")
+    assert small._utility(board, chess.WHITE) != large._utility(board, chess.WHITE)
+
+    plain = {"name": "plain v random", "games": 1, "seed": 5, "max_moves": 12,
+             "teams": [{"name": "plain", "eval": eval_name, "depth": 1}, {"name": "random", "agent": "RandomAgent"}]}
+    alone = runner.Runner.tournament([plain], processes=1)
+    after = runner.Runner.tournament([{"name": "small v large", "games": 1, "seed": 5, "max_moves": 4,
+                                       "teams": teams}, plain], processes=1)
+    assert after[-1]["moves"] == alone[0]["moves"]
+
+
+def test_statistics_export():
+    """
+    Every move gives a record of the search, which can be exported as JSON lines or CSV
+    """
+    import json
+    import os
+    import tempfile
+    super_board = variant.BughouseSuperBoard()
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    whiteA = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=3,
+                            move_order_fn=ai.AI.heuristic_move_reorder)
+    whiteA.choose_move()
+    whiteA.choose_move()
+    records = whiteA.statistics.records
+    assert [r["move"] for r in records] == [1, 2]
+    for record in records:
+        assert record["completed_depth"] == 3
+        assert len(record["seconds_by_depth"]) == 3
+        # the root is searched once per depth
+        assert record["states_by_ply"][0] == 3
+        # the states at the cutoff don't generate moves
+        assert len(record["states_by_ply"]) == 3
+        assert sum(record["cutoffs_by_index"]) > 0
+    assert whiteA.statistics.total_states == sum(r["states"] for r in records)
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl = os.path.join(directory, "stats.jsonl")
+        whiteA.statistics.export(jsonl)
+        with open(jsonl) as f:
+            assert [json.loads(line) for line in f] == records
+        csv_file = os.path.join(directory, "stats.csv")
+        whiteA.statistics.export(csv_file)
+        with open(csv_file) as f:
+            lines = f.read().splitlines()
+        assert lines[0].split(",") == ai.Statistics.FIELDS
+        assert len(lines) == 3
+
+    quiet = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=3,
+                           detailed_stats=False)
+    quiet.choose_move()
+    assert quiet.statistics.records[0]["states_by_ply"] == []
+    assert quiet.statistics.records[0]["states"] > 0
+
+
+def test_search_trace():
+    """
+    The trace has a record for every move searched, and the root moves of the last
+    iteration have the values the search chose from
+    """
+    import os
+    import tempfile
+    super_board = variant.BughouseSuperBoard()
+    for mv in ["e2e4", "d7d5"]:
+        super_board.push(chess.Move.from_uci(mv), 'A')
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    for move in [chess.Move.from_uci("e7e8q"), chess.Move.from_uci("P@e5"), chess.Move.from_uci("g1f3")]:
+        assert ai.SearchTrace.decode_move(ai.SearchTrace.encode_move(move)) == move
+        # the trace packs moves like Move.code
+        assert ai.SearchTrace.encode_move(move) == move.code
+    assert ai.SearchTrace.encode_move(None) == 0 and not ai.SearchTrace.decode_move(0)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "trace.bin")
+        whiteA = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=2,
+                                trace=filename)
+        move = whiteA.choose_move()
+        whiteA.close_trace()
+        records = list(ai.SearchTrace.read(filename))
+    assert [r[1] for r in records if r[0] == "iteration"] == [1, 2]
+    last = max(i for i, r in enumerate(records) if r[0] == "iteration")
+    root = [r for r in records[last:] if r[0] == "minimax" and r[1] == 0]
+    assert len(root) == len(list(super_board.boardA.generate_legal_moves()))
+    assert all(r[2] == chess.A for r in root)
+    # the chosen move is the first one with the best value
+    best = max(r[4] for r in root)
+    assert next(r[3] for r in root if r[4] == best) == move
+    assert all(r[1] == 1 and r[0] == "maximin" for r in records[last:] if r not in root and r[0] != "iteration")
+
+
+def test_see():
+    """
+    Static exchange evaluation with x-rays, and the captured pieces going to the partner's pocket
+    """
+    board = variant.BughouseBaseBoard('A', "4k3/4r3/8/4p3/8/8/4R3/4RK2[] w - - 0 1")
+    move = chess.Move.from_uci("e2e5")
+    # the rook behind the first one recaptures through it
+    assert board.see(move, pocket_share=0) == 100
+    board.remove_piece_at(chess.E1)
+    assert board.see(move, pocket_share=0) == 100 - 500
+    assert not board.see_ge(move, 0, pocket_share=0)
+
+    board = variant.BughouseBaseBoard('A', "4k3/8/4p3/3p4/8/8/8/3QK3[] w - - 0 1")
+    move = chess.Move.from_uci("d1d5")
+    assert board.see(move, pocket_share=0) == 100 - 975
+    assert board.see(move, pocket_share=0.5) == (100 + 50) - (975 + 487.5)
+    # a drop can't capture, but it can be captured
+    board.pockets[chess.WHITE].add(chess.KNIGHT)
+    assert board.see(chess.Move.from_uci("N@f5"), pocket_share=0) == -320
+    assert board.see(chess.Move.from_uci("N@h5"), pocket_share=0) == 0
+    # by default, the exchanges are counted with the material values of the evaluations
+    assert board.see(move, values=chess.utility.PIECE_VALUES, pocket_share=0) == board.see(move, pocket_share=0)
+    assert chess.utility.PIECE_VALUES is chess.PIECE_VALUES
+
+
+def test_incremental_eval_terms():
+    """
+    The eval terms kept up to date by push()/pop() match the ones computed from scratch,
+    and the evaluations reading them give the same values as scanning the board
+    """
+    eval_classes = [chess.utility.BasicMaterialEvaluationBughouseBase,
+                    chess.utility.BasicPlusPositionEvalBughouseBase,
+                    chess.utility.BasicPlusPositionPlusPocketValEvalBughouseBase]
+    chess.utility.use_eval_tables()
+    super_board = variant.BughouseSuperBoard()
+    variant.BughouseBaseBoard.check_eval_terms = True
+    try:
+        for board_id, mv in [('A', "e2e4"), ('A', "d7d5"), ('A', "e4d5"), ('B', "g1f3"),
+                             ('A', "d8d5"), ('B', "P@e5"), ('A', "b1c3")]:
+            super_board.push(chess.Move.from_uci(mv), board_id)
+            for board in [super_board.boardA, super_board.boardB]:
+                terms = board.eval_terms()
+                values = [c._utility(board, player) for c in eval_classes for player in chess.COLORS]
+                board._eval_terms = None
+                assert values == [c._utility(board, player) for c in eval_classes for player in chess.COLORS]
+                board._eval_terms = terms
+        # black on board B dropped the pawn it got from e4d5, white on board B still has the one from d8d5
+        pocket_index = chess.utility.EVAL_TABLES.pocket_index
+        assert super_board.boardB.eval_terms()[pocket_index[chess.BLACK]] == 0
+        assert super_board.boardB.eval_terms()[pocket_index[chess.WHITE]] == chess.utility.PAWN_VAL
+        for _ in range(7):
+            super_board.pop()
+            super_board.boardA.eval_terms()
+            super_board.boardB.eval_terms()
+        assert super_board.boardA.eval_terms() == chess.utility.EVAL_TABLES.compute(variant.BughouseSuperBoard().boardA)
+    finally:
+        variant.BughouseBaseBoard.check_eval_terms = False
+
+
+def test_mobility():
+    """
+    The mobility counted from the attack bitboards is the number of pseudo-legal moves
+    (without castling and en passant) of each piece type, and with pinned=True pinned
+    pieces only count the moves along the pin
+    """
+    board = variant.BughouseBaseBoard('A', "4k3/4r3/8/8/8/2b5/3N4/R3K2R[] w KQ - 0 1")
+    counts = [0] * 7
+    for move in chess.Board.generate_pseudo_legal_moves(board):
+        if not board.is_castling(move):
+            counts[board.piece_type_at(move.from_square)] += 1
+    assert board.mobility_by_piece_type(chess.WHITE) == counts
+    # the knight on d2 is pinned by the bishop on c3
+    assert board.mobility_by_piece_type(chess.WHITE, pinned=True)[chess.KNIGHT] == 0
+    assert board.mobility(chess.WHITE, pinned=True) == sum(counts) - counts[chess.KNIGHT]
+
+    board = variant.BughouseBaseBoard('A', "4k3/1P6/8/8/8/8/4P3/4K3[] w - - 0 1")
+    # every promotion counts, like the generated moves
+    assert board.mobility_by_piece_type(chess.WHITE)[chess.PAWN] == 4 + 2
+
+
+def test_batch_utility():
+    """
+    Batch evaluation of snapshots gives the same scores as evaluating the boards one by one
+    """
+    # batch evaluation is optional and needs numpy
+    pytest.importorskip("numpy")
+    super_board = variant.BughouseSuperBoard()
+    boards = []
+    for board_id, mv in [('A', "e2e4"), ('A', "d7d5"), ('A', "e4d5"), ('B', "g1f3"),
+                         ('A', "d8d5"), ('B', "P@e5"), ('A', "b1c3")]:
+        super_board.push(chess.Move.from_uci(mv), board_id)
+        boards.append(super_board.get_base_board(board_id).copy())
+    snapshots = chess.utility.eval_snapshots(boards)
+    for eval_class in [chess.utility.BasicMaterialEvaluationBughouseBase,
+                       chess.utility.BasicPlusPositionEvalBughouseBase,
+                       chess.utility.BasicPlusPositionPlusPocketValEvalBughouseBase]:
+        for player in chess.COLORS:
+            scores = eval_class.batch_utility(snapshots, player, chunk_size=3)
+            assert list(scores) == [eval_class._utility(board, player) for board in boards]
+
+    board = super_board.boardA
+    moves = list(board.legal_moves)
+    scores = chess.utility.BasicPlusPositionEvalBughouseBase.batch_utility(
+        chess.utility.child_snapshots(board, moves), chess.WHITE)
+    for move, score in zip(moves, scores):
+        board.push(move)
+        assert score == chess.utility.BasicPlusPositionEvalBughouseBase._utility(board, chess.WHITE)
+        board.pop()
+
+
+def test_eval_tables_registration():
+    """
+    Boards only keep the eval terms once the tables are set, and copies of a board, which
+    share its undo records, restore their own terms on pop()
+    """
+    import os
+    import subprocess
+    import sys
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(pychess.__file__))))
+    code = "from pychess.chess import utility, variant; print(variant.BughouseBaseBoard('A').eval_terms())"
+    assert subprocess.check_output([sys.executable, "-c", code], env=env, universal_newlines=True).strip() == "None"
+
+    chess.utility.use_eval_tables()
+    chess.utility.use_eval_tables()
+    try:
+        variant.BughouseBaseBoard.set_eval_tables(variant.BughouseEvalTables(chess.utility.PIECE_VALUES, []))
+    except ValueError:
+        pass
+    else:
+        assert False, "expected a ValueError"
+    board = variant.BughouseBaseBoard('A')
+    start = list(board.eval_terms())
+    board.push(chess.Move.from_uci("e2e4"))
+    copy = board.copy()
+    for moved in [board, copy]:
+        moved.push(chess.Move.from_uci("d7d5"))
+        moved.push(chess.Move.from_uci("e4d5"))
+        moved.pop()
+        moved.pop()
+        moved.pop()
+    assert board.eval_terms() == copy.eval_terms() == start
+    assert board.eval_terms() is not copy.eval_terms()
+
+
+def test_piece_square_table_eval():
+    """
+    The flat table evaluation adds up the material, the piece-square values of both colors
+    and the pockets, and its tables can be loaded from a file
+    """
+    import os, tempfile, json
+    eval_class = chess.utility.PieceSquareTableEvalBughouseBase
+    chess.utility.use_eval_tables()
+    super_board = variant.BughouseSuperBoard()
+    for board_id, mv in [('A', "e2e4"), ('A', "d7d5"), ('A', "e4d5"), ('A', "g8f6")]:
+        super_board.push(chess.Move.from_uci(mv), board_id)
+    board = super_board.boardA
+    terms = board.eval_terms()
+    material = terms[chess.utility.MATERIAL_TERM[chess.WHITE]] - terms[chess.utility.MATERIAL_TERM[chess.BLACK]]
+    position = terms[chess.utility.PST_W_TERM[chess.WHITE]] + terms[chess.utility.PST_B_TERM[chess.BLACK]]
+    assert eval_class._utility(board, chess.WHITE) == eval_class._utility(board, chess.BLACK) == material + position
+
+    table = eval_class.table
+    fd, filename = tempfile.mkstemp(suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"values": [0, 1, 3, 3, 5, 9, 0], "white": {"knight": [10] * 64}}, f)
+        eval_class.set_tables_file(filename)
+        # white is a pawn up, and has two knights on the board to black's one
+        assert eval_class._utility(board, chess.WHITE) == 1 + 2 * 10
+        # the captured pawn went to the pocket of black on board B
+        assert eval_class._utility(super_board.boardB, chess.WHITE) == -0.5 * chess.utility.PAWN_VAL + 2 * 10
+    finally:
+        eval_class.table = table
+        os.remove(filename)
+
+
+def test_eval_cache():
+    """
+    The evaluation cache doesn't change the search, only saves evaluations, and keys on
+    the communication inputs as well as the position
+    """
+    for solitary in [False, True]:
+        results = []
+        for eval_cache_size in [0, 2 ** 12]:
+            super_board = variant.BughouseSuperBoard()
+            for mv in ["e2e4", "d7d5", "e4d5"]:
+                super_board.push(chess.Move.from_uci(mv), 'A')
+            eval_class = chess.utility.BasicPlusPositionEvalBughouseBase()
+            if solitary:
+                # looks up the scores of both boards for every evaluation
+                agent = ai.SolitaryAI("solitary", super_board, False, chess.BLACK, chess.WHITE, eval_class,
+                                      max_depth=3, eval_cache_size=eval_cache_size)
+                move = agent.choose_move(chess.A, chess.BLACK)
+            else:
+                agent = ai.PartneredAI("blackA", super_board, chess.A, chess.BLACK, eval_class, False, max_depth=3,
+                                       pvs=True, eval_cache_size=eval_cache_size)
+                move = agent.choose_move()
+            record = agent.statistics.records[-1]
+            results.append((move, record["evals"]))
+            if eval_cache_size:
+                assert 0 < record["eval_cache_hits"] < record["eval_cache_lookups"]
+                assert record["eval_cache_lookups"] == (2 if solitary else 1) * record["evals"]
+                assert record["eval_cache_hit_rate"] == record["eval_cache_hits"] / record["eval_cache_lookups"]
+            else:
+                assert record["eval_cache_hits"] == record["eval_cache_lookups"] == 0
+        assert results[0] == results[1]
+
+    key = ai.EvalCache.key(1234, chess.WHITE)
+    pocket = variant.BughousePocket("p")
+    other = ai.EvalCache.key(1234, chess.WHITE, ally_diff_pocket=pocket, enemy_diff_pocket=variant.BughousePocket(),
+                             to_protect={chess.QUEEN: 100}, to_capture={})
+    cache = ai.EvalCache(16)
+    cache.store(key, 1.5)
+    assert cache.probe(key) == 1.5
+    assert cache.probe(other) is None
+    assert cache.probe(ai.EvalCache.key(1234, chess.BLACK)) is None
+
+
+def test_popcount():
+    """
+    All popcount implementations have to count the bits of a bitboard like bin()
+    """
+    import random
+    rng = random.Random(7)
+    bbs = [0, 1, chess.BB_ALL, chess.BB_SQUARES[63], chess.BB_BACKRANKS]
+    bbs += [rng.getrandbits(64) for _ in range(1000)]
+    for bb in bbs:
+        expected = bin(bb).count("1")
+        assert chess.popcount(bb) == expected
+        assert chess.new_popcount(bb) == expected
+        assert chess._bin_popcount(bb) == expected
+        assert chess._nibble_popcount(bb) == expected
+        assert chess._old_popcount(bb) == expected
+    # every Python version counts a negative number as its absolute value, a complement has to be masked
+    for bb in [-1, ~chess.BB_RANK_1]:
+        assert chess.popcount(bb) == chess._bin_popcount(bb) == bin(bb).count("1")
+    assert chess.popcount(~chess.BB_RANK_1 & chess.BB_ALL) == 56
+
+
+def test_move_codes():
+    """Test that move codes round-trip and the generators yield the read-only interned moves."""
+    for uci in ["e2e4", "a7a8q", "h2h1n", "P@e4", "Q@h8", "0000"]:
+        move = chess.Move.from_uci(uci)
+        interned = chess.Move.from_code(move.code)
+        assert interned == move and interned.uci() == uci
+        assert interned is chess.Move.from_code(move.code)
+        assert move.code < 1 << 16
+        assert move.code == chess.move_code(move.from_square, move.to_square, move.promotion, move.drop)
+    assert chess.Move.from_uci("a7a8q").code != chess.Move.from_uci("Q@a8").code
+
+    board = variant.BughouseBaseBoard('A', "r3k3/1P6/8/8/8/8/8/4K3[Nn] w q - 0 1")
+    moves = list(board.generate_legal_moves())
+    assert list(board.generate_legal_move_codes()) == [move.code for move in moves]
+    assert [chess.Move.from_code(code) for code in board.generate_legal_move_codes()] == moves
+    # the generators yield the interned moves
+    assert all(move is chess.Move.from_code(move.code) for move in moves)
+    move = moves[0]
+    assert move.board is None and not move.capture
+    for attr in ["board", "capture"]:
+        try:
+            setattr(move, attr, True)
+        except AttributeError:
+            pass
+        else:
+            assert False, "expected an AttributeError"
+
+
+def test_legal_moves_into():
+    """
+    legal_moves_into() fills the buffer with the same moves as generate_legal_moves()
+    """
+    buffer = [chess.Move.null()]
+    for fen in ["rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR[] w KQkq - 0 1",
+                # pinned pieces, en passant and castling
+                "4k3/4r3/8/q2pP3/8/2B5/8/4K2R[QNp] w K d6 0 1",
+                # check
+                "4k3/8/8/8/8/8/3n4/R3K2R[BPp] w KQ - 0 1",
+                "r3k2r/8/8/8/4Q3/8/8/4K3[Pnn] b kq - 0 1"]:
+        board = variant.BughouseBaseBoard('A', fen)
+        moves = list(board.generate_legal_moves())
+        assert board.legal_moves_into(buffer) is buffer
+        assert sorted(buffer, key=str) == sorted(moves, key=str)
+        # the moves are in the same order, drops are grouped by piece type
+        assert [move for move in buffer if not move.drop] == [move for move in moves if not move.drop]
+        drop_types = [move.drop for move in buffer if move.drop]
+        assert drop_types == sorted(drop_types)
+        to_mask = chess.BB_RANK_4 | chess.BB_FILE_E
+        assert sorted(board.legal_moves_into(buffer, to_mask=to_mask), key=str) == \
+            sorted(board.generate_legal_moves(to_mask=to_mask), key=str)
+
+
+def test_rook_attack_table():
+    """
+    The rook attack table gives the same attacks as the rank and file tables and as scanning the rays
+    """
+    import random
+    rng = random.Random(11)
+    for _ in range(2000):
+        square = rng.randrange(64)
+        occupied = rng.getrandbits(64) & rng.getrandbits(64)
+        straight = chess.BB_ROOK_ATTACKS[square][chess.BB_ROOK_MASKS[square] & occupied]
+        assert straight == chess._sliding_attacks(square, occupied, [-8, -1, 1, 8])
+        assert straight == (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] |
+                            chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+        assert chess.BB_ROOK_RAYS[square] == chess._sliding_attacks(square, 0, [-8, -1, 1, 8])
+
+
+def test_lazy_attack_tables():
+    """
+    The attack table of a square is built when it is first read, whichever way it is read
+    """
+    deltas = [-9, -7, 7, 9]
+    table = chess.BB_DIAG_ATTACKS
+    for square in [chess.A1, chess.D4, chess.H8]:
+        occupied = chess.BB_DIAG_MASKS[square] & 0x0055AA000055AA00
+        assert table[square][occupied] == chess._sliding_attacks(square, occupied, deltas)
+        assert type(table[square]) is dict
+        assert len(table[square]) == 1 << chess.popcount(chess.BB_DIAG_MASKS[square])
+    for read in [lambda lazy: lazy.get(0), lambda lazy: 0 in lazy, len, list, lambda lazy: list(lazy.items()),
+                 lambda lazy: lazy == table[chess.D4]]:
+        tables = [None] * 64
+        lazy = chess._LazyAttackTable(tables, chess.D4, deltas)
+        assert read(lazy)
+        assert tables[chess.D4] == table[chess.D4] == lazy
+    lazy = chess._LazyAttackTable([None] * 64, chess.D4, deltas)
+    assert lazy.get(chess.BB_ALL) is None and chess.BB_ALL not in lazy
+
+
+def test_legal_drops():
+    """
+    The legal drops come from the cached drop mask, in and out of check, and the checking drops are the ones that check
+    """
+    board = variant.BughouseBaseBoard('A', "4k3/8/8/8/8/3n4/8/R3K2R[BNPQR] w KQ - 0 1")
+    # in check from the knight: no square blocks it, only captures and king moves
+    assert board.legal_drop_squares_mask() == chess.BB_EMPTY
+    assert not list(board.generate_legal_drops())
+    board.push(chess.Move.from_uci("e1d2"))
+    board.push(chess.Move.from_uci("e8d8"))
+    drops = list(board.generate_legal_drops())
+    assert drops == board.legal_drops_into([])
+    assert len(drops) == 4 * 59 + 46
+    # the cached mask follows the side to move, also when it is set directly
+    board.turn = chess.BLACK
+    assert board.legal_drop_squares_mask() == chess.BB_ALL & ~board.occupied
+    assert not list(board.generate_legal_drops())
+    board.turn = chess.WHITE
+    checks = board.legal_drops_into([], checks=True)
+    assert checks == list(board.generate_legal_checking_drops())
+    expected = list()
+    for move in drops:
+        board.push(move)
+        if board.is_check():
+            expected.append(move)
+        board.pop()
+    assert checks == expected
+    assert [move.uci() for move in checks if move.drop == chess.KNIGHT] == ["N@c6", "N@e6", "N@b7", "N@f7"]
+
+
+def test_heuristic_move_reorder():
+    super_board = variant.BughouseSuperBoard()
+    for mv in ["e2e4", "d7d5", "d1g4", "c8g4"]:
+        super_board.push(chess.Move.from_uci(mv), 'A')
+    board = super_board.boardA
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    whiteA = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=3,
+                            iter_deep=False, move_order_fn=ai.AI.heuristic_move_reorder)
+    whiteA.record_cutoff(board, chess.Move.from_uci("g1f3"), 1)
+    whiteA.record_cutoff(board, chess.Move.from_uci("b1c3"), 2)
+    moves = whiteA.heuristic_move_reorder(list(board.legal_moves), board=board, depth=1)
+    # the only capture, then the killer move of depth 1, then the best history score
+    assert [mv.uci() for mv in moves[:3]] == ["e4d5", "g1f3", "b1c3"]
+    assert sorted(moves, key=lambda mv: mv.uci()) == sorted(board.legal_moves, key=lambda mv: mv.uci())
+
+    results = []
+    for move_order_fn in [None, ai.AI.heuristic_move_reorder]:
+        agent = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=3,
+                               iter_deep=False, move_order_fn=move_order_fn)
+        val, _ = agent.minimax(super_board.copy(), 'A', 0, lambda b, d: d >= 3, forbidden_moves=[])
+        results.append((val, agent.statistics.get_states_evaluated()))
+    assert results[0][0] == results[1][0]
+    assert results[1][1] < results[0][1]
+
+
+def test_quiescence_search():
+    """
+    At depth 1 the queen takes the defended pawn, unless the quiescence search sees the recapture
+    """
+    super_board = variant.BughouseSuperBoard()
+    super_board.boardA.set_fen("4k3/8/4p3/3p4/8/8/8/3QK3[] w - - 0 1")
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    moves = []
+    for quiescence in [False, True]:
+        whiteA = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=1,
+                                iter_deep=False, quiescence=quiescence)
+        moves.append(whiteA.choose_move())
+        assert (whiteA.statistics.get_q_states() > 0) == quiescence
+    assert moves[0] == chess.Move.from_uci("d1d5")
+    assert moves[1] != chess.Move.from_uci("d1d5")
+
+
+def test_time_managed_search():
+    super_board = variant.BughouseSuperBoard()
+    eval_class = chess.utility.BasicMaterialEvaluationBughouseBase()
+    whiteA = ai.PartneredAI("whiteA", super_board, chess.A, chess.WHITE, eval_class, False, max_depth=20,
+                            max_states=10 ** 9, movetime=0.3)
+    start = time.time()
+    move = whiteA.choose_move()
+    assert time.time() - start < 1.0
+    assert move in super_board.boardA.legal_moves
+    assert 1 <= whiteA.statistics.completed_depth < 20
+    assert whiteA.hard_deadline is None
+
+    whiteA.movetime = None
+    whiteA.set_clock(60.0, 1.0, winc=2.0, movestogo=10)
+    soft, hard = whiteA.time_limits(chess.WHITE)
+    assert soft < hard <= 60.0
+    soft, hard = whiteA.time_limits(chess.BLACK)
+    assert soft <= hard < 1.0
+
+
 if __name__ == "__main__":
     # unittest.main()
     logging.basicConfig(filename="logs/fix-example-game-1.txt", level=logging.INFO)